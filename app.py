@@ -16,9 +16,11 @@ from plotly.subplots import make_subplots
 from datetime import datetime
 import os
 from dotenv import load_dotenv
-import openai
 import asyncio
+import queue
 import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 import time
 
 # Import speech libraries with fallback for deployment environments
@@ -47,29 +49,48 @@ IS_LOCAL_ENV = (
 
 # Enable voice features for all environments (using Web Speech API for cloud)
 SHOW_VOICE_FEATURES = True
+
+# Warm high-risk patients' AI summaries in the background (opt-in: PREWARM_SUMMARIES=1, server API key only)
+PREWARM_SUMMARIES = os.getenv('PREWARM_SUMMARIES', '0') == '1'
 import json
+from patient_data import CACHE_DIR, DISEASE_COLS
+from disk_cache import TwoTierCache
+from live_dataset import LiveDataset
+from patient_index import date_rank
+from llm_client import (RESPONSE_CACHE_BYTES, RESPONSE_CACHE_TTL, classify_openai_error, client_registry,
+                        get_openai_client, open_chat_stream, tee_sentences)
+from patient_summary import patient_evidence, summary_evidence, summary_request
+from summary_prewarm import SummaryPrewarmer
+from patient_conditions import (GENERIC_SYMPTOMS, condition_columns, condition_mask, detect_conditions,
+                                detect_patient_conditions, diagnostic_basis, row_symptoms, symptoms_for)
+from dashboard_stats import (LAB_METRICS, SKETCH_COLUMNS, AggregateCache, dept_stats, disease_impact_tables,
+                             filter_state_key, kpi_stats, lab_bubble_stats, monthly_trend_stats)
 
 # Import RAG system
 try:
     from rag_system import RAGSystem
-    rag_system = RAGSystem()
-    RAG_AVAILABLE = rag_system.is_available()
-    print(f"RAG System - Database path: {rag_system.db_path}")
-    print(f"RAG System - Available: {RAG_AVAILABLE}")
-    if not RAG_AVAILABLE:
-        print("RAG system loaded but database not available")
 except ImportError as e:
-    RAG_AVAILABLE = False
-    rag_system = None
+    RAGSystem = None
     print(f"RAG system not available - import failed: {e}")
-except Exception as e:
-    RAG_AVAILABLE = False
-    rag_system = None
-    print(f"RAG system error: {e}")
 
 # Load environment variables
 load_dotenv()
 
+def read_secrets_api_key():
+    """The OPENAI_API_KEY in Streamlit secrets as of now (a rotated key is seen); None without one"""
+    try:
+        if hasattr(st, 'secrets') and "OPENAI_API_KEY" in st.secrets:
+            return st.secrets["OPENAI_API_KEY"]
+    except Exception:
+        # secrets文件不存在或无法读取，跳过
+        pass
+    return None
+
+@st.cache_resource
+def get_server_api_key():
+    """部署方自己的API密钥 (secrets, then environment), read once before any visitor's key is exported"""
+    return read_secrets_api_key() or os.getenv('OPENAI_API_KEY')
+
 # Handle OpenAI API Key configuration
 def setup_openai_api():
     """设置OpenAI API密钥"""
@@ -101,9 +122,33 @@ def setup_openai_api():
         return True
     return False
 
-# 设置API密钥
+# 设置API密钥 (the server key is captured first: setup_openai_api() exports a visitor's key to os.environ)
+SERVER_OPENAI_API_KEY = get_server_api_key()
 setup_openai_api()
 
+@st.cache_resource
+def get_rag_system():
+    """One RAGSystem per process: its connection pool, search threads, caches and indexes are built once
+
+    It holds the server's key; a visitor's key is passed per call, never
+    stored on the shared instance.
+    """
+    if RAGSystem is None:
+        return None
+    try:
+        rag = RAGSystem(api_key=SERVER_OPENAI_API_KEY)
+    except Exception as e:
+        print(f"RAG system error: {e}")
+        return None
+    print(f"RAG System - Database path: {rag.db_path}")
+    print(f"RAG System - Available: {rag.is_available()}")
+    if not rag.is_available():
+        print("RAG system loaded but database not available")
+    return rag
+
+rag_system = get_rag_system()
+RAG_AVAILABLE = rag_system is not None and rag_system.is_available()
+
 # Nordic color palette - Ultra minimal
 COLORS = {
     'primary': '#334155',      # Slate gray
@@ -514,44 +559,103 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
-@st.cache_data
+@st.cache_resource
+def get_live_dataset():
+    """Patient frame and indexes shared by all sessions, updated in place as admissions arrive"""
+    live = LiveDataset.load()
+    # Aggregates are keyed by dataset version; drop the stale ones on every change
+    live.on_change(lambda version: get_aggregate_cache().clear())
+    return live
+
 def load_data():
-    """Load and preprocess data"""
-    df = pd.read_csv("data/LengthOfStay.csv")
-    
-    # Convert dates
-    df['vdate'] = pd.to_datetime(df['vdate'])
-    df['discharged'] = pd.to_datetime(df['discharged'])
-    df['Date_of_Birth'] = pd.to_datetime(df['Date_of_Birth'])
-    
-    # Create derived features
-    df['month'] = df['vdate'].dt.to_period('M').astype(str)
-    df['is_long_stay'] = (df['lengthofstay'] > df['lengthofstay'].quantile(0.75)).astype(int)
-    df['readmit_flag'] = (df['rcount'] != '0').astype(int)
-    
-    # Calculate age at admission
-    df['age_at_admission'] = (df['vdate'] - df['Date_of_Birth']).dt.days / 365.25
-    df['age_group'] = pd.cut(df['age_at_admission'], 
-                            bins=[0, 18, 35, 50, 65, 80, 100], 
-                            labels=['0-18', '19-35', '36-50', '51-65', '66-80', '80+'])
-    
-    # Create full name for patient identification
-    df['full_name'] = df['First_Name'] + ' ' + df['Last_Name']
-    
-    # Create risk level categorization
-    df['risk_level'] = 'Standard Risk'
-    high_risk_mask = (
-        (df['lengthofstay'] > df['lengthofstay'].quantile(0.9)) |
-        (df['readmit_flag'] == 1)
-    )
-    df.loc[high_risk_mask, 'risk_level'] = 'High Risk'
-    
-    # Disease columns for analysis
-    disease_cols = ['dialysisrenalendstage', 'asthma', 'irondef', 'pneum', 
-                   'substancedependence', 'psychologicaldisordermajor', 
-                   'depress', 'psychother', 'fibrosisandother', 'malnutrition']
-    
-    return df, disease_cols
+    """Current dataset version, patient frame and indexes, plus the disease columns"""
+    live = get_live_dataset()
+    # Picks up admissions appended by other processes (new store parts) incrementally
+    live.refresh()
+    return live.snapshot(), list(DISEASE_COLS)
+
+# Keyed by version: keep the current dataset and the one before it (sessions mid-rerun)
+@st.cache_resource(max_entries=2)
+def get_date_rank(version, _df):
+    """Admission-date rank of every row, built once per dataset version"""
+    return date_rank(_df)
+
+@st.cache_resource(max_entries=2)
+def get_patient_conditions(version, _df):
+    """Detected conditions and diagnostic-basis codes of every admission, one vectorized pass per dataset version"""
+    return detect_conditions(_df)
+
+def append_admissions(records):
+    """Add new admissions without a full reload; returns the new dataset version"""
+    return get_live_dataset().append_admissions(records)
+
+@st.cache_resource
+def get_aggregate_cache():
+    """Process-wide LRU of chart aggregates keyed by filter state"""
+    return AggregateCache(maxsize=256)
+
+def cached_aggregate(filter_key, name, compute):
+    """Look up a chart aggregate for the current filter state, computing it on a miss"""
+    return get_aggregate_cache().get_or_compute((filter_key, name), compute)
+
+def selected_rows(df, positions):
+    """Loader for the filtered frame: df.iloc[positions] is only copied on an aggregate cache miss, once per rerun"""
+    rows = []
+    def load():
+        if not rows:
+            # select() returns sorted, unique positions, so all of them means the whole frame
+            rows.append(df if len(positions) == len(df) else df.iloc[positions])
+        return rows[0]
+    return load
+
+@st.cache_resource
+def get_response_cache():
+    """Process-wide LLM response cache on disk, shared by sessions and surviving restarts
+
+    Entries are content-addressed by the full request, so a patient whose
+    row, notes or retrieved literature changed gets a fresh response.
+    """
+    return TwoTierCache(os.path.join(CACHE_DIR, 'llm_responses.db'), memory_items=256,
+                        disk_bytes=RESPONSE_CACHE_BYTES, ttl=RESPONSE_CACHE_TTL)
+
+def build_summary_request(live, rag, patient_id):
+    """The patient page's summary request for an admission in live's current data; None once it is gone
+
+    Runs on the prewarm threads, so the dataset and the shared RAG system
+    (None without literature) are passed in rather than fetched from
+    Streamlit's caches.
+    """
+    snapshot = live.snapshot()
+    position = snapshot.person_index.position(patient_id)
+    if position is None:
+        return None
+    patient = snapshot.frame.iloc[position]
+    conditions, _, _ = detect_patient_conditions(patient)
+    papers = summary_evidence(rag, patient_evidence(rag, symptoms_for(conditions)))
+    return summary_request(patient, get_patient_notes(patient_id), papers)
+
+@st.cache_resource
+def get_summary_prewarmer():
+    """Background workers warming high-risk patients' summaries; new admissions jump the queue
+
+    Billed to the server's own key; a visitor's key from the sidebar never
+    drives process-wide work. The secrets are re-read while the workers are
+    paused on a key error, so a rotated key resumes them without a restart.
+    """
+    live = get_live_dataset()
+    rag = get_rag_system() if RAG_AVAILABLE else None
+    server_key = SERVER_OPENAI_API_KEY
+    prewarmer = SummaryPrewarmer(partial(build_summary_request, live, rag), get_response_cache(),
+                                 client_factory=lambda: get_openai_client(read_secrets_api_key() or server_key))
+    prewarmer.schedule(live.frame)
+    live.on_change(lambda version: prewarmer.schedule(live.frame, newly_admitted=True))
+    prewarmer.start()
+    return prewarmer
+
+@st.cache_resource
+def get_page_executor():
+    """Threads for the patient page's LLM calls that run while another section streams"""
+    return ThreadPoolExecutor(max_workers=8, thread_name_prefix="patient-page")
 
 # Patient Notes Management Functions
 NOTES_FILE = "data/patient_notes.json"
@@ -634,18 +738,14 @@ def generate_patient_response(patient, user_question):
 
         # Try RAG system first if available
         if RAG_AVAILABLE and rag_system:
-            # Update RAG system with current API key
-            rag_system.update_api_key(api_key)
-            rag_response, relevant_papers, diagnostic_info = rag_system.get_rag_response_for_patient(patient, user_question)
+            # The shared RAG system answers with this visitor's key
+            rag_response, relevant_papers, diagnostic_info = rag_system.get_rag_response_for_patient(
+                patient, user_question, api_key=api_key)
             if rag_response:
-                # Check if response is an error message
-                if rag_response.startswith("❌"):
-                    return rag_response
-                else:
-                    return rag_response
+                return rag_response
 
         # Fallback to basic OpenAI response
-        client = openai.OpenAI(api_key=api_key)
+        client = get_openai_client(api_key)
         
         # Extract comprehensive patient information
         patient_data = {
@@ -716,7 +816,7 @@ Clinical Guidelines:
 8. Pay special attention to any additional clinical notes and uploaded files provided"""
 
         # Make API call to OpenAI with enhanced parameters
-        response = client.chat.completions.create(
+        request = dict(
             model="gpt-3.5-turbo",
             messages=[
                 {"role": "system", "content": system_prompt},
@@ -726,18 +826,14 @@ Clinical Guidelines:
             temperature=0.6,  # Slightly lower for more consistent medical advice
             presence_penalty=0.1  # Encourage varied terminology
         )
-        
+        response = client.chat.completions.create(**request)
         return response.choices[0].message.content.strip()
         
     except Exception as e:
         # Check for specific API key errors
-        error_str = str(e)
-        if "401" in error_str or "invalid_request_error" in error_str or "Incorrect API key" in error_str:
-            return "❌ **API密钥无效** - 请在侧边栏检查并重新输入正确的OpenAI API密钥"
-        elif "403" in error_str or "insufficient_quota" in error_str:
-            return "❌ **API配额不足** - 您的OpenAI账户余额不足或已达到使用限制"
-        elif "429" in error_str or "rate_limit" in error_str:
-            return "❌ **请求过于频繁** - 请稍等片刻后重试"
+        message = classify_openai_error(e)
+        if message:
+            return message
         else:
             # General error fallback
             st.error(f"API Error: {str(e)}")
@@ -957,6 +1053,71 @@ def create_web_speech_html(unique_id):
     """
     return html_code
 
+def start_sentence_speaker(patient_id):
+    """Speak sentences in order as they are handed over, while the response is still streaming
+
+    Returns (speak, finish). Locally the sentences go to one background TTS
+    thread; in the cloud to one hidden speech frame, re-rendered with the
+    reply's sentences so far, that queues only the new ones in the page's
+    speech synthesis, so they play in order and never overlap.
+    """
+    if not (SPEECH_RECOGNITION_AVAILABLE and IS_LOCAL_ENV):
+        slot = st.empty()
+        reply_id = f"tts_{patient_id}_{time.time_ns()}"
+        sentences = []
+
+        def speak(sentence):
+            sentences.append(sentence)
+            with slot:
+                components.html(speak_sentences_web(sentences, reply_id), height=0)
+        return speak, lambda: None
+
+    sentences = queue.Queue()
+
+    def _speak_in_order():
+        _, tts_engine = init_speech_components() if TTS_AVAILABLE else (None, None)
+        while True:
+            sentence = sentences.get()
+            if sentence is None:
+                return
+            try:
+                if tts_engine is not None:
+                    tts_engine.say(sentence)
+                    tts_engine.runAndWait()
+                elif TTS_AVAILABLE and platform.system() == "Darwin":
+                    import subprocess
+                    subprocess.run(['say', sentence], check=True, capture_output=True)
+            except Exception:
+                pass
+
+    threading.Thread(target=_speak_in_order, daemon=True).start()
+    return sentences.put, lambda: sentences.put(None)
+
+def show_prewarm_status(status):
+    """Sidebar panel: queue depth and throughput of the background summary warm-up"""
+    handled = status['warmed'] + status['already_warm'] + status['skipped'] + status['failed']
+    with st.expander(f"🔥 Summary prewarm: {status['state']}"):
+        if status['scheduled']:
+            st.progress(min(1.0, handled / status['scheduled']),
+                        text=f"{handled} of {status['scheduled']} high-risk patients ready")
+        col1, col2 = st.columns(2)
+        col1.metric("Queued", status['queued'] + status['in_progress'])
+        col2.metric("Per minute", f"{status['per_minute']:.1f}")
+        st.caption(f"{status['warmed']} generated, {status['already_warm']} already cached, "
+                   f"{status['failed']} failed, {status['rate_limited']} rate-limited")
+        if status['backoff_seconds'] > 0:
+            st.caption(f"⏳ Rate limited, resuming in {status['backoff_seconds']:.0f}s")
+        if status['last_error'] and status['state'] == 'paused':
+            st.warning(status['last_error'])
+
+def stream_into(placeholder, deltas, render):
+    """Render streamed text into a placeholder as it arrives (for custom HTML st.write_stream can't style); returns the full text"""
+    text = ""
+    for delta in deltas:
+        text += delta
+        placeholder.markdown(render(text), unsafe_allow_html=True)
+    return text.strip()
+
 def speak_text_web(text, unique_id):
     """Use Web Speech API for text-to-speech in browser - simple and reliable"""
     if not text:
@@ -979,9 +1140,45 @@ def speak_text_web(text, unique_id):
     """
     return html_code
 
-def show_patient_detail(patient_id, df):
+def speak_sentences_web(sentences, reply_id):
+    """Web Speech API for a reply spoken as it streams: queues the sentences not yet queued for reply_id
+
+    The queue and the count of queued sentences live in the app page (the
+    frame is same-origin), so re-rendering the frame neither repeats nor cuts
+    off speech.
+    """
+    # JSON is valid JavaScript; "</" is escaped so a sentence cannot close the script tag
+    sentences_js = json.dumps(list(sentences)).replace('</', '<\\/')
+    return f"""
+    <script>
+    (function() {{
+        let host = window;
+        try {{
+            if (window.parent.speechSynthesis) host = window.parent;
+        }} catch (e) {{}}
+        if (!('speechSynthesis' in host)) return;
+        const sentences = {sentences_js};
+        const queued = host.__ttsQueued = host.__ttsQueued || {{}};
+        for (let i = queued["{reply_id}"] || 0; i < sentences.length; i++) {{
+            const utterance = new host.SpeechSynthesisUtterance(sentences[i]);
+            utterance.rate = 0.9;
+            utterance.volume = 0.8;
+            host.speechSynthesis.speak(utterance);
+        }}
+        queued["{reply_id}"] = sentences.length;
+    }})();
+    </script>
+    """
+
+def show_patient_detail(patient_id, df, person_index, conditions):
     """Show detailed patient information with sidebar showing patient history"""
-    patient = df[df['eid'] == patient_id].iloc[0]
+    position = person_index.position(patient_id)
+    if position is None:
+        st.error(f"Patient {patient_id} not found")
+        return
+    patient = df.iloc[position]
+    # Conditions come from the cohort-wide pass; the diagnostic text is only rendered where it is shown
+    detected_symptoms = row_symptoms(conditions.iloc[position])
 
     # Sidebar with patient history
     with st.sidebar:
@@ -989,9 +1186,8 @@ def show_patient_detail(patient_id, df):
         st.markdown(f"**Patient:** {patient['full_name']}")
         st.markdown("---")
 
-        # Get all records for this patient (by name)
-        patient_name = patient['full_name']
-        patient_history = df[df['full_name'] == patient_name].sort_values('vdate')
+        # All admissions of this person (same name and date of birth), by admission date
+        patient_history = df.iloc[person_index.history(patient_id)]
 
         if len(patient_history) > 1:
             st.markdown(f"**Total Admissions:** {len(patient_history)}")
@@ -1047,115 +1243,47 @@ def show_patient_detail(patient_id, df):
     </div>
     """, unsafe_allow_html=True)
 
+    # The AI sections start together: one retrieval serves both, and the clinical insights
+    # completion runs in the background while the summary streams
+    specific_conditions = [s for s in detected_symptoms if s not in GENERIC_SYMPTOMS]
+    visitor_key = st.session_state.get('openai_api_key') or None
+    has_api_key = visitor_key is not None
+    show_insights = RAG_AVAILABLE and bool(specific_conditions)
+    papers = (patient_evidence(rag_system, detected_symptoms, api_key=visitor_key)
+              if RAG_AVAILABLE and (has_api_key or show_insights) else [])
+    insights = None
+    if show_insights:
+        row = conditions.iloc[position]
+        detected = (detected_symptoms, diagnostic_basis(patient, int(row['basis']), int(row['diagnosis_basis'])))
+        # Copies: the insights call fills in paper metadata while the summary renders its citations
+        insights = get_page_executor().submit(rag_system.get_rag_response_for_patient, patient,
+                                              detected=detected, papers=[dict(paper) for paper in papers],
+                                              cache=get_response_cache(), api_key=visitor_key)
+
     # Auto-generated AI Summary with Evidence-Based Medicine
     st.markdown("### 🤖 AI Patient Summary (Evidence-Based)")
     summary_container = st.container()
 
     with summary_container:
         # Generate automatic summary using GPT with medical literature citations
-        if 'openai_api_key' in st.session_state and st.session_state.openai_api_key:
+        if has_api_key:
             try:
-                from openai import OpenAI
-                client = OpenAI(api_key=st.session_state.openai_api_key)
-
-                # Build patient context
-                patient_context = f"""Patient: {patient['full_name']}
-Age: {patient['age_at_admission']} years ({patient['age_group']})
-Gender: {'Male' if patient['gender'] == 'M' else 'Female'}
-Department: {patient['facid']}
-Length of Stay: {patient['lengthofstay']} days
-Admission Date: {patient['vdate']}
-Discharge Date: {patient['discharged']}
+                client = get_openai_client(st.session_state.openai_api_key)
 
-Lab Results:
-- Glucose: {patient['glucose']:.1f} mg/dL (normal: 70-100)
-- Creatinine: {patient['creatinine']:.2f} mg/dL (normal: 0.6-1.2)
-- Hematocrit: {patient['hematocrit']:.1f}% (normal: 38-46% female, 42-54% male)
-- Sodium: {patient['sodium']:.1f} mEq/L (normal: 135-145)
-- Blood Urea Nitrogen: {patient['bloodureanitro']:.1f} mg/dL (normal: 7-20)
-
-Risk Level: {patient['risk_level']}
-Readmission Flag: {'Yes' if patient['readmit_flag'] == 1 else 'No'}"""
-
-                # Get patient notes if available
-                patient_notes = get_patient_notes(patient['eid'])
-                if patient_notes:
-                    patient_context += f"\n\nAdditional Notes:\n{patient_notes}"
-
-                # Search for relevant medical literature using RAG system
-                relevant_papers = []
-                literature_context = ""
-
-                if RAG_AVAILABLE:
-                    try:
-                        # Extract symptoms and search for relevant papers
-                        detected_symptoms, diagnostic_info = rag_system.extract_symptoms_from_patient(patient)
-
-                        if detected_symptoms:
-                            # Search for papers related to patient's conditions
-                            search_query = ' '.join(detected_symptoms)
-                            papers = rag_system.search_relevant_papers(search_query, top_k=5)
-
-                            if papers:
-                                # Filter high-quality papers and build literature context
-                                for paper in papers:
-                                    paper_score = paper.get('similarity', paper.get('score', 0))
-                                    score_threshold = 0.65 if 'similarity' in paper else 3
-
-                                    if paper_score >= score_threshold:
-                                        relevant_papers.append(paper)
-                                        # Add paper content to context
-                                        literature_context += f"\n\nRelevant research finding:\n{paper['chunk_text'][:500]}"
-                    except Exception as e:
-                        print(f"RAG search failed: {e}")
+                # Patient data and notes, plus the top papers of the shared retrieval
+                relevant_papers = summary_evidence(rag_system, papers)
+                request = summary_request(patient, get_patient_notes(patient['eid']), relevant_papers)
 
                 with st.spinner("Generating evidence-based summary..."):
-                    # Enhanced system prompt for evidence-based medicine
-                    system_prompt = """You are an experienced hospital administrator with expertise in evidence-based medicine.
-Provide a concise executive summary of the patient's current status based on their clinical data and relevant medical literature.
-
-Focus on:
-1) Key abnormal findings that need attention
-2) Clinical significance based on medical evidence
-3) Evidence-based recommendations
-4) When relevant literature is provided, reference the key findings naturally in your summary
-
-Be brief, actionable, and evidence-based. Skip normal values unless specifically relevant."""
-
-                    user_prompt = f"""Provide an executive summary for this patient:
-
-{patient_context}"""
-
-                    # Add literature context if available
-                    if literature_context:
-                        user_prompt += f"""\n\nRelevant Medical Literature:{literature_context}
+                    # Same patient data, notes and literature as last time (or prewarmed): replayed from the cache, no API call
+                    deltas = open_chat_stream(client, cache=get_response_cache(), **request)
 
-Based on the patient data and medical literature above, provide an evidence-based summary."""
-
-                    response = client.chat.completions.create(
-                        model="gpt-4o",
-                        messages=[
-                            {
-                                "role": "system",
-                                "content": system_prompt
-                            },
-                            {
-                                "role": "user",
-                                "content": user_prompt
-                            }
-                        ],
-                        max_tokens=300,  # Increased for evidence-based content
-                        temperature=0.7
-                    )
-
-                    summary = response.choices[0].message.content.strip()
-
-                    # Display summary in a nice box
-                    st.markdown(f"""
+                    # Display summary in a nice box, filled in as tokens arrive
+                    stream_into(st.empty(), deltas, lambda text: f"""
                     <div style="background-color: #f0f7ff; padding: 15px; border-radius: 8px; border-left: 4px solid #2E5266; margin-bottom: 10px;">
-                        {summary}
+                        {text.strip()}
                     </div>
-                    """, unsafe_allow_html=True)
+                    """)
 
                     # Display citations if available
                     if relevant_papers:
@@ -1211,17 +1339,12 @@ Based on the patient data and medical literature above, provide an evidence-base
 
     # AI-Based Clinical Summary Section - Only show if patient has identifiable conditions
     if RAG_AVAILABLE:
-        # Check if patient has detectable symptoms/conditions
-        detected_symptoms, diagnostic_info = rag_system.extract_symptoms_from_patient(patient)
-        
         # Only show if we detect specific medical conditions (not just generic terms)
-        specific_conditions = [s for s in detected_symptoms if s not in ['length of stay', 'hospital admission', 'medical care']]
-        
         if specific_conditions:
             with st.expander("Clinical Summary & Evidence-Based Insights", expanded=True):
-                # Get RAG analysis for this patient
+                # RAG analysis for this patient, started before the summary
                 try:
-                    rag_response, relevant_papers, diagnostic_details = rag_system.get_rag_response_for_patient(patient)
+                    rag_response, relevant_papers, diagnostic_details = insights.result()
                     
                     if rag_response and relevant_papers:
                         # Display detected conditions with diagnostic reasoning
@@ -1323,7 +1446,8 @@ Based on the patient data and medical literature above, provide an evidence-base
     risk_factors = []
     
     # Analyze key risk factors
-    if patient['lengthofstay'] > df['lengthofstay'].quantile(0.75):
+    # is_long_stay already encodes LOS above the population 75th percentile
+    if patient['is_long_stay'] == 1:
         risk_factors.append("Extended length of stay")
     if patient['readmit_flag'] == 1:
         risk_factors.append("Previous readmission")
@@ -2024,8 +2148,7 @@ Based on the patient data and medical literature above, provide an evidence-base
                     file_summary = ""
                     if 'openai_api_key' in st.session_state and st.session_state.openai_api_key and file_content:
                         try:
-                            from openai import OpenAI
-                            client = OpenAI(api_key=st.session_state.openai_api_key)
+                            client = get_openai_client(st.session_state.openai_api_key)
 
                             content_sample = file_content[:2000] + "..." if len(file_content) > 2000 else file_content
 
@@ -2650,10 +2773,10 @@ Based on the patient data and medical literature above, provide an evidence-base
                 st.session_state[f"auto_speak_{patient_id}"] = True
 
             # Generate AI response using OpenAI
+            spoken = False
             try:
                 if 'openai_api_key' in st.session_state and st.session_state.openai_api_key:
-                    from openai import OpenAI
-                    client = OpenAI(api_key=st.session_state.openai_api_key)
+                    client = get_openai_client(st.session_state.openai_api_key)
 
                     # Create patient context
                     # Get patient notes
@@ -2700,7 +2823,8 @@ Based on the patient data and medical literature above, provide an evidence-base
                         if 'content_preview' in file_info and file_info['content_preview']:
                             file_context += f"\nContent Preview: {file_info['content_preview']}"
 
-                    response = client.chat.completions.create(
+                    deltas = open_chat_stream(
+                        client,
                         model="gpt-3.5-turbo",
                         messages=[
                             {"role": "system", "content": "You are a senior medical specialist with 20+ years of clinical experience in internal medicine, emergency care, and hospital management. You have expertise in interpreting lab values, assessing patient risk factors, and providing evidence-based medical recommendations. Respond as an experienced clinician would - provide direct, professional medical analysis without introducing yourself. Be clear, actionable, and use appropriate medical terminology while explaining complex concepts when needed. Always use correct pronouns based on patient gender. When files are attached, acknowledge them and provide guidance on how they might relate to the patient's care."},
@@ -2710,12 +2834,24 @@ Based on the patient data and medical literature above, provide an evidence-base
                         temperature=0.7
                     )
 
-                    ai_response = response.choices[0].message.content.strip()
+                    # Show tokens as they arrive; with auto-speak on, each sentence is spoken once complete
+                    if st.session_state.get(f"auto_speak_{patient_id}", False):
+                        speak_sentence, finish_speaking = start_sentence_speaker(patient_id)
+                        deltas = tee_sentences(deltas, speak_sentence)
+                    else:
+                        finish_speaking = None
+                    st.markdown("**🤖 AI:**")
+                    try:
+                        ai_response = st.write_stream(deltas).strip()
+                    finally:
+                        if finish_speaking:
+                            finish_speaking()
+                            spoken = True
                 else:
                     ai_response = "Please enter your OpenAI API key in the dashboard sidebar to enable AI responses. I can provide basic patient information in the meantime."
 
             except Exception as e:
-                ai_response = f"I'm having trouble connecting to the AI service. Error: {str(e)}. Please check your API key or try again later."
+                ai_response = classify_openai_error(e) or f"I'm having trouble connecting to the AI service. Error: {str(e)}. Please check your API key or try again later."
 
             # Add AI response to chat
             st.session_state[chat_key].append({"role": "assistant", "content": ai_response})
@@ -2723,15 +2859,15 @@ Based on the patient data and medical literature above, provide an evidence-base
             # Clear voice input after successful submission
             st.session_state[voice_key] = ""
 
-            # Auto-speak AI response if it came from voice input
+            # Auto-speak AI response if it came from voice input (unless it was spoken while streaming)
             if st.session_state.get(f"auto_speak_{patient_id}", False):
-                if SPEECH_RECOGNITION_AVAILABLE and IS_LOCAL_ENV:
+                if not spoken and SPEECH_RECOGNITION_AVAILABLE and IS_LOCAL_ENV:
                     # Local environment - use Python TTS
                     threading.Thread(
                         target=lambda: speak_text(ai_response),
                         daemon=True
                     ).start()
-                else:
+                elif not spoken:
                     # Cloud environment - use Web Speech API
                     tts_session_id = f"tts_{patient_id}_{int(time.time())}"
                     tts_html = speak_text_web(ai_response, tts_session_id)
@@ -2756,11 +2892,14 @@ def main():
         st.session_state.selected_patient = None
     
     # Load data
-    df, disease_cols = load_data()
+    data, disease_cols = load_data()
+    version, df = data.version, data.frame
+    filter_index, sketch_index = data.filter_index, data.sketch_index
     
     # Check if we should show patient detail page
     if st.session_state.current_page == "patient_detail" and st.session_state.selected_patient:
-        show_patient_detail(st.session_state.selected_patient, df)
+        show_patient_detail(st.session_state.selected_patient, df, data.person_index,
+                            get_patient_conditions(version, df))
         return
     
     # Header
@@ -2787,19 +2926,39 @@ def main():
             st.session_state.openai_api_key = api_key_input
             setup_openai_api()  # Update environment variable
             st.success("✅ API key configured")
+            # Request latency through the shared client pool
+            api_stats = client_registry.stats()
+            if api_stats['operations']:
+                with st.expander("📡 API timing"):
+                    for operation, counter in api_stats['operations'].items():
+                        first_token = counter['mean_first_token_ms']
+                        st.caption(f"{operation}: {counter['calls']} calls, {counter['mean_ms']:.0f} ms mean, "
+                                   f"{counter['max_ms']:.0f} ms max"
+                                   + (f", {first_token:.0f} ms to first token" if first_token is not None else ""))
+                    st.caption(f"{api_stats['clients_created']} clients created "
+                               f"({api_stats['client_setup_ms']:.0f} ms), {api_stats['waits']} waits for a free connection")
         elif not api_key_input and 'openai_api_key' not in st.session_state:
             st.info("💡 Enter API key to enable AI features")
 
+        if PREWARM_SUMMARIES and SERVER_OPENAI_API_KEY:
+            show_prewarm_status(get_summary_prewarmer().status())
+
         st.markdown("---")
 
+        if get_live_dataset().source_changed:
+            st.warning(f"⚠️ {os.path.basename(get_live_dataset().csv_path)} changed after admissions were added; "
+                       "the dashboard still shows the patient store. Re-ingest the CSV "
+                       "(scripts/ingest_extract.py) to rebuild it from the new file.")
+
         st.markdown("### 🔍 Filters")
 
         # Date range filter
+        first_date, last_date = filter_index.date_range
         date_range = st.date_input(
             "Date Range",
-            value=[df['vdate'].min().date(), df['vdate'].max().date()],
-            min_value=df['vdate'].min().date(),
-            max_value=df['vdate'].max().date()
+            value=[first_date, last_date],
+            min_value=first_date,
+            max_value=last_date
         )
         
         # Gender filter
@@ -2812,15 +2971,15 @@ def main():
         # Department filter
         dept_options = st.multiselect(
             "Department",
-            options=sorted(df['facid'].unique()),
-            default=sorted(df['facid'].unique())
+            options=filter_index.values('facid'),
+            default=filter_index.values('facid')
         )
         
         # Age group filter
         age_options = st.multiselect(
             "Age Group",
-            options=sorted(df['age_group'].dropna().unique()),
-            default=sorted(df['age_group'].dropna().unique())
+            options=filter_index.values('age_group'),
+            default=filter_index.values('age_group')
         )
         
         # Risk level filter
@@ -2829,6 +2988,16 @@ def main():
             options=["Standard Risk", "High Risk"],
             default=["Standard Risk", "High Risk"]
         )
+
+        # Detected condition filter (patients with any of the selected conditions)
+        conditions = get_patient_conditions(version, df)
+        condition_options = st.multiselect(
+            "Detected Condition",
+            options=[c for c in condition_columns(conditions) if conditions[c].any()],
+            default=[],
+            format_func=str.title,
+            help="Conditions detected from labs and diagnosis flags; leave empty for all patients"
+        )
     
     # Handle date range - ensure we have both start and end dates
     if isinstance(date_range, (list, tuple)) and len(date_range) == 2:
@@ -2839,34 +3008,54 @@ def main():
     
     # Apply filters with error handling
     try:
-        mask = (
-            (df['vdate'].dt.date >= start_date) &
-            (df['vdate'].dt.date <= end_date)
+        positions = filter_index.select(
+            start_date, end_date,
+            gender=gender_options,
+            facid=dept_options,
+            age_group=age_options,
+            risk_level=risk_options
+        )
+        if condition_options:
+            positions = positions[condition_mask(conditions, condition_options)[positions]]
+        filter_key = filter_state_key(
+            version,
+            start_date=start_date, end_date=end_date,
+            gender=gender_options, facid=dept_options,
+            age_group=age_options, risk_level=risk_options,
+            conditions=condition_options
         )
         
-        if gender_options:
-            mask = mask & (df['gender'].isin(gender_options))
-        if dept_options:
-            mask = mask & (df['facid'].isin(dept_options))
-        if age_options:
-            mask = mask & (df['age_group'].isin(age_options))
-        if risk_options:
-            mask = mask & (df['risk_level'].isin(risk_options))
-            
-        filtered_df = df[mask]
+        # Percentiles come from the sketch index only when the filters select whole
+        # (department, month) cells; gender/age/risk subsets fall back to exact quantiles
+        sketch_scope = None
+        unrestricted = all(
+            not selected or set(selected) >= set(filter_index.values(col))
+            for col, selected in [('gender', gender_options), ('age_group', age_options),
+                                  ('risk_level', risk_options)]
+        )
+        if unrestricted and not condition_options:
+            months = sketch_index.months_within(start_date, end_date)
+            if months is not None:
+                sketch_scope = {'facids': dept_options or None, 'months': months}
         
-        if filtered_df.empty:
+        if len(positions) == 0:
             st.warning("No data available with current filters. Please adjust your selection.")
             # Show charts with full dataset instead of returning
-            filtered_df = df
+            positions = np.arange(len(df))
+            filter_key = filter_state_key(version)
+            sketch_scope = {}
     except Exception as e:
         st.error(f"Filter error: {e}")
         # Use full dataset if filtering fails
-        filtered_df = df
+        positions = np.arange(len(df))
+        filter_key = filter_state_key(version)
+        sketch_scope = {}
+    # Charts read the filtered rows only when their aggregate is not cached yet
+    filtered_rows = selected_rows(df, positions)
     
     # KPI Section
     st.markdown('<div class="section-header">Key Performance Indicators</div>', unsafe_allow_html=True)
-    create_kpi_cards(filtered_df)
+    create_kpi_cards(filtered_rows, filter_key)
     
     # Charts section
     st.markdown('<div class="section-header">Analytics Dashboard</div>', unsafe_allow_html=True)
@@ -2875,30 +3064,31 @@ def main():
     col1, col2 = st.columns(2, gap="large")
     
     with col1:
-        create_dept_comparison(filtered_df)
+        create_dept_comparison(filtered_rows, filter_key)
         st.markdown("<br>", unsafe_allow_html=True)
-        create_lab_scatter(filtered_df)
+        create_lab_scatter(filtered_rows, filter_key, sketch_index, sketch_scope)
     
     with col2:
-        create_disease_heatmap(filtered_df, disease_cols)
+        create_disease_heatmap(filtered_rows, disease_cols, filter_key)
         st.markdown("<br>", unsafe_allow_html=True)
-        create_trend_analysis(filtered_df)
+        create_trend_analysis(filtered_rows, filter_key)
     
     # Detailed analysis
     st.markdown('<div class="section-header">Patient Details</div>', unsafe_allow_html=True)
-    create_detail_table(filtered_df)
+    create_detail_table(df, positions, get_date_rank(version, df), data.search_index)
 
     # AI floating chat widget
     add_floating_chat()
 
-def create_kpi_cards(df):
+def create_kpi_cards(rows, filter_key):
     """Create KPI cards with Nordic styling"""
     col1, col2, col3, col4 = st.columns(4, gap="medium")
     
-    avg_los = df['lengthofstay'].mean()
-    long_stay_rate = (df['lengthofstay'] > 7).mean() * 100
-    readmit_rate = df['readmit_flag'].mean() * 100
-    turnover = 365 / avg_los
+    kpis = cached_aggregate(filter_key, 'kpi', lambda: kpi_stats(rows()))
+    avg_los = kpis['avg_los']
+    long_stay_rate = kpis['long_stay_rate']
+    readmit_rate = kpis['readmit_rate']
+    turnover = kpis['turnover']
     
     with col1:
         st.metric(
@@ -2928,13 +3118,12 @@ def create_kpi_cards(df):
             delta=None
         )
 
-def create_dept_comparison(df):
+def create_dept_comparison(rows, filter_key):
     """Create department comparison chart with Nordic styling"""
-    dept_stats = df.groupby('facid', observed=False)['lengthofstay'].agg(['mean', 'count']).reset_index()
-    dept_stats = dept_stats[dept_stats['count'] >= 10]
+    dept_df = cached_aggregate(filter_key, 'dept', lambda: dept_stats(rows()))
     
     fig = px.bar(
-        dept_stats.sort_values('mean', ascending=True), 
+        dept_df, 
         x='mean', 
         y='facid',
         orientation='h',
@@ -2950,35 +3139,34 @@ def create_dept_comparison(df):
     
     st.plotly_chart(fig, use_container_width=True)
 
-def create_disease_heatmap(df, disease_cols):
+def create_disease_heatmap(rows, disease_cols, filter_key):
     """Create disease heatmap with Nordic styling"""
-    disease_los = []
-    disease_names = {
-        'dialysisrenalendstage': 'Renal Disease',
-        'asthma': 'Asthma',
-        'irondef': 'Iron Deficiency',
-        'pneum': 'Pneumonia',
-        'substancedependence': 'Substance Abuse',
-        'psychologicaldisordermajor': 'Psychological Disorder',
-        'depress': 'Depression',
-        'psychother': 'Psychotherapy',
-        'fibrosisandother': 'Fibrosis',
-        'malnutrition': 'Malnutrition'
-    }
+    disease_df, dept_grid = cached_aggregate(filter_key, 'disease', lambda: disease_impact_tables(rows(), disease_cols))
+    
+    condition_view = st.radio(
+        "Condition view",
+        ["Overall", "By Department"],
+        horizontal=True,
+        key="condition_view",
+        label_visibility="collapsed"
+    )
     
-    for disease in disease_cols:
-        disease_df = df[df[disease] == 1]
-        if len(disease_df) >= 5:
-            avg_los = disease_df['lengthofstay'].mean()
-            disease_los.append({
-                'condition': disease_names.get(disease, disease),
-                'avg_los': avg_los,
-                'count': len(disease_df)
-            })
-    
-    if disease_los:
-        disease_df = pd.DataFrame(disease_los).sort_values('avg_los', ascending=True)
+    if condition_view == "By Department" and not dept_grid.empty:
+        fig = px.imshow(
+            dept_grid,
+            title="Condition Impact on Length of Stay by Department",
+            labels={'x': 'Department', 'y': 'Medical Condition', 'color': 'Average Days'},
+            color_continuous_scale=['#7FB069', '#E6B85C', '#D47A84'],
+            text_auto='.1f',
+            aspect='auto'
+        )
         
+        fig.update_layout(create_chart_template()['layout'])
+        fig.update_layout(height=400)
+        fig.update_coloraxes(showscale=False)
+        
+        st.plotly_chart(fig, use_container_width=True)
+    elif not disease_df.empty:
         fig = px.bar(
             disease_df,
             x='avg_los',
@@ -2998,58 +3186,30 @@ def create_disease_heatmap(df, disease_cols):
     else:
         st.info("Insufficient condition data for visualization")
 
-def create_lab_scatter(df):
+def create_lab_scatter(rows, filter_key, sketch_index=None, sketch_scope=None):
     """Create lab bubble chart for risk stratification with Nordic styling"""
     st.markdown("**Laboratory Indicators & Risk Stratification**")
     
     # Lab metric selection
     lab_metrics = st.selectbox(
         "Laboratory Metric",
-        ['creatinine', 'glucose', 'hematocrit', 'neutrophils', 'sodium', 'bloodureanitro'],
+        LAB_METRICS,
         key="lab_selector"
     )
     
-    # Clean and prepare data
-    clean_df = df.dropna(subset=[lab_metrics, 'lengthofstay']).copy()
-    
-    # Remove outliers for better visualization
-    q1 = clean_df[lab_metrics].quantile(0.05)
-    q99 = clean_df[lab_metrics].quantile(0.95)
-    clean_df = clean_df[(clean_df[lab_metrics] >= q1) & (clean_df[lab_metrics] <= q99)]
-    
-    # Create value-based bins instead of quantile-based bins
-    min_val = clean_df[lab_metrics].min()
-    max_val = clean_df[lab_metrics].max()
-    
-    # Create 8-12 equal-width bins based on value range
-    n_bins = min(12, max(8, int((max_val - min_val) / (clean_df[lab_metrics].std() * 0.5))))
-    lab_bins = pd.cut(clean_df[lab_metrics], bins=n_bins, include_lowest=True)
-    
-    # Group data for bubble chart
-    bubble_data = []
-    for lab_range, group in clean_df.groupby(lab_bins, observed=False):
-        if len(group) >= 10:  # Minimum sample size for reliability
-            avg_lab_value = group[lab_metrics].mean()
-            avg_los = group['lengthofstay'].mean()
-            readmit_rate = group['readmit_flag'].mean() * 100
-            patient_count = len(group)
-            
-            # Format the range for better display
-            range_str = f"{lab_range.left:.2f} - {lab_range.right:.2f}"
-            
-            bubble_data.append({
-                'lab_value': avg_lab_value,
-                'avg_los': avg_los,
-                'readmit_rate': readmit_rate,
-                'patient_count': patient_count,
-                'lab_range': range_str
-            })
-    
-    if not bubble_data:
+    def compute():
+        # Trim percentiles come from the sketch index when the filters map onto whole cells
+        trim_bounds = None
+        if sketch_index is not None and sketch_scope is not None:
+            trim_bounds = tuple(sketch_index.quantile(lab_metrics, [0.05, 0.95], **sketch_scope))
+        return lab_bubble_stats(rows(), lab_metrics, trim_bounds=trim_bounds)
+    
+    # Outlier-trimmed, equal-width bins of the selected lab
+    bubble_df = cached_aggregate(filter_key, ('lab', lab_metrics), compute)
+    
+    if bubble_df.empty:
         st.warning("Insufficient data for bubble chart analysis")
         return
-        
-    bubble_df = pd.DataFrame(bubble_data)
     
     # Create bubble chart
     fig = px.scatter(
@@ -3101,12 +3261,9 @@ def create_lab_scatter(df):
     st.plotly_chart(fig, use_container_width=True)
     
 
-def create_trend_analysis(df):
+def create_trend_analysis(rows, filter_key):
     """Create trend analysis with Nordic styling"""
-    monthly_stats = df.groupby('month', observed=False).agg({
-        'lengthofstay': 'mean',
-        'eid': 'count'
-    }).reset_index()
+    monthly_stats = cached_aggregate(filter_key, 'monthly', lambda: monthly_trend_stats(rows()))
     
     fig = make_subplots(specs=[[{"secondary_y": True}]])
     
@@ -3153,8 +3310,81 @@ def create_trend_analysis(df):
     
     st.plotly_chart(fig, use_container_width=True)
 
-def create_detail_table(df):
-    """Create detailed patient table"""
+# Patient list columns and their display names
+PATIENT_LIST_COLUMNS = {
+    'full_name': 'Patient Name',
+    'risk_level': 'Risk Level',
+    'age_group': 'Age Group',
+    'vdate': 'Admission Date',
+    'gender': 'Gender',
+    'facid': 'Department',
+    'lengthofstay': 'Length of Stay',
+    'rcount': 'Risk Count'
+}
+
+def search_rows(positions, search_index, term, date_rank):
+    """The row positions matching a name/department/admission reason search, and the matched terms
+
+    Uses the trigram index over the full frame; typos fall back to close matches.
+    Rows come best match first (exact, then word prefix, then substring or
+    close match), most recent first among equally good ones.
+    """
+    found, scores, matches = search_index.scored_search(term)
+    score = np.zeros(search_index.n_rows)
+    score[found] = scores
+    hits = positions[score[positions] > 0]
+    return hits[np.lexsort((-date_rank[hits], -score[hits]))], matches
+
+def show_fuzzy_note(term, matches):
+    """Tell the user when results come from close matches rather than the exact text"""
+    if matches and matches[0][2] < 0.8:
+        suggestions = ", ".join(sorted({value.title() for _, value, _ in matches[:3]}))
+        st.caption(f"No exact match for '{term}' · showing close matches: {suggestions}")
+
+def sort_recent_first(positions, date_rank):
+    """Row positions ordered by admission date, most recent first, via the precomputed date rank"""
+    return positions[np.argsort(-date_rank[positions], kind='stable')]
+
+def show_patient_window(df, positions, key, page_size=50):
+    """Virtualized patient list: one dataframe over the visible page; clicking a row opens the patient"""
+    total_pages = max(1, (len(positions) - 1) // page_size + 1)
+    # A narrower search can leave the remembered page past the end
+    if st.session_state.get(f"{key}_page", 1) > total_pages:
+        st.session_state[f"{key}_page"] = total_pages
+    col_page1, col_page2, col_page3 = st.columns([1, 2, 1])
+    with col_page2:
+        current_page = st.number_input("Page", min_value=1, max_value=total_pages, step=1,
+                                       key=f"{key}_page")
+    current_page = int(current_page or 1)
+
+    # Only the visible window is formatted and sent to the browser
+    window = df.iloc[positions[(current_page - 1) * page_size:current_page * page_size]]
+    display = window[list(PATIENT_LIST_COLUMNS)].rename(columns=PATIENT_LIST_COLUMNS)
+    display['Admission Date'] = display['Admission Date'].dt.strftime('%Y-%m-%d')
+    display['Risk Level'] = np.where(window['risk_level'] == "High Risk", "● High Risk", "○ Standard Risk")
+    display['Length of Stay'] = display['Length of Stay'].astype(str) + " days"
+
+    event = st.dataframe(
+        display,
+        hide_index=True,
+        use_container_width=True,
+        on_select="rerun",
+        selection_mode="single-row",
+        key=f"{key}_table"
+    )
+    st.caption(f"Page {current_page} of {total_pages} · click a row to open the patient")
+
+    selected_rows = event.selection.rows if event else []
+    if selected_rows:
+        patient_id = window['eid'].iloc[selected_rows[0]]
+        # Drop the selection so coming back to the dashboard does not reopen the patient
+        del st.session_state[f"{key}_table"]
+        st.session_state.current_page = "patient_detail"
+        st.session_state.selected_patient = patient_id
+        st.rerun()
+
+def create_detail_table(df, positions, date_rank, search_index):
+    """Create detailed patient table over the filtered row positions of df"""
     
     # Full patient list
     st.markdown("<br>", unsafe_allow_html=True)
@@ -3163,16 +3393,16 @@ def create_detail_table(df):
     tab1, tab2 = st.tabs(["Full Patient List", "Search & Filter"])
     
     with tab1:
-        if not df.empty:
+        if len(positions):
             # Add search functionality at the top
             st.markdown("**Quick Search**")
             search_col1, search_col2, search_col3 = st.columns([2, 1, 1])
             
             with search_col1:
                 quick_search = st.text_input(
-                    "Search by name or department:", 
+                    "Search by name, department or reason:", 
                     key="quick_search_full_list",
-                    placeholder="Enter patient name or department..."
+                    placeholder="Enter patient name, department or admission reason..."
                 )
             
             with search_col2:
@@ -3191,212 +3421,43 @@ def create_detail_table(df):
             
             st.markdown("---")
             
-            display_cols = ['full_name', 'risk_level', 'age_group', 'vdate', 'gender', 'facid', 'lengthofstay', 'rcount']
-            full_list = df[display_cols].copy()
-            full_list['vdate'] = full_list['vdate'].dt.strftime('%Y-%m-%d')
-            
             # Apply search filters
-            search_applied = False
-            
-            # Text search filter
+            full_list = positions
+            if gender_filter != "All":
+                full_list = full_list[(df['gender'] == gender_filter).to_numpy()[full_list]]
             if quick_search:
-                search_mask = (
-                    df['full_name'].str.contains(quick_search, case=False, na=False) |
-                    df['facid'].str.contains(quick_search, case=False, na=False)
-                )
-                filtered_df_indices = df[search_mask].index
-                full_list = full_list.loc[filtered_df_indices]
-                search_applied = True
+                full_list, matches = search_rows(full_list, search_index, quick_search, date_rank)
+                show_fuzzy_note(quick_search, matches)
+            else:
+                full_list = sort_recent_first(full_list, date_rank)
             
-            # Gender filter
+            # Show different titles based on search
+            search_terms = []
+            if quick_search:
+                search_terms.append(f"'{quick_search}'")
             if gender_filter != "All":
-                if search_applied:
-                    # Apply gender filter to already filtered data
-                    gender_mask = df.loc[full_list.index, 'gender'] == gender_filter
-                    full_list = full_list[gender_mask]
-                else:
-                    # Apply gender filter to all data
-                    gender_mask = df['gender'] == gender_filter
-                    filtered_df_indices = df[gender_mask].index
-                    full_list = full_list.loc[filtered_df_indices]
-                search_applied = True
-            
-            # Rename columns for better display
-            full_list = full_list.rename(columns={
-                'full_name': 'Patient Name',
-                'risk_level': 'Risk Level',
-                'age_group': 'Age Group', 
-                'vdate': 'Admission Date',
-                'gender': 'Gender',
-                'facid': 'Department',
-                'lengthofstay': 'Length of Stay',
-                'rcount': 'Risk Count'
-            })
+                search_terms.append(f"Gender: {gender_filter}")
             
-            # Sort by admission date (most recent first)
-            full_list = full_list.sort_values('Admission Date', ascending=False)
-            
-            # Show different titles based on search
-            if search_applied:
-                search_terms = []
-                if quick_search:
-                    search_terms.append(f"'{quick_search}'")
-                if gender_filter != "All":
-                    search_terms.append(f"Gender: {gender_filter}")
-                
-                if search_terms:
-                    st.markdown(f"**Search Results** ({len(full_list)} patients matching {' & '.join(search_terms)})")
-                else:
-                    st.markdown(f"**Filtered Results** ({len(full_list)} patients)")
+            if search_terms:
+                st.markdown(f"**Search Results** ({len(full_list)} patients matching {' & '.join(search_terms)})")
             else:
                 st.markdown(f"**All Patients** ({len(full_list)} patients)")
             
-            # Add pagination for better performance
-            items_per_page = 20
-            total_pages = (len(full_list) - 1) // items_per_page + 1
-            
-            col_page1, col_page2, col_page3 = st.columns([1, 2, 1])
-            with col_page2:
-                current_page = st.selectbox("Page", range(1, total_pages + 1), key="full_list_page")
-            
-            # Ensure current_page is not None
-            if current_page is None:
-                current_page = 1
-                
-            start_idx = (current_page - 1) * items_per_page
-            end_idx = start_idx + items_per_page
-            page_data = full_list.iloc[start_idx:end_idx]
-            
-            # Column headers
-            header_col1, header_col2, header_col3, header_col4, header_col5, header_col6, header_col7, header_col8 = st.columns([2, 1, 1, 1, 1, 1, 1, 1])
-            with header_col1:
-                st.write("**Patient Name**")
-            with header_col2:
-                st.write("**Risk Level**")
-            with header_col3:
-                st.write("**Age Group**")
-            with header_col4:
-                st.write("**Admission Date**")
-            with header_col5:
-                st.write("**Gender**")
-            with header_col6:
-                st.write("**Department**")
-            with header_col7:
-                st.write("**Length of Stay**")
-            with header_col8:
-                st.write("**Risk Count**")
-            
-            st.divider()
-            
-            # Display patients with clickable names
-            for idx, row in page_data.iterrows():
-                col1, col2, col3, col4, col5, col6, col7, col8 = st.columns([2, 1, 1, 1, 1, 1, 1, 1])
-                
-                with col1:
-                    # Get original patient ID for this row
-                    patient_id = df.loc[idx, 'eid']
-                    if st.button(f"▸ {row['Patient Name']}", key=f"full_list_patient_{patient_id}"):
-                        st.session_state.current_page = "patient_detail"
-                        st.session_state.selected_patient = patient_id
-                        st.rerun()
-                
-                with col2:
-                    # Color code the risk level
-                    risk_color = "●" if row['Risk Level'] == "High Risk" else "○"
-                    st.write(f"{risk_color} {row['Risk Level']}")
-                with col3:
-                    st.write(row['Age Group'])
-                with col4:
-                    st.write(row['Admission Date'])
-                with col5:
-                    st.write(row['Gender'])
-                with col6:
-                    st.write(row['Department'])
-                with col7:
-                    st.write(f"{row['Length of Stay']} days")
-                with col8:
-                    st.write(row['Risk Count'])
+            show_patient_window(df, full_list, key="full_list")
         else:
             st.info("No patients found with current filters")
     
     with tab2:
         st.markdown("**Search Patients**")
-        search_term = st.text_input("Search by patient name or department:")
+        search_term = st.text_input("Search by patient name, department or admission reason:")
         
-        if search_term and not df.empty:
-            # Filter data based on search term
-            search_mask = (
-                df['full_name'].str.contains(search_term, case=False, na=False) |
-                df['facid'].str.contains(search_term, case=False, na=False)
-            )
-            search_results = df[search_mask]
+        if search_term and len(positions):
+            search_results, matches = search_rows(positions, search_index, search_term, date_rank)
             
-            if not search_results.empty:
-                display_cols = ['full_name', 'risk_level', 'age_group', 'vdate', 'gender', 'facid', 'lengthofstay', 'rcount']
-                search_display = search_results[display_cols].copy()
-                search_display['vdate'] = search_display['vdate'].dt.strftime('%Y-%m-%d')
-                
-                search_display = search_display.rename(columns={
-                    'full_name': 'Patient Name',
-                    'age_group': 'Age Group',
-                    'vdate': 'Admission Date', 
-                    'gender': 'Gender',
-                    'facid': 'Department',
-                    'lengthofstay': 'Length of Stay',
-                    'rcount': 'Risk Count'
-                })
-                
-                st.markdown(f"**Search Results** ({len(search_display)} patients)")
-                
-                # Column headers
-                header_col1, header_col2, header_col3, header_col4, header_col5, header_col6, header_col7, header_col8 = st.columns([2, 1, 1, 1, 1, 1, 1, 1])
-                with header_col1:
-                    st.write("**Patient Name**")
-                with header_col2:
-                    st.write("**Risk Level**")
-                with header_col3:
-                    st.write("**Age Group**")
-                with header_col4:
-                    st.write("**Admission Date**")
-                with header_col5:
-                    st.write("**Gender**")
-                with header_col6:
-                    st.write("**Department**")
-                with header_col7:
-                    st.write("**Length of Stay**")
-                with header_col8:
-                    st.write("**Risk Count**")
-                
-                st.divider()
-                
-                # Display search results with clickable names
-                for idx, row in search_display.iterrows():
-                    col1, col2, col3, col4, col5, col6, col7, col8 = st.columns([2, 1, 1, 1, 1, 1, 1, 1])
-                    
-                    with col1:
-                        # Get original patient ID for this row
-                        patient_id = search_results.loc[idx, 'eid']
-                        if st.button(f"▸ {row['Patient Name']}", key=f"search_patient_{patient_id}"):
-                            st.session_state.current_page = "patient_detail"
-                            st.session_state.selected_patient = patient_id
-                            st.rerun()
-                    
-                    with col2:
-                        # Color code the risk level
-                        risk_color = "●" if row['Risk Level'] == "High Risk" else "○"
-                        st.write(f"{risk_color} {row['Risk Level']}")
-                    with col3:
-                        st.write(row['Age Group'])
-                    with col4:
-                        st.write(row['Admission Date'])
-                    with col5:
-                        st.write(row['Gender'])
-                    with col6:
-                        st.write(row['Department'])
-                    with col7:
-                        st.write(f"{row['Length of Stay']} days")
-                    with col8:
-                        st.write(row['Risk Count'])
+            if len(search_results):
+                show_fuzzy_note(search_term, matches)
+                st.markdown(f"**Search Results** ({len(search_results)} patients)")
+                show_patient_window(df, search_results, key="search_list")
             else:
                 st.info(f"No patients found matching '{search_term}'")
 
@@ -4526,27 +4587,118 @@ def add_patient_chat(patient):
     function speakWithBrowser(text) {{
         if (speechSynthesis) {{
             speechSynthesis.cancel();
+            speechSynthesis.speak(browserUtterance(text));
+        }}
+    }}
 
-            const cleanText = cleanTextForSpeech(text);
-            const utterance = new SpeechSynthesisUtterance(cleanText);
-            utterance.lang = 'en-US';
-            utterance.rate = 1.0;
-            utterance.pitch = 1.0;
-            utterance.volume = 1.0;
-
-            const voices = speechSynthesis.getVoices();
-            const preferredVoice = voices.find(voice =>
-                voice.name.includes('Samantha') ||
-                voice.name.includes('Google US English') ||
-                voice.name.includes('Microsoft Zira')
-            );
-
-            if (preferredVoice) {{
-                utterance.voice = preferredVoice;
-            }}
+    function browserUtterance(text) {{
+        const cleanText = cleanTextForSpeech(text);
+        const utterance = new SpeechSynthesisUtterance(cleanText);
+        utterance.lang = 'en-US';
+        utterance.rate = 1.0;
+        utterance.pitch = 1.0;
+        utterance.volume = 1.0;
+
+        const voices = speechSynthesis.getVoices();
+        const preferredVoice = voices.find(voice =>
+            voice.name.includes('Samantha') ||
+            voice.name.includes('Google US English') ||
+            voice.name.includes('Microsoft Zira')
+        );
+
+        if (preferredVoice) {{
+            utterance.voice = preferredVoice;
+        }}
+        return utterance;
+    }}
 
-            speechSynthesis.speak(utterance);
+    // Sentence-by-sentence speech while a reply streams in: each sentence's TTS request
+    // starts as soon as the sentence is complete, playback stays in order
+    let speechChain = Promise.resolve();
+
+    async function fetchSpeech(text) {{
+        if (!API_KEY || API_KEY === '') {{
+            return null;
         }}
+        try {{
+            const response = await fetch('https://api.openai.com/v1/audio/speech', {{
+                method: 'POST',
+                headers: {{
+                    'Authorization': `Bearer ${{API_KEY}}`,
+                    'Content-Type': 'application/json'
+                }},
+                body: JSON.stringify({{
+                    model: 'tts-1',
+                    voice: 'nova',
+                    input: cleanTextForSpeech(text),
+                    speed: 1.0
+                }})
+            }});
+            if (!response.ok) {{
+                throw new Error('TTS API failed');
+            }}
+            return new Audio(URL.createObjectURL(await response.blob()));
+        }} catch (error) {{
+            console.error('OpenAI TTS error:', error);
+            return null;
+        }}
+    }}
+
+    function playToEnd(audio, text) {{
+        return new Promise(resolve => {{
+            if (!audio) {{
+                if (!speechSynthesis) {{
+                    resolve();
+                    return;
+                }}
+                const utterance = browserUtterance(text);
+                utterance.onend = resolve;
+                utterance.onerror = resolve;
+                speechSynthesis.speak(utterance);
+                return;
+            }}
+            audio.onended = () => {{
+                URL.revokeObjectURL(audio.src);
+                resolve();
+            }};
+            audio.onerror = resolve;
+            audio.play().catch(resolve);
+        }});
+    }}
+
+    function queueSpeech(sentence) {{
+        const audio = fetchSpeech(sentence);
+        speechChain = speechChain.then(() => audio).then(result => playToEnd(result, sentence));
+    }}
+
+    // Same rules as llm_client.SentenceSplitter: short pieces ("1.", "Dr.") join the next sentence
+    const MIN_SENTENCE_CHARS = 12;
+
+    function makeSentenceSplitter(onSentence) {{
+        let buffer = '';
+        return {{
+            feed(delta) {{
+                const pieces = (buffer + delta).split(/(?<=[.!?])\s+|(?<=[。！？])|\n+/);
+                buffer = pieces.pop();
+                let pending = '';
+                for (const piece of pieces) {{
+                    pending = (pending + ' ' + piece.trim()).trim();
+                    if (pending.length >= MIN_SENTENCE_CHARS) {{
+                        onSentence(pending);
+                        pending = '';
+                    }}
+                }}
+                if (pending) {{
+                    buffer = pending + ' ' + buffer;
+                }}
+            }},
+            flush() {{
+                if (buffer.trim()) {{
+                    onSentence(buffer.trim());
+                }}
+                buffer = '';
+            }}
+        }};
     }}
 
     // Main speech function - use OpenAI TTS for natural voice
@@ -4554,12 +4706,14 @@ def add_patient_chat(patient):
         speakWithOpenAI(text);
     }}
 
-    // Get intelligent response using OpenAI GPT
-    async function getGPTResponse(userMessage) {{
+    // Get intelligent response using OpenAI GPT, streamed: onDelta(delta, textSoFar) runs as tokens arrive.
+    // Returns the full text, or null when the request fails before any text arrived.
+    async function streamGPTResponse(userMessage, onDelta) {{
         if (!API_KEY || API_KEY === '') {{
-            return generatePatientResponse(userMessage);
+            return null;
         }}
 
+        let text = '';
         try {{
             const response = await fetch('https://api.openai.com/v1/chat/completions', {{
                 method: 'POST',
@@ -4591,7 +4745,8 @@ Bad example: "Carol Thomas, a 64-year-old female, has been in the hospital for 3
                         {{ role: 'user', content: userMessage }}
                     ],
                     temperature: 0.7,
-                    max_tokens: 150
+                    max_tokens: 150,
+                    stream: true
                 }})
             }});
 
@@ -4599,11 +4754,37 @@ Bad example: "Carol Thomas, a 64-year-old female, has been in the hospital for 3
                 throw new Error('GPT API failed');
             }}
 
-            const data = await response.json();
-            return data.choices[0].message.content;
+            // Server-sent events: one "data: {{json}}" line per token chunk, then "data: [DONE]"
+            const reader = response.body.getReader();
+            const decoder = new TextDecoder();
+            let buffer = '';
+            while (true) {{
+                const {{ done, value }} = await reader.read();
+                if (done) {{
+                    break;
+                }}
+                buffer += decoder.decode(value, {{ stream: true }});
+                const lines = buffer.split('\n');
+                buffer = lines.pop();
+                for (const line of lines) {{
+                    if (!line.startsWith('data: ')) {{
+                        continue;
+                    }}
+                    const data = line.slice(6).trim();
+                    if (data === '[DONE]') {{
+                        continue;
+                    }}
+                    const delta = JSON.parse(data).choices[0]?.delta?.content;
+                    if (delta) {{
+                        text += delta;
+                        onDelta(delta, text);
+                    }}
+                }}
+            }}
+            return text;
         }} catch (error) {{
             console.error('GPT API error:', error);
-            return generatePatientResponse(userMessage);
+            return text || null;
         }}
     }}
 
@@ -4632,8 +4813,20 @@ Bad example: "Carol Thomas, a 64-year-old female, has been in the hospital for 3
 
         chatMessages.scrollTop = chatMessages.scrollHeight;
 
-        // Get concise response from GPT (same for screen and voice)
-        const response = await getGPTResponse(message);
+        // Get concise response from GPT (same for screen and voice): shown as it streams in,
+        // each sentence spoken as soon as it is complete
+        const splitter = makeSentenceSplitter(queueSpeech);
+        let response = await streamGPTResponse(message, (delta, text) => {{
+            loadingMsg.innerHTML = text;
+            chatMessages.scrollTop = chatMessages.scrollHeight;
+            splitter.feed(delta);
+        }});
+        const streamed = response !== null;
+        if (streamed) {{
+            splitter.flush();
+        }} else {{
+            response = generatePatientResponse(message);
+        }}
 
         const loading = document.getElementById('loading-msg');
         if (loading) {{
@@ -4646,8 +4839,10 @@ Bad example: "Carol Thomas, a 64-year-old female, has been in the hospital for 3
 
             chatMessages.scrollTop = chatMessages.scrollHeight;
 
-            // Speak the same concise response
-            speakResponse(response);
+            // Speak the same concise response (already queued sentence by sentence when streamed)
+            if (!streamed) {{
+                speakResponse(response);
+            }}
         }}
     }};
     </script>
@@ -4659,7 +4854,9 @@ Bad example: "Carol Thomas, a 64-year-old female, has been in the hospital for 3
 def get_chatgpt_response(user_message, context=""):
     """Get response from ChatGPT API"""
     try:
-        client = openai.OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+        client = get_openai_client(os.getenv("OPENAI_API_KEY"))
+        if client is None:
+            raise ValueError("OPENAI_API_KEY is not set")
         
         system_prompt = """You are a helpful AI assistant specialized in healthcare analytics and data interpretation. 
         You are integrated into a hospital management dashboard that shows:
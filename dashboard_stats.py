@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+"""
+Dashboard aggregates and an LRU cache keyed by filter state
+"""
+
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+DISEASE_NAMES = {
+    'dialysisrenalendstage': 'Renal Disease',
+    'asthma': 'Asthma',
+    'irondef': 'Iron Deficiency',
+    'pneum': 'Pneumonia',
+    'substancedependence': 'Substance Abuse',
+    'psychologicaldisordermajor': 'Psychological Disorder',
+    'depress': 'Depression',
+    'psychother': 'Psychotherapy',
+    'fibrosisandother': 'Fibrosis',
+    'malnutrition': 'Malnutrition'
+}
+
+LAB_METRICS = ['creatinine', 'glucose', 'hematocrit', 'neutrophils', 'sodium', 'bloodureanitro']
+
+# Numeric columns with per-department, per-month quantile sketches
+SKETCH_COLUMNS = ['lengthofstay'] + LAB_METRICS
+
+
+def filter_state_key(version, **filters):
+    """Canonical hash of the dataset version plus the sidebar filter values"""
+    canonical = {'version': version}
+    for name, value in filters.items():
+        if isinstance(value, (list, tuple, set)):
+            value = sorted(str(v) for v in value)
+        else:
+            value = str(value)
+        canonical[name] = value
+    payload = json.dumps(canonical, sort_keys=True)
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+
+class AggregateCache:
+    """Thread-safe LRU of small aggregate results shared by all sessions"""
+
+    def __init__(self, maxsize=256):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_compute(self, key, compute):
+        """Return the cached value for key, computing and storing it on a miss"""
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+
+        value = compute()
+
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+def kpi_stats(df):
+    """Headline KPIs for the filtered admissions"""
+    avg_los = df['lengthofstay'].mean()
+    return {
+        'avg_los': avg_los,
+        'long_stay_rate': (df['lengthofstay'] > 7).mean() * 100,
+        'readmit_rate': df['readmit_flag'].mean() * 100,
+        'turnover': 365 / avg_los,
+    }
+
+
+def dept_stats(df, min_count=10):
+    """Mean LOS and admission count per department, sorted by mean"""
+    stats = df.groupby('facid', observed=False)['lengthofstay'].agg(['mean', 'count']).reset_index()
+    return stats[stats['count'] >= min_count].sort_values('mean', ascending=True)
+
+
+def condition_los_stats(df, condition_cols, by=None, block_rows=32768):
+    """Per-condition LOS counts and means from one flag-matrix product
+
+    Computes counts = F^T 1 and LOS sums = F^T los for the n x k flag matrix F,
+    against a one-hot matrix of `by` groups so the condition x group table comes
+    out of the same pass. Rows are processed in fixed-size blocks, so cost is
+    linear in rows x conditions and memory stays bounded.
+    Returns (overall, by_group): overall is indexed by condition with `count` and
+    `avg_los` columns; by_group maps 'count'/'avg_los' to condition x group
+    frames, or is None when by is None.
+    """
+    n_conditions = len(condition_cols)
+    los = df['lengthofstay'].to_numpy(dtype=np.float64)
+
+    if by is not None:
+        codes, groups = pd.factorize(df[by], sort=True)
+    else:
+        codes, groups = np.zeros(len(df), dtype=np.int64), []
+    # One extra slot collects rows without a group so they still count overall
+    n_slots = len(groups) + 1
+    codes = np.where(codes >= 0, codes, n_slots - 1)
+
+    # float32 blocks keep BLAS fast; per-block integer sums stay exact below 2**24
+    flag_columns = [df[col].to_numpy() for col in condition_cols]
+    totals = np.zeros((n_conditions, 2 * n_slots))
+    for start in range(0, len(df), block_rows):
+        stop = start + block_rows
+        flags = np.column_stack([col[start:stop] == 1 for col in flag_columns]).astype(np.float32)
+        # Right-hand side [one-hot(group) | one-hot(group) * los], so one product yields counts and sums
+        block_codes = codes[start:stop]
+        rows = np.arange(len(block_codes))
+        weights = np.zeros((len(block_codes), 2 * n_slots), dtype=np.float32)
+        weights[rows, block_codes] = 1.0
+        weights[rows, n_slots + block_codes] = los[start:stop]
+        totals += flags.T @ weights
+    counts, sums = totals[:, :n_slots], totals[:, n_slots:]
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        overall_count = counts.sum(axis=1)
+        overall = pd.DataFrame({
+            'count': overall_count.astype(np.int64),
+            'avg_los': sums.sum(axis=1) / overall_count,
+        }, index=condition_cols)
+
+        by_group = None
+        if by is not None:
+            group_counts = counts[:, :len(groups)]
+            by_group = {
+                'count': pd.DataFrame(group_counts.astype(np.int64), index=condition_cols, columns=list(groups)),
+                'avg_los': pd.DataFrame(sums[:, :len(groups)] / group_counts, index=condition_cols, columns=list(groups)),
+            }
+    return overall, by_group
+
+
+def disease_impact_tables(df, disease_cols, min_count=5):
+    """Condition LOS table and condition x department LOS grid from a single pass
+
+    Returns (table, by_dept): table has condition/avg_los/count rows for conditions
+    with at least min_count patients, sorted by avg_los; by_dept is a condition x
+    department frame of average LOS with sparse cells blanked out.
+    """
+    overall, by_group = condition_los_stats(df, disease_cols, by='facid')
+    names = [DISEASE_NAMES.get(disease, disease) for disease in disease_cols]
+
+    keep = (overall['count'] >= min_count).to_numpy()
+    table = pd.DataFrame({
+        'condition': np.array(names)[keep],
+        'avg_los': overall['avg_los'].to_numpy()[keep],
+        'count': overall['count'].to_numpy()[keep],
+    }).sort_values('avg_los', ascending=True)
+
+    by_dept = by_group['avg_los'].where(by_group['count'] >= min_count)
+    by_dept.index = names
+    by_dept = by_dept.dropna(how='all')
+    return table, by_dept
+
+
+def lab_bubble_stats(df, lab_metric, min_count=10, trim_bounds=None):
+    """Equal-width lab value bins with mean LOS, readmission rate and size
+
+    trim_bounds is an optional (5th, 95th) percentile pair, e.g. from a
+    SketchIndex; without it the percentiles are computed exactly.
+    """
+    clean_df = df.dropna(subset=[lab_metric, 'lengthofstay'])
+
+    # Remove outliers for better visualization
+    if trim_bounds is None:
+        q1 = clean_df[lab_metric].quantile(0.05)
+        q99 = clean_df[lab_metric].quantile(0.95)
+    else:
+        q1, q99 = trim_bounds
+    clean_df = clean_df[(clean_df[lab_metric] >= q1) & (clean_df[lab_metric] <= q99)]
+
+    # Create 8-12 equal-width bins based on value range
+    min_val = clean_df[lab_metric].min()
+    max_val = clean_df[lab_metric].max()
+    n_bins = min(12, max(8, int((max_val - min_val) / (clean_df[lab_metric].std() * 0.5))))
+    lab_bins = pd.cut(clean_df[lab_metric], bins=n_bins, include_lowest=True)
+
+    bubble_data = []
+    for lab_range, group in clean_df.groupby(lab_bins, observed=False):
+        if len(group) >= min_count:  # Minimum sample size for reliability
+            bubble_data.append({
+                'lab_value': group[lab_metric].mean(),
+                'avg_los': group['lengthofstay'].mean(),
+                'readmit_rate': group['readmit_flag'].mean() * 100,
+                'patient_count': len(group),
+                'lab_range': f"{lab_range.left:.2f} - {lab_range.right:.2f}"
+            })
+    return pd.DataFrame(bubble_data)
+
+
+def monthly_trend_stats(df):
+    """Mean LOS and admission volume per month"""
+    return df.groupby('month', observed=True).agg({
+        'lengthofstay': 'mean',
+        'eid': 'count'
+    }).reset_index()
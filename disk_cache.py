@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+"""
+Two-tier LRU cache: a bounded in-memory tier in front of a size-bounded SQLite file,
+with optional expiry of entries by age
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+MEMORY_ITEMS = 512                  # entries kept in process memory
+DISK_BYTES = 64 * 1024 * 1024       # value bytes kept in the SQLite tier
+
+SCHEMA_SQL = '''
+    CREATE TABLE IF NOT EXISTS cache_entries (
+        key TEXT PRIMARY KEY,
+        value BLOB NOT NULL,
+        size INTEGER NOT NULL,
+        last_used REAL NOT NULL,
+        created REAL NOT NULL
+    )
+'''
+
+
+def normalize_text(text):
+    """Unicode NFC with runs of whitespace collapsed, so trivially different spellings share an entry
+
+    Case is kept: embeddings are case-sensitive.
+    """
+    return ' '.join(unicodedata.normalize('NFC', text).split())
+
+
+def cache_key(*parts):
+    """SHA-256 hex digest of the parts, separated so ('ab', 'c') and ('a', 'bc') differ"""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(str(part).encode('utf-8'))
+        digest.update(b'\x00')
+    return digest.hexdigest()
+
+
+class TwoTierCache:
+    """Thread-safe LRU of bytes values shared across sessions and process restarts
+
+    Lookups check the in-memory tier first, then the SQLite file; a disk hit is
+    promoted to memory. Every put is written through to disk. The memory tier
+    holds at most memory_items entries; the disk tier drops its least recently
+    used entries once stored values exceed disk_bytes. The file is opened on
+    first use; path=None keeps the memory tier only. A disk tier that cannot be
+    opened or written degrades to memory-only instead of failing the caller.
+    With ttl (seconds), entries older than ttl since their put are misses and
+    are dropped from both tiers when found.
+    """
+
+    def __init__(self, path=None, memory_items=MEMORY_ITEMS, disk_bytes=DISK_BYTES, ttl=None):
+        self.path = path
+        self.memory_items = memory_items
+        self.disk_bytes = disk_bytes
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn = None
+        self._disk_failed = path is None
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def _disk(self):
+        """The SQLite connection, opened on first use; None when there is no usable disk tier"""
+        if self._conn is None and not self._disk_failed:
+            try:
+                directory = os.path.dirname(self.path)
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+                conn = sqlite3.connect(self.path, check_same_thread=False, timeout=5.0)
+                conn.execute("PRAGMA journal_mode = WAL")
+                conn.execute("PRAGMA synchronous = NORMAL")
+                conn.execute(SCHEMA_SQL)
+                conn.execute('CREATE INDEX IF NOT EXISTS cache_entries_last_used ON cache_entries (last_used)')
+                if self.ttl is not None:
+                    # Entries that expired while no process was running
+                    conn.execute('DELETE FROM cache_entries WHERE created < ?', (time.time() - self.ttl,))
+                conn.commit()
+                self._conn = conn
+            except (OSError, sqlite3.Error) as e:
+                print(f"Cache file unavailable, keeping entries in memory only: {e}")
+                self._disk_failed = True
+        return self._conn
+
+    def _remember(self, key, value, created):
+        self._entries[key] = (value, created)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.memory_items:
+            self._entries.popitem(last=False)
+
+    def _expired(self, created, now):
+        return self.ttl is not None and now - created > self.ttl
+
+    def _expire(self, key, conn):
+        """Drop an entry past its ttl from both tiers"""
+        self._entries.pop(key, None)
+        self.expirations += 1
+        if conn is not None:
+            try:
+                conn.execute('DELETE FROM cache_entries WHERE key = ?', (key,))
+                conn.commit()
+            except sqlite3.Error as e:
+                print(f"Cache write failed: {e}")
+
+    def get(self, key):
+        """The cached bytes for key, or None"""
+        now = time.time()
+        with self._lock:
+            if key in self._entries:
+                value, created = self._entries[key]
+                if not self._expired(created, now):
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                self._expire(key, self._disk())
+                self.misses += 1
+                return None
+
+            conn = self._disk()
+            if conn is not None:
+                try:
+                    row = conn.execute('SELECT value, created FROM cache_entries WHERE key = ?', (key,)).fetchone()
+                    if row is not None and not self._expired(row[1], now):
+                        conn.execute('UPDATE cache_entries SET last_used = ? WHERE key = ?', (now, key))
+                        conn.commit()
+                except sqlite3.Error as e:
+                    print(f"Cache read failed: {e}")
+                    row = None
+                if row is not None:
+                    if self._expired(row[1], now):
+                        self._expire(key, conn)
+                        self.misses += 1
+                        return None
+                    value = bytes(row[0])
+                    self._remember(key, value, row[1])
+                    self.hits += 1
+                    self.disk_hits += 1
+                    return value
+
+            self.misses += 1
+            return None
+
+    def put(self, key, value):
+        """Store bytes under key in both tiers, evicting least recently used disk entries over budget"""
+        value = bytes(value)
+        now = time.time()
+        with self._lock:
+            self._remember(key, value, now)
+            conn = self._disk()
+            if conn is None:
+                return
+            try:
+                conn.execute('INSERT OR REPLACE INTO cache_entries (key, value, size, last_used, created) '
+                             'VALUES (?, ?, ?, ?, ?)', (key, value, len(value), now, now))
+                self._evict(conn)
+                conn.commit()
+            except sqlite3.Error as e:
+                conn.rollback()
+                print(f"Cache write failed: {e}")
+
+    def _disk_bytes(self, conn):
+        return conn.execute('SELECT COALESCE(SUM(size), 0) FROM cache_entries').fetchone()[0]
+
+    def _evict(self, conn):
+        """Drop least recently used disk entries until the stored values fit disk_bytes
+
+        Runs in the put's write transaction and sums the sizes there, so
+        processes sharing the file all trim against the real total.
+        """
+        total = self._disk_bytes(conn)
+        while total > self.disk_bytes:
+            victims = conn.execute('SELECT key, size FROM cache_entries ORDER BY last_used LIMIT 64').fetchall()
+            if not victims:
+                return
+            for key, size in victims:
+                if total <= self.disk_bytes:
+                    break
+                conn.execute('DELETE FROM cache_entries WHERE key = ?', (key,))
+                total -= size
+                self.evictions += 1
+
+    def stats(self):
+        """Hit/miss counters and current tier sizes"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            conn = self._disk()
+            try:
+                disk_bytes = self._disk_bytes(conn) if conn is not None else 0
+            except sqlite3.Error:
+                disk_bytes = None
+            return {
+                'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'memory_entries': len(self._entries),
+                'disk_bytes': disk_bytes,
+            }
+
+    def clear(self):
+        """Drop every entry from both tiers"""
+        with self._lock:
+            self._entries.clear()
+            conn = self._disk()
+            if conn is not None:
+                conn.execute('DELETE FROM cache_entries')
+                conn.commit()
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def __len__(self):
+        return len(self._entries)
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Precomputed condition -> evidence lookup table for the fixed symptom vocabulary
+"""
+
+import hashlib
+import json
+import os
+
+# Chunks stored per condition set; lookups for fewer take the head of the list
+EVIDENCE_TOP_K = 10
+EVIDENCE_FORMAT_VERSION = 1
+
+
+def evidence_path(db_path, table='chunks'):
+    """Where the evidence table for a RAG table is kept, next to the database"""
+    return f"{os.path.splitext(db_path)[0]}.{table}.evidence.json"
+
+
+def condition_key(symptoms):
+    """Order-independent key of a detected symptom set"""
+    return '|'.join(sorted(set(symptoms)))
+
+
+def condition_query(symptoms):
+    """The retrieval query for a symptom set, the same whatever order the symptoms were detected in"""
+    return ' '.join(sorted(set(symptoms)))
+
+
+def file_stamp(path):
+    """Size and modification time of a file, or None when it does not exist"""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def corpus_version(parts):
+    """Digest of everything retrieval results depend on: corpus files, fingerprints and search settings"""
+    payload = json.dumps({'format': EVIDENCE_FORMAT_VERSION, **parts}, sort_keys=True)
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+
+def save_evidence_table(path, version, engines, entries, top_k=EVIDENCE_TOP_K):
+    """Write {condition key: [[chunk_id, relevance, retrieved_by], ...]} atomically"""
+    table = {'version': version, 'engines': sorted(engines), 'top_k': top_k, 'entries': entries}
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(table, f)
+    os.replace(tmp_path, path)
+
+
+def load_evidence_table(path, version):
+    """The stored table if it was built for this corpus version, else None"""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            table = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if table.get('version') != version:
+        print(f"Evidence table {path} is out of date; re-run scripts/build_evidence_table.py")
+        return None
+    return table
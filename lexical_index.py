@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+SQLite FTS5 keyword index with BM25 ranking for the paper chunk tables
+"""
+
+import re
+
+# Indexed columns per chunk table, and bm25() column weights (default 1.0):
+# a term in a title counts three times one in the chunk text
+FTS_COLUMNS = {
+    'paper_chunks': ('title', 'chunk_text'),
+    'chunks': ('chunk_text',),
+}
+COLUMN_WEIGHTS = {'title': 3.0}
+
+# Hits below this BM25 score matched only terms found in nearly every chunk
+MIN_BM25_SCORE = 0.1
+
+STOPWORDS = frozenset("""
+a an and are as at be by for from has have in is it its of on or that the this to was were what which
+with how why when who does do did can could should would
+""".split())
+
+
+def fts_table(table='paper_chunks'):
+    """Name of the FTS5 index over a chunk table"""
+    return f"{table}_fts"
+
+
+def bm25_weights(table='paper_chunks'):
+    """bm25() weight arguments for the FTS index of table"""
+    return tuple(COLUMN_WEIGHTS.get(column, 1.0) for column in FTS_COLUMNS[table])
+
+
+def build_fts_index(conn, table='paper_chunks'):
+    """(Re)build the FTS5 index over table and keep it in sync with triggers
+
+    The index uses external content (the chunk text is not stored twice) and
+    the porter stemmer, so "hospitalization" also matches "hospitalizations".
+    """
+    fts = fts_table(table)
+    columns = ', '.join(FTS_COLUMNS[table])
+    new_values = ', '.join(f"new.{column}" for column in FTS_COLUMNS[table])
+    old_values = ', '.join(f"old.{column}" for column in FTS_COLUMNS[table])
+    conn.executescript(f'''
+        DROP TABLE IF EXISTS {fts};
+        CREATE VIRTUAL TABLE {fts} USING fts5(
+            {columns}, content='{table}', content_rowid='id', tokenize='porter unicode61'
+        );
+        INSERT INTO {fts}({fts}) VALUES ('rebuild');
+
+        DROP TRIGGER IF EXISTS {fts}_ai;
+        DROP TRIGGER IF EXISTS {fts}_ad;
+        DROP TRIGGER IF EXISTS {fts}_au;
+        CREATE TRIGGER {fts}_ai AFTER INSERT ON {table} BEGIN
+            INSERT INTO {fts}(rowid, {columns}) VALUES (new.id, {new_values});
+        END;
+        CREATE TRIGGER {fts}_ad AFTER DELETE ON {table} BEGIN
+            INSERT INTO {fts}({fts}, rowid, {columns}) VALUES ('delete', old.id, {old_values});
+        END;
+        CREATE TRIGGER {fts}_au AFTER UPDATE ON {table} BEGIN
+            INSERT INTO {fts}({fts}, rowid, {columns}) VALUES ('delete', old.id, {old_values});
+            INSERT INTO {fts}(rowid, {columns}) VALUES (new.id, {new_values});
+        END;
+    ''')
+    conn.commit()
+
+
+def query_terms(text):
+    """Distinct lowercase word tokens of a query, without stopwords, in order"""
+    terms = []
+    for term in re.findall(r"[a-z0-9]+", (text or '').lower()):
+        if term not in STOPWORDS and term not in terms:
+            terms.append(term)
+    return terms
+
+
+def match_expression(text):
+    """FTS5 MATCH expression: any query term (quoted, so no FTS syntax leaks through); None if no terms"""
+    terms = query_terms(text)
+    if not terms:
+        return None
+    return ' OR '.join(f'"{term}"' for term in terms)
@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+"""
+Shared patient dataset that takes new admissions without a full reload
+
+The dashboard holds the whole derived frame in memory: the filter, person,
+search and sketch indexes, the patient table and the patient pages all need
+every row, so the store is read in full once per process and then kept
+current incrementally. The store keeps ingestion memory bounded and makes
+appends cheap; read_store(columns=, filters=) pushdown is there for
+queries that only need a slice (scripts, exports), not for this frame.
+"""
+
+import os
+import threading
+from collections import namedtuple
+
+import pandas as pd
+
+from dashboard_stats import SKETCH_COLUMNS
+from patient_data import (CACHE_DIR, DATA_FILE, DERIVED_COLS, STORE_DIR, _order_columns, append_store_part,
+                          apply_schema, apply_thresholds, compute_thresholds, current_version,
+                          derive_row_columns, load_patient_frame, read_store, read_store_manifest,
+                          read_store_parts, sketch_thresholds, store_exists, store_source_changed,
+                          thresholds_equivalent)
+from patient_index import PersonIndex, SearchIndex, SegmentedFilterIndex
+from quantile_sketch import KLLSketch, SketchIndex
+
+DatasetSnapshot = namedtuple('DatasetSnapshot', ['version', 'frame', 'filter_index', 'sketch_index',
+                                                 'person_index', 'search_index'])
+
+
+def _concat_segments(segments):
+    """Concatenate frame segments, unioning category sets so categoricals survive"""
+    first = segments[0]
+    aligned = [segment.copy(deep=False) for segment in segments]
+    for col in first.columns:
+        dtype = first[col].dtype
+        if not isinstance(dtype, pd.CategoricalDtype) or dtype.ordered:
+            continue
+        categories = pd.Index(dtype.categories)
+        for segment in segments[1:]:
+            categories = categories.append(pd.Index(segment[col].cat.categories)).unique()
+        for segment in aligned:
+            if not segment[col].cat.categories.equals(categories):
+                segment[col] = segment[col].cat.set_categories(categories)
+    return pd.concat(aligned, ignore_index=True)
+
+
+class LiveDataset:
+    """Derived patient frame plus its filter/sketch indexes, kept current by appends
+
+    append_admissions() derives only the new rows, folds their LOS into the
+    running quantile sketch, indexes them as a new segment and persists them as
+    one more store part. Existing rows are only re-thresholded when the running
+    LOS percentiles move enough to change is_long_stay/risk_level.
+
+    After the first append the store, not the CSV, is the source of truth:
+    later edits to the CSV are not shown, and source_changed reports them.
+    """
+
+    def __init__(self, df, thresholds, los_sketch, version, parts=None, source=None,
+                 csv_path=DATA_FILE, store_dir=STORE_DIR, cache_dir=CACHE_DIR):
+        self.csv_path = csv_path
+        self.store_dir = store_dir
+        self.cache_dir = cache_dir
+        self._lock = threading.RLock()
+        self._listeners = []
+        self._reset(df, thresholds, los_sketch, version, parts, source)
+
+    def _reset(self, df, thresholds, los_sketch, version, parts, source):
+        self._segments = [df]
+        self._frame = df
+        self.thresholds = dict(thresholds)
+        self.los_sketch = los_sketch
+        self.version = version
+        # Store parts already loaded; None while the data still comes from the CSV
+        self.parts = list(parts) if parts is not None else None
+        self.source = source
+        self.raw_columns = [col for col in df.columns if col not in DERIVED_COLS]
+        self.filter_index = SegmentedFilterIndex(df)
+        self.sketch_index = SketchIndex(df, SKETCH_COLUMNS)
+        self.person_index = PersonIndex(df)
+        self.search_index = SearchIndex(df)
+        self.source_changed = self.parts is not None and store_source_changed(self.csv_path, self.store_dir,
+                                                                              self.cache_dir)
+
+    @staticmethod
+    def _load_state(csv_path, store_dir, cache_dir):
+        if store_exists(store_dir):
+            manifest = read_store_manifest(store_dir)
+            # Every column and row: the indexes and pages are built over the full frame
+            df = read_store(store_dir)
+            los_sketch = KLLSketch.from_dict(manifest['los_sketch'])
+            return df, manifest['thresholds'], los_sketch, manifest['version'], manifest['parts'], manifest.get('source')
+        df = load_patient_frame(csv_path, cache_dir)
+        los_sketch = KLLSketch().update(df['lengthofstay'].to_numpy())
+        thresholds = compute_thresholds(df['lengthofstay'])
+        return df, thresholds, los_sketch, df.attrs['dataset_version'], None, os.path.basename(csv_path)
+
+    @classmethod
+    def load(cls, csv_path=DATA_FILE, store_dir=STORE_DIR, cache_dir=CACHE_DIR):
+        """Load from the chunked store when one exists, else from the CSV cache"""
+        state = cls._load_state(csv_path, store_dir, cache_dir)
+        return cls(*state, csv_path=csv_path, store_dir=store_dir, cache_dir=cache_dir)
+
+    def on_change(self, callback):
+        """Call callback(version) after every append or refresh"""
+        self._listeners.append(callback)
+
+    def __len__(self):
+        return sum(len(segment) for segment in self._segments)
+
+    @property
+    def frame(self):
+        """The full derived frame; appended batches are concatenated on first access"""
+        with self._lock:
+            if len(self._segments) > 1:
+                self._frame = _concat_segments(self._segments)
+                self._segments = [self._frame]
+            self._frame.attrs['dataset_version'] = self.version
+            return self._frame
+
+    def snapshot(self):
+        """Version, frame and indexes taken consistently"""
+        with self._lock:
+            return DatasetSnapshot(self.version, self.frame, self.filter_index, self.sketch_index,
+                                   self.person_index, self.search_index)
+
+    def _prepare_batch(self, records):
+        batch = records.copy() if isinstance(records, pd.DataFrame) else pd.DataFrame.from_records(records)
+        missing = [col for col in self.raw_columns if col not in batch.columns]
+        if missing:
+            raise ValueError(f"Admissions are missing columns: {missing}")
+        batch = batch[self.raw_columns].reset_index(drop=True)
+        batch['rcount'] = batch['rcount'].astype(str)
+        return apply_schema(derive_row_columns(batch))
+
+    def _ingest(self, batch, thresholds):
+        """Add row-derived admissions; re-threshold existing rows only if the classification moved"""
+        if not thresholds_equivalent(thresholds, self.thresholds):
+            self.thresholds = dict(thresholds)
+            frame = self.frame.copy(deep=False)
+            frame = apply_schema(apply_thresholds(frame, self.thresholds))
+            self._segments = [frame]
+            self._frame = frame
+            self.filter_index = SegmentedFilterIndex(frame)
+
+        batch = _order_columns(apply_schema(apply_thresholds(batch, self.thresholds)))
+        self._segments.append(batch)
+        self.sketch_index = self.sketch_index.extended(batch)
+        self.filter_index = self.filter_index.extended(batch)
+        self.person_index = self.person_index.extended(batch)
+        self.search_index = self.search_index.extended(batch)
+        if self.filter_index.needs_compaction:
+            self.filter_index = SegmentedFilterIndex(self.frame)
+            self.person_index = PersonIndex(self.frame)
+
+    def _bump(self, version):
+        self.version = version
+        for callback in self._listeners:
+            callback(version)
+
+    def append_admissions(self, records):
+        """Derive, index and persist a batch of new admissions; returns the new version
+
+        records is a DataFrame or a list of dicts with the raw CSV columns.
+        """
+        with self._lock:
+            batch = self._prepare_batch(records)
+            if batch.empty:
+                return self.version
+
+            if self.parts is None:
+                # First append on a CSV-backed dataset: the current rows become the store's first part
+                manifest = append_store_part(self.frame, self.thresholds, self.los_sketch,
+                                             self.store_dir, self.source, source_digest=self.version)
+                self.parts = manifest['parts']
+
+            self.los_sketch.update(batch['lengthofstay'].to_numpy())
+            self._ingest(batch, sketch_thresholds(self.los_sketch))
+            manifest = append_store_part(batch, self.thresholds, self.los_sketch, self.store_dir, self.source)
+            self.parts = manifest['parts']
+            self._bump(manifest['version'])
+            return self.version
+
+    def refresh(self):
+        """Catch up with data written by another process; True when anything changed
+
+        New store parts appended after the ones already loaded are read and
+        ingested incrementally; anything else (re-ingest, edited CSV) reloads.
+        A CSV edited after the store was created only sets source_changed.
+        """
+        if self.parts is not None:
+            self.source_changed = store_source_changed(self.csv_path, self.store_dir, self.cache_dir)
+        if current_version(self.csv_path, self.store_dir, self.cache_dir) == self.version:
+            return False
+        with self._lock:
+            if self.parts is not None and store_exists(self.store_dir):
+                manifest = read_store_manifest(self.store_dir)
+                if manifest['parts'][:len(self.parts)] == self.parts:
+                    new_parts = manifest['parts'][len(self.parts):]
+                    if new_parts:
+                        self._ingest(read_store_parts(self.store_dir, new_parts), manifest['thresholds'])
+                    self.los_sketch = KLLSketch.from_dict(manifest['los_sketch'])
+                    self.parts = manifest['parts']
+                    self._bump(manifest['version'])
+                    return True
+            self._reset(*self._load_state(self.csv_path, self.store_dir, self.cache_dir))
+            self._bump(self.version)
+            return True
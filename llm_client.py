@@ -0,0 +1,372 @@
+#!/usr/bin/env python3
+"""
+OpenAI client helpers: a shared pooled client per API key, streamed responses,
+user-facing error messages, sentence chunks for TTS
+"""
+
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from types import SimpleNamespace
+
+import openai
+
+from disk_cache import cache_key
+
+# Shared client pool settings; environment variables override them
+OPENAI_TIMEOUT = float(os.getenv('OPENAI_TIMEOUT', 60))
+OPENAI_CONNECT_TIMEOUT = float(os.getenv('OPENAI_CONNECT_TIMEOUT', 5))
+OPENAI_MAX_CONNECTIONS = int(os.getenv('OPENAI_MAX_CONNECTIONS', 8))
+OPENAI_MAX_RETRIES = int(os.getenv('OPENAI_MAX_RETRIES', 2))
+# Idle keep-alive connections are reused for this long (seconds)
+OPENAI_KEEPALIVE = float(os.getenv('OPENAI_KEEPALIVE', 30))
+# Clients kept for recently used API keys
+MAX_CLIENTS = 8
+
+# Completed responses are replayed for this long (seconds) before being generated again
+RESPONSE_CACHE_TTL = 7 * 24 * 3600
+RESPONSE_CACHE_BYTES = 32 * 1024 * 1024
+
+# Sentence ends: ./!/? followed by whitespace, CJK full stops (no space follows them), or line breaks
+SENTENCE_END = re.compile(r'(?<=[.!?])\s+|(?<=[。！？])|\n+')
+# Shorter pieces ("1.", "Dr.") are joined to the next sentence instead of being spoken alone
+MIN_SENTENCE_CHARS = 12
+
+
+INVALID_KEY_MESSAGE = "❌ **API密钥无效** - 请在侧边栏检查并重新输入正确的OpenAI API密钥"
+QUOTA_MESSAGE = "❌ **API配额不足** - 您的OpenAI账户余额不足或已达到使用限制"
+RATE_LIMIT_MESSAGE = "❌ **请求过于频繁** - 请稍等片刻后重试"
+
+
+def classify_openai_error(error):
+    """User-facing message for API key, quota and rate-limit errors; None for anything else"""
+    error_str = str(error)
+    if "401" in error_str or "invalid_request_error" in error_str or "Incorrect API key" in error_str:
+        return INVALID_KEY_MESSAGE
+    elif "403" in error_str or "insufficient_quota" in error_str:
+        return QUOTA_MESSAGE
+    elif "429" in error_str or "rate_limit" in error_str:
+        return RATE_LIMIT_MESSAGE
+    return None
+
+
+def _http_client(max_connections, timeout, connect_timeout, keepalive):
+    """Keep-alive connection pool with the SDK's defaults otherwise (its HTTP backend varies by SDK version)"""
+    limits = type(openai.DEFAULT_CONNECTION_LIMITS)(max_connections=max_connections,
+                                                    max_keepalive_connections=max_connections,
+                                                    keepalive_expiry=keepalive)
+    return openai.DefaultHttpxClient(limits=limits, timeout=openai.Timeout(timeout, connect=connect_timeout))
+
+
+class ClientRegistry:
+    """Process-wide OpenAI clients, one per API key, on persistent keep-alive connection pools
+
+    Requests made through the returned clients share a bound of
+    max_connections in flight (a streamed response holds its slot until it
+    is consumed or closed) and are timed per operation; see stats().
+    """
+
+    def __init__(self, timeout=OPENAI_TIMEOUT, connect_timeout=OPENAI_CONNECT_TIMEOUT,
+                 max_connections=OPENAI_MAX_CONNECTIONS, max_retries=OPENAI_MAX_RETRIES,
+                 keepalive=OPENAI_KEEPALIVE, max_clients=MAX_CLIENTS, factory=None):
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        self.max_connections = max_connections
+        self.max_retries = max_retries
+        self.keepalive = keepalive
+        self.max_clients = max_clients
+        self._factory = factory or self._create
+        self._clients = OrderedDict()
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max_connections)
+        self._in_flight = 0
+        self._counters = {}
+        self._totals = {'clients_created': 0, 'client_setup_seconds': 0.0, 'waits': 0, 'wait_seconds': 0.0}
+
+    def _create(self, api_key):
+        return openai.OpenAI(api_key=api_key, max_retries=self.max_retries,
+                             http_client=_http_client(self.max_connections, self.timeout,
+                                                      self.connect_timeout, self.keepalive))
+
+    def get(self, api_key):
+        """Shared client for an API key, created on first use; None without a key"""
+        if not api_key:
+            return None
+        with self._lock:
+            client = self._clients.get(api_key)
+            if client is not None:
+                self._clients.move_to_end(api_key)
+                return client
+            start = time.perf_counter()
+            client = PooledClient(self._factory(api_key), self)
+            self._totals['clients_created'] += 1
+            self._totals['client_setup_seconds'] += time.perf_counter() - start
+            self._clients[api_key] = client
+            # Clients of keys no longer in use are dropped, not closed: a request may still be running on one
+            while len(self._clients) > self.max_clients:
+                self._clients.popitem(last=False)
+            return client
+
+    def _acquire(self):
+        if not self._slots.acquire(blocking=False):
+            start = time.perf_counter()
+            acquired = self._slots.acquire(timeout=self.timeout)
+            with self._lock:
+                self._totals['waits'] += 1
+                self._totals['wait_seconds'] += time.perf_counter() - start
+            if not acquired:
+                raise TimeoutError(f"No OpenAI connection slot free after {self.timeout:.0f}s")
+        with self._lock:
+            self._in_flight += 1
+
+    def _release(self, operation, seconds, ok, first_token_seconds=None):
+        with self._lock:
+            self._in_flight -= 1
+            counter = self._counters.setdefault(operation, {'calls': 0, 'errors': 0, 'seconds': 0.0, 'max_seconds': 0.0,
+                                                            'streams': 0, 'first_token_seconds': 0.0})
+            counter['calls'] += 1
+            counter['errors'] += 0 if ok else 1
+            counter['seconds'] += seconds
+            counter['max_seconds'] = max(counter['max_seconds'], seconds)
+            if first_token_seconds is not None:
+                counter['streams'] += 1
+                counter['first_token_seconds'] += first_token_seconds
+        self._slots.release()
+
+    def call(self, operation, create, kwargs):
+        """Run one create() request inside a connection slot, timing it under operation"""
+        self._acquire()
+        start = time.perf_counter()
+        try:
+            result = create(**kwargs)
+        except BaseException:
+            self._release(operation, time.perf_counter() - start, ok=False)
+            raise
+        if kwargs.get('stream'):
+            return _MeteredStream(result, self, operation, start)
+        self._release(operation, time.perf_counter() - start, ok=True)
+        return result
+
+    def stats(self):
+        """Timing counters: client setup, waits for a free slot, and per-operation request latency"""
+        with self._lock:
+            operations = {}
+            for operation, counter in self._counters.items():
+                calls = counter['calls']
+                operations[operation] = {
+                    'calls': calls,
+                    'errors': counter['errors'],
+                    'mean_ms': 1000 * counter['seconds'] / calls if calls else 0.0,
+                    'max_ms': 1000 * counter['max_seconds'],
+                    'mean_first_token_ms': (1000 * counter['first_token_seconds'] / counter['streams']
+                                            if counter['streams'] else None),
+                }
+            return {
+                'clients': len(self._clients),
+                'clients_created': self._totals['clients_created'],
+                'client_setup_ms': 1000 * self._totals['client_setup_seconds'],
+                'in_flight': self._in_flight,
+                'waits': self._totals['waits'],
+                'wait_ms': 1000 * self._totals['wait_seconds'],
+                'operations': operations,
+            }
+
+    def close(self):
+        """Close every client's connection pool"""
+        with self._lock:
+            clients, self._clients = list(self._clients.values()), OrderedDict()
+        for client in clients:
+            close = getattr(client.raw, 'close', None)
+            if close:
+                close()
+
+
+class _MeteredResource:
+    """An API resource whose create() goes through the registry; everything else passes through"""
+
+    def __init__(self, resource, registry, operation):
+        self._resource = resource
+        self._registry = registry
+        self._operation = operation
+
+    def create(self, **kwargs):
+        return self._registry.call(self._operation, self._resource.create, kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self._resource, name)
+
+
+class _MeteredStream:
+    """A streamed response holding its connection slot until it is consumed, closed or dropped"""
+
+    def __init__(self, stream, registry, operation, start):
+        self._stream = stream
+        self._registry = registry
+        self._operation = operation
+        self._start = start
+        self._first_token = None
+        self._done = False
+        self._ok = True
+
+    def __iter__(self):
+        try:
+            for chunk in self._stream:
+                if self._first_token is None:
+                    self._first_token = time.perf_counter() - self._start
+                yield chunk
+        except BaseException:
+            self._ok = False
+            raise
+        finally:
+            self._finish()
+
+    def _finish(self):
+        if not self._done:
+            self._done = True
+            self._registry._release(self._operation, time.perf_counter() - self._start, self._ok,
+                                    self._first_token if self._first_token is not None else 0.0)
+
+    def close(self):
+        close = getattr(self._stream, 'close', None)
+        if close:
+            close()
+        self._finish()
+
+    def __del__(self):
+        self._finish()
+
+    def __getattr__(self, name):
+        return getattr(self._stream, name)
+
+
+class PooledClient:
+    """An OpenAI client whose chat, embedding and speech requests are bounded and timed by its registry"""
+
+    def __init__(self, client, registry):
+        self.raw = client
+        self.chat = SimpleNamespace(completions=_MeteredResource(client.chat.completions, registry, 'chat'))
+        self.embeddings = _MeteredResource(client.embeddings, registry, 'embeddings')
+        self.audio = SimpleNamespace(speech=_MeteredResource(client.audio.speech, registry, 'speech'))
+
+    def __getattr__(self, name):
+        return getattr(self.raw, name)
+
+
+# Process-wide registry shared by app.py and rag_system.py
+client_registry = ClientRegistry()
+
+
+def get_openai_client(api_key):
+    """Shared pooled client for an API key (None without a key)"""
+    return client_registry.get(api_key)
+
+
+def response_key(model, messages, **params):
+    """Content address of a chat request: model, every message (system and user prompt) and the sampling parameters"""
+    return cache_key('chat', model, json.dumps(messages, sort_keys=True, ensure_ascii=False),
+                     json.dumps(params, sort_keys=True))
+
+
+def open_chat_stream(client, cache=None, **kwargs):
+    """Start a streamed chat completion and return an iterator of text deltas
+
+    The request is sent here, so authentication, quota and rate-limit errors
+    raise before any text is shown. An error after the first token ends the
+    text with its classified message, or re-raises when it has none.
+
+    With a cache (a TwoTierCache), a request identical to one that completed
+    before is replayed from it as a single delta, without an API call; only
+    responses that streamed to the end without error are stored.
+    """
+    if cache is None:
+        return _text_deltas(client.chat.completions.create(stream=True, **kwargs))
+    key = response_key(**kwargs)
+    cached = cache.get(key)
+    if cached is not None:
+        return iter([cached.decode('utf-8')])
+    stream = client.chat.completions.create(stream=True, **kwargs)
+    return _text_deltas(stream, on_complete=lambda text: cache.put(key, text.encode('utf-8')))
+
+
+def cached_completion(client, cache, **kwargs):
+    """(text, from_cache) of a non-streamed completion through the same cache entries as open_chat_stream(); errors raise"""
+    key = response_key(**kwargs)
+    cached = cache.get(key)
+    if cached is not None:
+        return cached.decode('utf-8'), True
+    text = client.chat.completions.create(**kwargs).choices[0].message.content
+    if text:
+        cache.put(key, text.encode('utf-8'))
+    return text, False
+
+
+def _text_deltas(stream, on_complete=None):
+    parts = []
+    try:
+        for chunk in stream:
+            if chunk.choices:
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    parts.append(delta)
+                    yield delta
+    except Exception as e:
+        message = classify_openai_error(e)
+        if message is None:
+            raise
+        yield f"\n\n{message}"
+        return
+    if on_complete is not None and parts:
+        on_complete(''.join(parts))
+
+
+class SentenceSplitter:
+    """Incremental sentence splitter: feed text deltas, get back the sentences they complete"""
+
+    def __init__(self, min_chars=MIN_SENTENCE_CHARS):
+        self.min_chars = min_chars
+        self._buffer = ''
+
+    def feed(self, delta):
+        """Sentences completed by this delta"""
+        pieces = SENTENCE_END.split(self._buffer + delta)
+        self._buffer = pieces.pop()
+        sentences = []
+        pending = ''
+        for piece in pieces:
+            pending = f"{pending} {piece.strip()}".strip()
+            if len(pending) >= self.min_chars:
+                sentences.append(pending)
+                pending = ''
+        if pending:
+            self._buffer = f"{pending} {self._buffer}"
+        return sentences
+
+    def flush(self):
+        """The unterminated tail, once the stream has ended"""
+        tail, self._buffer = self._buffer.strip(), ''
+        return [tail] if tail else []
+
+
+def iter_sentences(deltas, min_chars=MIN_SENTENCE_CHARS):
+    """Complete sentences from a stream of text deltas, each as soon as its end arrives"""
+    splitter = SentenceSplitter(min_chars)
+    for delta in deltas:
+        yield from splitter.feed(delta)
+    yield from splitter.flush()
+
+
+def tee_sentences(deltas, on_sentence, min_chars=MIN_SENTENCE_CHARS):
+    """Pass text deltas through unchanged, calling on_sentence with each sentence once it is complete
+
+    Lets TTS start on the first sentence while the rest of the completion is still streaming.
+    """
+    splitter = SentenceSplitter(min_chars)
+    for delta in deltas:
+        yield delta
+        for sentence in splitter.feed(delta):
+            on_sentence(sentence)
+    for sentence in splitter.flush():
+        on_sentence(sentence)
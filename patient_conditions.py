@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+"""
+Condition detection from patient records: threshold rules over labs and disease flags,
+for one patient or the whole cohort in one vectorized pass
+"""
+
+import numpy as np
+import pandas as pd
+
+# Medical symptom keyword mapping (the retrieval vocabulary)
+SYMPTOM_KEYWORDS = {
+    'anemia': ['anemia', 'anemic', 'hemoglobin', 'hematocrit', 'iron deficiency', 'low blood count'],
+    'pneumonia': ['pneumonia', 'lung infection', 'respiratory infection', 'chest infection'],
+    'asthma': ['asthma', 'breathing problems', 'respiratory issues', 'airway obstruction'],
+    'depression': ['depression', 'depressive', 'mental health', 'psychiatric', 'mood disorder'],
+    'anxiety': ['anxiety', 'anxious', 'stress', 'panic', 'worry'],
+    'diabetes': ['diabetes', 'diabetic', 'blood sugar', 'glucose', 'insulin'],
+    'hypertension': ['hypertension', 'high blood pressure', 'blood pressure'],
+    'heart disease': ['heart disease', 'cardiac', 'cardiovascular', 'heart failure'],
+    'kidney disease': ['kidney disease', 'renal', 'nephrology', 'dialysis'],
+    'substance abuse': ['substance abuse', 'drug abuse', 'addiction', 'substance use disorder']
+}
+
+# Query terms for patients without a specific condition
+GENERIC_SYMPTOMS = ['length of stay', 'hospital admission', 'medical care']
+
+# Diagnostic-basis rules in display order: (code, condition, rule); rules take a field getter
+# and work the same on one patient's scalars and on whole columns
+CONDITION_RULES = [
+    ('severe_anemia', 'anemia', lambda v: v('hematocrit') < 8),
+    ('iron_deficiency', 'anemia', lambda v: v('irondef') == 1),
+    ('hemoglobin', 'anemia', lambda v: v('hemo') == 1),
+    ('asthma', 'asthma', lambda v: v('asthma') == 1),
+    ('pneumonia', 'pneumonia', lambda v: v('pneum') == 1),
+    ('depression', 'depression', lambda v: v('depress') == 1),
+    ('psychological_disorder', 'depression', lambda v: v('psychologicaldisordermajor') == 1),
+    ('substance_dependence', 'substance abuse', lambda v: v('substancedependence') == 1),
+    ('renal_disease', 'kidney disease', lambda v: v('dialysisrenalendstage') == 1),
+]
+
+# Abnormal labs quoted in the diagnostic basis
+FINDING_RULES = [
+    ('high_respiration', lambda v: v('respiration') > 20),
+    ('high_neutrophils', lambda v: v('neutrophils') > 70),
+    ('low_sodium', lambda v: v('sodium') < 135),
+    ('high_creatinine', lambda v: v('creatinine') > 1.2),
+    ('high_bun', lambda v: v('bloodureanitro') > 25),
+]
+
+# Bit of each code in the 'basis' column
+BASIS_BITS = {code: bit for bit, code in enumerate([rule[0] for rule in CONDITION_RULES] +
+                                                   [rule[0] for rule in FINDING_RULES])}
+
+
+def _basis_and_conditions(get):
+    """Basis bitmask and {condition: flag} from the rules, via a scalar or column field getter"""
+    basis = 0
+    conditions = {}
+    for code, condition, rule in CONDITION_RULES:
+        hit = rule(get)
+        basis = basis | (hit * (1 << BASIS_BITS[code]))
+        conditions[condition] = conditions.get(condition, False) | hit
+    for code, rule in FINDING_RULES:
+        basis = basis | (rule(get) * (1 << BASIS_BITS[code]))
+    return basis, conditions
+
+
+def _first_keyword(diagnosis, keywords):
+    for keyword in keywords:
+        if keyword in diagnosis:
+            return keyword
+    return None
+
+
+def detect_patient_conditions(patient, keywords=SYMPTOM_KEYWORDS):
+    """(conditions, basis, diagnosis_basis) for one patient record (dict or Series)
+
+    basis is a BASIS_BITS bitmask; diagnosis_basis has bit i set when the
+    diagnosis text mentions a keyword of the i-th SYMPTOM_KEYWORDS condition.
+    """
+    basis, flags = _basis_and_conditions(lambda col: patient.get(col, 0))
+    conditions = {condition for condition, hit in flags.items() if hit}
+
+    diagnosis_basis = 0
+    diagnosis = str(patient.get('diagnosis', '')).lower()
+    for bit, (condition, condition_keywords) in enumerate(keywords.items()):
+        if _first_keyword(diagnosis, condition_keywords) is not None:
+            conditions.add(condition)
+            diagnosis_basis |= 1 << bit
+    return conditions, int(basis), diagnosis_basis
+
+
+def detect_conditions(df, keywords=SYMPTOM_KEYWORDS):
+    """Condition flags and diagnostic-basis codes for every row, as columns
+
+    One vectorized pass over the frame: a bool column per condition in
+    keywords, plus the int32 'basis' and 'diagnosis_basis' bitmasks of
+    detect_patient_conditions. Missing lab or flag columns count as 0, as
+    for a single patient. The text is rendered per patient by
+    diagnostic_basis() only when displayed.
+    """
+    zeros = np.zeros(len(df))
+
+    def column(col):
+        return df[col].to_numpy() if col in df.columns else zeros
+
+    basis, flags = _basis_and_conditions(column)
+    result = pd.DataFrame(index=df.index)
+    for condition in keywords:
+        result[condition] = np.asarray(flags.get(condition, np.zeros(len(df), dtype=bool)), dtype=bool)
+
+    diagnosis_basis = np.zeros(len(df), dtype=np.int32)
+    if 'diagnosis' in df.columns:
+        diagnosis = df['diagnosis'].astype(str).str.lower()
+        for bit, (condition, condition_keywords) in enumerate(keywords.items()):
+            mentioned = np.zeros(len(df), dtype=bool)
+            for keyword in condition_keywords:
+                mentioned |= diagnosis.str.contains(keyword, regex=False).to_numpy()
+            result[condition] |= mentioned
+            diagnosis_basis |= mentioned.astype(np.int32) << bit
+
+    result['basis'] = np.asarray(basis, dtype=np.int32)
+    result['diagnosis_basis'] = diagnosis_basis
+    return result
+
+
+def condition_columns(conditions):
+    """The condition flag columns of a detect_conditions() frame"""
+    return [col for col in conditions.columns if col not in ('basis', 'diagnosis_basis')]
+
+
+def symptoms_for(conditions):
+    """Sorted retrieval terms for a set of detected conditions, or the generic terms when there are none"""
+    return sorted(set(conditions) or GENERIC_SYMPTOMS)
+
+
+def row_symptoms(row):
+    """symptoms_for() one row of a detect_conditions() frame"""
+    return symptoms_for(col for col, value in row.items() if col not in ('basis', 'diagnosis_basis') and value)
+
+
+def condition_mask(conditions, selected):
+    """Rows with any of the selected conditions"""
+    if not selected:
+        return np.ones(len(conditions), dtype=bool)
+    return conditions[list(selected)].to_numpy().any(axis=1)
+
+
+def _has(basis, code):
+    return bool(basis >> BASIS_BITS[code] & 1)
+
+
+def _lab_findings(patient, basis, codes):
+    findings = []
+    if 'high_respiration' in codes and _has(basis, 'high_respiration'):
+        findings.append(f"Elevated respiratory rate: {patient.get('respiration', 0)}/min (Normal: 12-20)")
+    if 'high_neutrophils' in codes and _has(basis, 'high_neutrophils'):
+        findings.append(f"Elevated neutrophils: {patient.get('neutrophils', 0):.1f}% (Normal: 40-70%)")
+    if 'high_creatinine' in codes and _has(basis, 'high_creatinine'):
+        findings.append(f"Elevated creatinine: {patient.get('creatinine', 0):.2f} mg/dL (Normal: 0.6-1.2)")
+    if 'high_bun' in codes and _has(basis, 'high_bun'):
+        findings.append(f"Elevated blood urea nitrogen: {patient.get('bloodureanitro', 0):.1f} mg/dL (Normal: 7-25)")
+    return findings
+
+
+def diagnostic_basis(patient, basis, diagnosis_basis=0, keywords=SYMPTOM_KEYWORDS):
+    """Display text of a patient's diagnostic basis from its codes"""
+    info = []
+    if _has(basis, 'severe_anemia'):
+        info.append(f"Severe Anemia (Hematocrit: {patient.get('hematocrit', 0):.1f}g/dL, Normal: 12-16g/dL)")
+    if _has(basis, 'iron_deficiency'):
+        info.append("Iron Deficiency Anemia (Iron deficiency indicator positive)")
+    if _has(basis, 'hemoglobin'):
+        info.append("Anemia (Hemoglobin abnormal indicator positive)")
+    for code, name in (('asthma', 'Asthma'), ('pneumonia', 'Pneumonia')):
+        if _has(basis, code):
+            findings = _lab_findings(patient, basis, ('high_respiration', 'high_neutrophils'))
+            if findings:
+                info.append(f"{name} (Diagnostic marker positive, {'; '.join(findings)})")
+            else:
+                info.append(f"{name} ({name} diagnostic marker positive)")
+    if _has(basis, 'depression'):
+        info.append("Depression (Diagnostic marker positive)")
+    if _has(basis, 'psychological_disorder'):
+        info.append("Major Psychological Disorder (Diagnostic marker positive)")
+    if _has(basis, 'substance_dependence'):
+        # Substance dependence may lead to malnutrition and electrolyte imbalance, these are reasonable associations
+        if _has(basis, 'low_sodium'):
+            info.append(f"Substance Dependence (Diagnostic marker positive, possible electrolyte imbalance: "
+                        f"Sodium {patient.get('sodium', 0):.1f} mEq/L, Normal: 135-145)")
+        else:
+            info.append("Substance Dependence (Diagnostic marker positive)")
+    if _has(basis, 'renal_disease'):
+        findings = _lab_findings(patient, basis, ('high_creatinine', 'high_bun'))
+        if findings:
+            info.append(f"End-stage Renal Disease (Dialysis treatment marker positive, {'; '.join(findings)})")
+        else:
+            info.append("End-stage Renal Disease (Dialysis treatment marker positive)")
+
+    if diagnosis_basis:
+        diagnosis = str(patient.get('diagnosis', '')).lower()
+        for bit, (condition, condition_keywords) in enumerate(keywords.items()):
+            if diagnosis_basis >> bit & 1:
+                info.append(f"{condition.title()} (Diagnosis code contains: {_first_keyword(diagnosis, condition_keywords)})")
+    return info
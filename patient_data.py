@@ -0,0 +1,434 @@
+#!/usr/bin/env python3
+"""
+Patient data loading: CSV parsing, derived columns and a persistent Parquet cache
+"""
+
+import hashlib
+import json
+import os
+import uuid
+
+import numpy as np
+import pandas as pd
+
+from quantile_sketch import KLLSketch
+
+# Optional dependency: without pyarrow we simply re-derive from the CSV every time
+try:
+    import pyarrow  # noqa: F401
+    PARQUET_AVAILABLE = True
+except ImportError:
+    PARQUET_AVAILABLE = False
+
+DATA_FILE = "data/LengthOfStay.csv"
+CACHE_DIR = "data/.cache"
+STORE_DIR = "data/patient_store"
+STORE_MANIFEST = "manifest.json"
+
+# Bump whenever derive_columns() or PATIENT_SCHEMA changes so stale cache files are never reused
+CACHE_FORMAT_VERSION = 2
+
+# Disease columns for analysis
+DISEASE_COLS = ['dialysisrenalendstage', 'asthma', 'irondef', 'pneum',
+                'substancedependence', 'psychologicaldisordermajor',
+                'depress', 'psychother', 'fibrosisandother', 'malnutrition']
+
+DATE_COLS = ['vdate', 'discharged', 'Date_of_Birth']
+DATE_FORMAT = '%m/%d/%Y'
+
+AGE_BINS = [0, 18, 35, 50, 65, 80, 100]
+AGE_LABELS = ['0-18', '19-35', '36-50', '51-65', '66-80', '80+']
+
+RISK_LEVELS = ['Standard Risk', 'High Risk']
+
+DERIVED_COLS = ['month', 'is_long_stay', 'readmit_flag', 'age_at_admission',
+                'age_group', 'full_name', 'risk_level']
+
+# Column dtypes applied at load time. Low-cardinality strings become categoricals
+# (filters and groupbys then run on integer codes), flags become int8 and
+# labs/vitals float32. A list value pins the category set.
+PATIENT_SCHEMA = {
+    'eid': 'int32',
+    'First_Name': 'category',
+    'Last_Name': 'category',
+    'full_name': 'category',
+    'rcount': 'category',
+    'gender': 'category',
+    'facid': 'category',
+    'admission_reason': 'category',
+    'month': 'category',
+    'age_group': pd.CategoricalDtype(AGE_LABELS, ordered=True),
+    'risk_level': RISK_LEVELS,
+    **{col: 'int8' for col in DISEASE_COLS},
+    'hemo': 'int8',
+    'secondarydiagnosisnonicd9': 'int8',
+    'is_long_stay': 'int8',
+    'readmit_flag': 'int8',
+    'hematocrit': 'float32',
+    'neutrophils': 'float32',
+    'sodium': 'float32',
+    'glucose': 'float32',
+    'bloodureanitro': 'float32',
+    'creatinine': 'float32',
+    'bmi': 'float32',
+    'respiration': 'float32',
+    'age_at_admission': 'float32',
+    'pulse': 'int16',
+    'lengthofstay': 'int16',
+}
+
+
+def read_raw_csv(csv_path=DATA_FILE, **kwargs):
+    """Read the raw admissions CSV with stable dtypes"""
+    # rcount mixes digits and '5+', keep it as text so readmit_flag works on any extract
+    return pd.read_csv(csv_path, dtype={'rcount': str}, **kwargs)
+
+
+def compute_thresholds(lengthofstay):
+    """Population-level LOS thresholds used by is_long_stay and risk_level"""
+    return {
+        'long_stay': float(lengthofstay.quantile(0.75)),
+        'high_risk': float(lengthofstay.quantile(0.9)),
+    }
+
+
+def sketch_thresholds(sketch):
+    """Same thresholds as compute_thresholds(), answered from a LOS quantile sketch"""
+    long_stay, high_risk = sketch.quantile([0.75, 0.9])
+    return {'long_stay': float(long_stay), 'high_risk': float(high_risk)}
+
+
+def thresholds_equivalent(a, b):
+    """Whether two threshold sets classify every (integer) length of stay the same way"""
+    return all(np.floor(a[key]) == np.floor(b[key]) for key in ('long_stay', 'high_risk'))
+
+
+def derive_row_columns(df):
+    """Add the derived columns that depend only on each row's own values"""
+    # Convert dates
+    for col in DATE_COLS:
+        df[col] = pd.to_datetime(df[col], format=DATE_FORMAT)
+
+    # Create derived features
+    df['month'] = df['vdate'].dt.to_period('M').astype(str)
+    df['readmit_flag'] = (df['rcount'] != '0').astype(int)
+
+    # Calculate age at admission
+    df['age_at_admission'] = (df['vdate'] - df['Date_of_Birth']).dt.days / 365.25
+    df['age_group'] = pd.cut(df['age_at_admission'], bins=AGE_BINS, labels=AGE_LABELS)
+
+    # Create full name for patient identification
+    df['full_name'] = df['First_Name'] + ' ' + df['Last_Name']
+    return df
+
+
+def apply_thresholds(df, thresholds):
+    """Add is_long_stay and risk_level from population-level LOS thresholds"""
+    df['is_long_stay'] = (df['lengthofstay'] > thresholds['long_stay']).astype(int)
+
+    # Create risk level categorization
+    high_risk_mask = (
+        (df['lengthofstay'] > thresholds['high_risk']) |
+        (df['readmit_flag'] == 1)
+    )
+    df['risk_level'] = np.where(high_risk_mask, 'High Risk', 'Standard Risk')
+    return df
+
+
+def derive_columns(df, thresholds=None):
+    """Add the derived dashboard columns to a raw admissions frame"""
+    if thresholds is None:
+        thresholds = compute_thresholds(df['lengthofstay'])
+    df = derive_row_columns(df)
+    df = apply_thresholds(df, thresholds)
+    return _order_columns(df)
+
+
+def _order_columns(df):
+    """Raw columns first, then derived ones in their historical order"""
+    return df[[col for col in df.columns if col not in DERIVED_COLS] +
+              [col for col in DERIVED_COLS if col in df.columns]]
+
+
+def apply_schema(df, schema=PATIENT_SCHEMA):
+    """Cast columns to the compact dtypes declared in the schema"""
+    for col, dtype in schema.items():
+        if col not in df.columns:
+            continue
+        if isinstance(dtype, list):
+            dtype = pd.CategoricalDtype(dtype)
+        df[col] = df[col].astype(dtype)
+    return df
+
+
+def memory_report(before, after):
+    """Bytes per column before and after applying the schema"""
+    report = pd.DataFrame({
+        'dtype_before': before.dtypes.astype(str),
+        'bytes_before': before.memory_usage(deep=True, index=False),
+        'dtype_after': after.dtypes.astype(str),
+        'bytes_after': after.memory_usage(deep=True, index=False),
+    })
+    report.loc['TOTAL'] = ['', report['bytes_before'].sum(), '', report['bytes_after'].sum()]
+    report['ratio'] = report['bytes_before'] / report['bytes_after']
+    return report
+
+
+def file_digest(path, block_size=1 << 20):
+    """SHA-256 of a file's content"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def dataset_version(csv_path=DATA_FILE, cache_dir=CACHE_DIR):
+    """Content hash of the CSV, memoized on (size, mtime) to avoid re-hashing large files"""
+    stat = os.stat(csv_path)
+    stamp = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+    stamp_path = os.path.join(cache_dir, os.path.basename(csv_path) + '.digest.json')
+
+    try:
+        with open(stamp_path, 'r', encoding='utf-8') as f:
+            cached = json.load(f)
+        if cached.get('size') == stamp['size'] and cached.get('mtime_ns') == stamp['mtime_ns']:
+            return cached['digest']
+    except (OSError, ValueError, KeyError):
+        pass
+
+    stamp['digest'] = file_digest(csv_path)
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        with open(stamp_path, 'w', encoding='utf-8') as f:
+            json.dump(stamp, f)
+    except OSError as e:
+        print(f"Could not write digest stamp: {e}")
+    return stamp['digest']
+
+
+def cache_path_for(csv_path, version, cache_dir=CACHE_DIR):
+    """Parquet cache location for a given CSV content version"""
+    stem = os.path.splitext(os.path.basename(csv_path))[0]
+    return os.path.join(cache_dir, f"{stem}-v{CACHE_FORMAT_VERSION}-{version[:16]}.parquet")
+
+
+def _remove_stale_caches(csv_path, keep_path, cache_dir):
+    """Delete cache files left behind by older versions of the same CSV"""
+    stem = os.path.splitext(os.path.basename(csv_path))[0]
+    try:
+        for name in os.listdir(cache_dir):
+            path = os.path.join(cache_dir, name)
+            if name.startswith(f"{stem}-v") and name.endswith('.parquet') and path != keep_path:
+                os.remove(path)
+    except OSError as e:
+        print(f"Could not clean stale caches: {e}")
+
+
+def load_patient_frame(csv_path=DATA_FILE, cache_dir=CACHE_DIR, use_cache=True):
+    """Load the fully derived patient frame, from the Parquet cache when it is current"""
+    version = dataset_version(csv_path, cache_dir) if use_cache else file_digest(csv_path)
+    cache_path = cache_path_for(csv_path, version, cache_dir)
+
+    if use_cache and PARQUET_AVAILABLE and os.path.exists(cache_path):
+        try:
+            df = pd.read_parquet(cache_path)
+            df.attrs['dataset_version'] = version
+            return df
+        except Exception as e:
+            print(f"Ignoring unreadable cache {cache_path}: {e}")
+
+    df = apply_schema(derive_columns(read_raw_csv(csv_path)))
+
+    if use_cache and PARQUET_AVAILABLE:
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            # Write to a temp file first so concurrent workers never read a partial cache
+            tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+            df.to_parquet(tmp_path, index=False)
+            os.replace(tmp_path, cache_path)
+            _remove_stale_caches(csv_path, cache_path, cache_dir)
+        except Exception as e:
+            print(f"Could not write data cache: {e}")
+
+    df.attrs['dataset_version'] = version
+    return df
+
+
+def _store_manifest_path(store_dir):
+    return os.path.join(store_dir, STORE_MANIFEST)
+
+
+def store_exists(store_dir=STORE_DIR):
+    """Whether a chunked columnar store has been ingested"""
+    return os.path.exists(_store_manifest_path(store_dir))
+
+
+def read_store_manifest(store_dir=STORE_DIR):
+    with open(_store_manifest_path(store_dir), 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _write_store_manifest(store_dir, manifest):
+    path = _store_manifest_path(store_dir)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f)
+    os.replace(tmp_path, path)
+
+
+def _to_store_part(df, path):
+    """Write one store part; categoricals go out as plain values (Parquet
+    dictionary-encodes them anyway) so parts with different category sets
+    can be read back as one table"""
+    df = df.copy()
+    for col in df.columns:
+        if isinstance(df[col].dtype, pd.CategoricalDtype):
+            df[col] = df[col].astype(df[col].cat.categories.dtype)
+    df.to_parquet(path, index=False)
+
+
+def ingest_csv_chunked(csv_path=DATA_FILE, store_dir=STORE_DIR, chunksize=100_000):
+    """Stream a large extract into a partitioned Parquet store with bounded memory
+
+    Each chunk gets the row-level derivations and the typed schema and is written
+    as its own part file. The LOS thresholds behind is_long_stay/risk_level come
+    from a streaming quantile sketch and are applied when the store is read.
+    """
+    if not PARQUET_AVAILABLE:
+        raise RuntimeError("pyarrow is required for the chunked patient store")
+
+    os.makedirs(store_dir, exist_ok=True)
+    # Old parts stay readable until the new manifest replaces the old one
+    ingest_id = uuid.uuid4().hex[:8]
+    los_sketch = KLLSketch()
+    parts = []
+    n_rows = 0
+
+    for chunk in read_raw_csv(csv_path, chunksize=chunksize):
+        chunk = apply_schema(derive_row_columns(chunk))
+        los_sketch.update(chunk['lengthofstay'].to_numpy())
+        part = f"part-{ingest_id}-{len(parts):05d}.parquet"
+        _to_store_part(chunk, os.path.join(store_dir, part))
+        parts.append(part)
+        n_rows += len(chunk)
+
+    old_parts = []
+    if store_exists(store_dir):
+        old_parts = read_store_manifest(store_dir).get('parts', [])
+
+    manifest = {
+        'format_version': CACHE_FORMAT_VERSION,
+        'source': os.path.basename(csv_path),
+        'source_digest': file_digest(csv_path),
+        'version': f"store-{ingest_id}-{n_rows}",
+        'n_rows': n_rows,
+        'parts': parts,
+        'thresholds': sketch_thresholds(los_sketch),
+        'los_sketch': los_sketch.to_dict(),
+    }
+    _write_store_manifest(store_dir, manifest)
+
+    for part in old_parts:
+        try:
+            os.remove(os.path.join(store_dir, part))
+        except OSError:
+            pass
+    return manifest
+
+
+def append_store_part(batch, thresholds, los_sketch, store_dir=STORE_DIR, source=None, source_digest=None):
+    """Persist a batch of admissions as one more store part and bump the store version
+
+    Only the batch is written; the manifest records the new part, the running
+    LOS sketch and the thresholds in effect. Creates the store if needed,
+    recording the source CSV and its content digest. Assumes a single writer
+    per store.
+    """
+    if not PARQUET_AVAILABLE:
+        raise RuntimeError("pyarrow is required for the chunked patient store")
+
+    os.makedirs(store_dir, exist_ok=True)
+    if store_exists(store_dir):
+        manifest = read_store_manifest(store_dir)
+    else:
+        manifest = {'format_version': CACHE_FORMAT_VERSION, 'source': source, 'source_digest': source_digest,
+                    'n_rows': 0, 'parts': []}
+
+    append_id = uuid.uuid4().hex[:8]
+    part = f"part-{append_id}-00000.parquet"
+    # is_long_stay/risk_level depend on the population thresholds, applied on read
+    _to_store_part(batch.drop(columns=['is_long_stay', 'risk_level'], errors='ignore'),
+                   os.path.join(store_dir, part))
+
+    n_rows = manifest['n_rows'] + len(batch)
+    manifest.update({
+        'version': f"store-{append_id}-{n_rows}",
+        'n_rows': n_rows,
+        'parts': manifest['parts'] + [part],
+        'thresholds': dict(thresholds),
+        'los_sketch': los_sketch.to_dict(),
+    })
+    _write_store_manifest(store_dir, manifest)
+    return manifest
+
+
+def read_store_parts(store_dir, parts):
+    """Read specific store parts (e.g. ones appended since the last load), schema applied"""
+    df = pd.read_parquet([os.path.join(store_dir, part) for part in parts])
+    return apply_schema(df)
+
+
+def read_store(store_dir=STORE_DIR, columns=None, filters=None):
+    """Query the chunked store, reading only the requested columns and matching row groups
+
+    filters uses the pyarrow/pandas form, e.g. [('facid', 'in', ['A', 'B'])].
+    """
+    manifest = read_store_manifest(store_dir)
+    paths = [os.path.join(store_dir, part) for part in manifest['parts']]
+
+    read_columns = columns
+    if columns is not None:
+        needs_thresholds = {'is_long_stay', 'risk_level'} & set(columns)
+        if needs_thresholds:
+            read_columns = [c for c in columns if c not in needs_thresholds]
+            read_columns += [c for c in ('lengthofstay', 'readmit_flag') if c not in read_columns]
+
+    df = pd.read_parquet(paths, columns=read_columns, filters=filters)
+    if columns is None or {'is_long_stay', 'risk_level'} & set(columns):
+        df = apply_thresholds(df, manifest['thresholds'])
+    df = apply_schema(df)
+    df = _order_columns(df) if columns is None else df[columns]
+    df.attrs['dataset_version'] = manifest['version']
+    return df
+
+
+def current_version(csv_path=DATA_FILE, store_dir=STORE_DIR, cache_dir=CACHE_DIR):
+    """Version of the data the dashboard should show: the store if ingested, else the CSV
+
+    Once a store exists (ingested, or created by the first appended admission)
+    edits to the CSV no longer change what is shown; store_source_changed()
+    detects them so the UI can say so.
+    """
+    if store_exists(store_dir):
+        return read_store_manifest(store_dir)['version']
+    return dataset_version(csv_path, cache_dir)
+
+
+def store_source_changed(csv_path=DATA_FILE, store_dir=STORE_DIR, cache_dir=CACHE_DIR):
+    """Whether the CSV the store was built from has been edited since (the store keeps the old rows)"""
+    if not store_exists(store_dir) or not os.path.exists(csv_path):
+        return False
+    manifest = read_store_manifest(store_dir)
+    digest = manifest.get('source_digest')
+    if digest is None or manifest.get('source') != os.path.basename(csv_path):
+        # Stores written before the digest was recorded, or built from another extract
+        return False
+    return dataset_version(csv_path, cache_dir) != digest
+
+
+def load_current_frame(csv_path=DATA_FILE, store_dir=STORE_DIR, cache_dir=CACHE_DIR):
+    """Dashboard frame from the chunked store when one exists, else from the CSV cache"""
+    if store_exists(store_dir):
+        return read_store(store_dir)
+    return load_patient_frame(csv_path, cache_dir)
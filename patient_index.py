@@ -0,0 +1,410 @@
+#!/usr/bin/env python3
+"""
+Precomputed indexes over the patient frame for the dashboard filters, patient lookup and search
+"""
+
+import math
+import unicodedata
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+
+# Sidebar multiselect columns that get per-value bitmaps
+FILTER_COLUMNS = ['gender', 'facid', 'age_group', 'risk_level']
+
+# Text columns covered by the patient search
+SEARCH_COLUMNS = ['full_name', 'facid', 'admission_reason']
+
+
+def _to_ns(values):
+    """datetime-like values as int64 nanoseconds since the epoch"""
+    return pd.to_datetime(values).to_numpy(dtype='datetime64[ns]').view('int64')
+
+
+class FilterIndex:
+    """Sorted admission-date index plus packed per-value bitmaps for the sidebar filters
+
+    Built once per dataset version; a filter change then costs a binary search
+    over the dates and a few bitmap ORs/ANDs instead of full-column scans.
+    """
+
+    def __init__(self, df, columns=FILTER_COLUMNS):
+        self.n_rows = len(df)
+
+        vdate = _to_ns(df['vdate'])
+        self._order = np.argsort(vdate, kind='stable')
+        self._sorted_vdate = vdate[self._order]
+
+        self._bitmaps = {}
+        self._counts = {}
+        for col in columns:
+            codes, uniques = pd.factorize(df[col], sort=True)
+            col_bitmaps = {}
+            col_counts = {}
+            for code, value in enumerate(uniques):
+                mask = codes == code
+                col_bitmaps[value] = np.packbits(mask)
+                col_counts[value] = int(mask.sum())
+            self._bitmaps[col] = col_bitmaps
+            self._counts[col] = col_counts
+
+    @property
+    def date_range(self):
+        """(first, last) admission date as datetime.date"""
+        if self.n_rows == 0:
+            return None, None
+        first, last = pd.to_datetime(self._sorted_vdate[[0, -1]])
+        return first.date(), last.date()
+
+    def values(self, col):
+        """Sorted values observed in a filter column"""
+        return list(self._bitmaps[col].keys())
+
+    def count(self, col, value):
+        """Number of rows with the given value"""
+        return self._counts[col].get(value, 0)
+
+    def _empty(self):
+        return np.zeros((self.n_rows + 7) // 8, dtype=np.uint8)
+
+    def date_bitmap(self, start_date, end_date):
+        """Bitmap of rows admitted between start_date and end_date, inclusive"""
+        lo_ns, hi_ns = _to_ns([start_date, end_date + timedelta(days=1)])
+        lo = np.searchsorted(self._sorted_vdate, lo_ns, side='left')
+        hi = np.searchsorted(self._sorted_vdate, hi_ns, side='left')
+        mask = np.zeros(self.n_rows, dtype=bool)
+        mask[self._order[lo:hi]] = True
+        return np.packbits(mask)
+
+    def value_bitmap(self, col, selected):
+        """Bitmap of rows whose col is any of the selected values"""
+        bits = self._empty()
+        col_bitmaps = self._bitmaps[col]
+        for value in selected:
+            if value in col_bitmaps:
+                bits |= col_bitmaps[value]
+        return bits
+
+    def select(self, start_date, end_date, **selections):
+        """Row positions matching the date range and every non-empty selection"""
+        bits = self.date_bitmap(start_date, end_date)
+        for col, selected in selections.items():
+            # Empty multiselect means "no constraint", as in the original filters
+            if selected:
+                bits &= self.value_bitmap(col, selected)
+        return np.flatnonzero(np.unpackbits(bits, count=self.n_rows))
+
+
+class SegmentedFilterIndex:
+    """FilterIndex over an append-only frame: one index segment per appended batch
+
+    extended() indexes only the new rows and returns a new index, so a session
+    holding the previous frame keeps a consistent index; select() runs on every
+    segment and offsets the positions.
+    """
+
+    def __init__(self, df, columns=FILTER_COLUMNS, max_segments=32):
+        self.columns = columns
+        self.max_segments = max_segments
+        self._segments = [(0, FilterIndex(df, columns))]
+        self.n_rows = len(df)
+
+    def extended(self, df):
+        """New index covering the current rows plus a batch appended after them"""
+        index = object.__new__(SegmentedFilterIndex)
+        index.columns = self.columns
+        index.max_segments = self.max_segments
+        index._segments = self._segments + [(self.n_rows, FilterIndex(df, self.columns))]
+        index.n_rows = self.n_rows + len(df)
+        return index
+
+    @property
+    def needs_compaction(self):
+        return len(self._segments) > self.max_segments
+
+    @property
+    def date_range(self):
+        """(first, last) admission date as datetime.date"""
+        ranges = [index.date_range for _, index in self._segments if index.n_rows]
+        if not ranges:
+            return None, None
+        return min(first for first, _ in ranges), max(last for _, last in ranges)
+
+    def values(self, col):
+        """Values observed in a filter column, in first-segment order"""
+        seen = {}
+        for _, index in self._segments:
+            for value in index.values(col):
+                seen.setdefault(value, None)
+        return list(seen)
+
+    def count(self, col, value):
+        """Number of rows with the given value"""
+        return sum(index.count(col, value) for _, index in self._segments)
+
+    def select(self, start_date, end_date, **selections):
+        """Row positions matching the date range and every non-empty selection"""
+        positions = [index.select(start_date, end_date, **selections) + offset
+                     for offset, index in self._segments]
+        return np.concatenate(positions)
+
+
+class PersonIndex:
+    """Admissions grouped by person, keyed on (full_name, Date_of_Birth)
+
+    Holds an eid -> row position hash index and, per person, row positions
+    sorted by vdate, so opening a patient is a hash lookup plus a slice over
+    that person's k admissions. People sharing a name stay separate.
+    """
+
+    def __init__(self, df):
+        self.n_rows = len(df)
+        self._eids = pd.Index(df['eid'].to_numpy())
+
+        name_codes, names = pd.factorize(df['full_name'])
+        dob_codes, dobs = pd.factorize(df['Date_of_Birth'])
+        self._names, self._dobs = pd.Index(names), pd.Index(dobs)
+        person_codes, persons = pd.factorize(name_codes.astype(np.int64) * len(self._dobs) + dob_codes)
+        self._persons = pd.Index(persons)
+        self._codes = person_codes
+
+        vdate = _to_ns(df['vdate'])
+        self._vdate = vdate
+        self._order = np.lexsort((vdate, person_codes))
+        self._starts = np.searchsorted(person_codes[self._order], np.arange(len(persons) + 1))
+
+        # Rows appended after the build: eid -> position, position -> person key,
+        # person key -> [(vdate ns, position)]
+        self._extra_eids = {}
+        self._extra_keys = {}
+        self._extra_rows = {}
+        self.n_total = self.n_rows
+
+    def extended(self, df):
+        """New index that also covers a batch appended after the current rows"""
+        index = object.__new__(PersonIndex)
+        index.__dict__.update(self.__dict__)
+        index._extra_eids = dict(self._extra_eids)
+        index._extra_keys = dict(self._extra_keys)
+        index._extra_rows = dict(self._extra_rows)
+
+        vdate = _to_ns(df['vdate'])
+        for offset, (eid, name, dob) in enumerate(zip(df['eid'], df['full_name'], df['Date_of_Birth'])):
+            position = self.n_total + offset
+            key = (name, dob)
+            index._extra_eids[int(eid)] = position
+            index._extra_keys[position] = key
+            index._extra_rows[key] = index._extra_rows.get(key, []) + [(vdate[offset], position)]
+        index.n_total = self.n_total + len(df)
+        return index
+
+    @property
+    def n_extra(self):
+        """Rows appended since the index was built"""
+        return self.n_total - self.n_rows
+
+    def position(self, eid):
+        """Row position of an admission id, or None"""
+        position = self._extra_eids.get(eid)
+        if position is not None:
+            return position
+        try:
+            loc = self._eids.get_loc(eid)
+        except KeyError:
+            return None
+        if isinstance(loc, slice):
+            return loc.start
+        if isinstance(loc, np.ndarray):
+            return int(np.flatnonzero(loc)[0])
+        return int(loc)
+
+    def _person_key(self, code):
+        person = self._persons[code]
+        return self._names[person // len(self._dobs)], self._dobs[person % len(self._dobs)]
+
+    def _person_code(self, key):
+        name, dob = key
+        name_code = self._names.get_indexer([name])[0]
+        dob_code = self._dobs.get_indexer([dob])[0]
+        if name_code < 0 or dob_code < 0:
+            return -1
+        return self._persons.get_indexer([name_code * len(self._dobs) + dob_code])[0]
+
+    def history(self, eid):
+        """vdate-sorted row positions of every admission of the person behind eid"""
+        position = self.position(eid)
+        if position is None:
+            return np.empty(0, dtype=np.int64)
+
+        if position < self.n_rows:
+            code = self._codes[position]
+            key = self._person_key(code) if self._extra_rows else None
+        else:
+            key = self._extra_keys[position]
+            code = self._person_code(key)
+        base = self._order[self._starts[code]:self._starts[code + 1]] if code >= 0 else np.empty(0, dtype=np.int64)
+
+        extra = self._extra_rows.get(key)
+        if not extra:
+            return base
+        vdates = np.concatenate([self._vdate[base], [v for v, _ in extra]])
+        positions = np.concatenate([base, [p for _, p in extra]])
+        return positions[np.argsort(vdates, kind='stable')]
+
+
+def date_rank(df):
+    """Rank of each row by admission date (ties keep row order): a precomputed sort permutation"""
+    order = np.argsort(_to_ns(df['vdate']), kind='stable')
+    rank = np.empty(len(order), dtype=np.int64)
+    rank[order] = np.arange(len(order))
+    return rank
+
+
+def normalize_text(value):
+    """Lowercase, accent-free, single-spaced form used for search"""
+    text = unicodedata.normalize('NFKD', str(value))
+    text = ''.join(ch for ch in text if not unicodedata.combining(ch))
+    return ' '.join(text.lower().split())
+
+
+def trigrams(text):
+    """Trigrams of normalized text padded so word starts get their own grams"""
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def index_grams(text):
+    """Trigrams plus a space-led first letter per word, so 1- and 2-letter prefixes are posting lookups"""
+    return trigrams(text) | {f" {word[0]}" for word in text.split(' ') if word}
+
+
+class SearchIndex:
+    """Trigram inverted index over the distinct names, departments and admission reasons
+
+    Each distinct normalized value is a term with a posting list of row
+    positions. A query finds candidate terms by intersecting trigram postings,
+    verifies the substring, and unions the matching rows; with no substring
+    match it falls back to terms sharing most of the query's trigrams, so a
+    typo still finds the patient. Queries under 3 characters match word
+    prefixes only, through the indexed " s" / " sh" grams.
+    """
+
+    def __init__(self, df, columns=SEARCH_COLUMNS):
+        self.columns = columns
+        self.n_rows = 0
+        self._terms = []        # term id -> (column, normalized value)
+        self._term_ids = {}     # (column, normalized value) -> term id
+        self._postings = {}     # term id -> list of row-position arrays
+        self._grams = {}        # trigram or word-start gram -> set of term ids
+        self._add_rows(df)
+
+    def _add_rows(self, df, copy_on_write=False):
+        offset = self.n_rows
+        for col in self.columns:
+            codes, uniques = pd.factorize(df[col])
+            order = np.argsort(codes, kind='stable')
+            starts = np.searchsorted(codes[order], np.arange(len(uniques) + 1))
+            for code, value in enumerate(uniques):
+                key = (col, normalize_text(value))
+                term = self._term_ids.get(key)
+                if term is None:
+                    term = len(self._terms)
+                    self._terms.append(key)
+                    self._term_ids[key] = term
+                    self._postings[term] = []
+                    for gram in index_grams(key[1]):
+                        if copy_on_write:
+                            # Gram sets are shared with the index this one was extended from
+                            self._grams[gram] = self._grams.get(gram, set()) | {term}
+                        else:
+                            self._grams.setdefault(gram, set()).add(term)
+                self._postings[term] = self._postings[term] + [order[starts[code]:starts[code + 1]] + offset]
+        self.n_rows += len(df)
+
+    def extended(self, df):
+        """New index that also covers a batch appended after the current rows"""
+        index = object.__new__(SearchIndex)
+        index.columns = self.columns
+        index.n_rows = self.n_rows
+        index._terms = list(self._terms)
+        index._term_ids = dict(self._term_ids)
+        index._postings = dict(self._postings)
+        index._grams = dict(self._grams)
+        index._add_rows(df, copy_on_write=True)
+        return index
+
+    def _candidates(self, query, columns):
+        """Terms containing every trigram of the query (a word starting with it for queries under 3 chars)"""
+        if len(query) < 3:
+            candidates = self._grams.get(f" {query}", ())
+        else:
+            postings = sorted((self._grams.get(query[i:i + 3], set()) for i in range(len(query) - 2)), key=len)
+            candidates = postings[0].intersection(*postings[1:])
+        return [term for term in candidates if self._terms[term][0] in columns]
+
+    def match_terms(self, query, columns=None, fuzzy=True, min_similarity=0.5, max_terms=50):
+        """Matching (column, value, score) terms, best first
+
+        Substring matches score 1.0 for the whole value, 0.9 for a word prefix
+        and 0.8 otherwise; without any, up to max_terms fuzzy matches score by
+        the share of the query's trigrams they contain (scaled below 0.7).
+        """
+        query = normalize_text(query)
+        if not query:
+            return []
+        columns = set(columns or self.columns)
+
+        matches = []
+        for term in self._candidates(query, columns):
+            col, value = self._terms[term]
+            if value == query:
+                score = 1.0
+            elif value.startswith(query) or f" {query}" in value:
+                score = 0.9
+            elif query in value:
+                score = 0.8
+            else:
+                continue
+            matches.append((term, score))
+
+        if not matches and fuzzy:
+            # Rarest grams first: a term sharing `need` of them shares one of the first len - need + 1,
+            # so only those postings are walked and the common grams are set lookups per candidate
+            query_grams = sorted(trigrams(query), key=lambda gram: len(self._grams.get(gram, ())))
+            need = max(1, math.ceil(min_similarity * len(query_grams) - 1e-9))
+            probe = query_grams[:len(query_grams) - need + 1]
+            candidates = set().union(*(self._grams.get(gram, ()) for gram in probe))
+            for term in candidates:
+                if self._terms[term][0] not in columns:
+                    continue
+                score = sum(term in self._grams.get(gram, ()) for gram in query_grams) / len(query_grams)
+                if score >= min_similarity:
+                    matches.append((term, round(score * 0.7, 3)))
+            matches.sort(key=lambda match: (-match[1], self._terms[match[0]][1]))
+            matches = matches[:max_terms]
+        else:
+            matches.sort(key=lambda match: (-match[1], self._terms[match[0]][1]))
+        return [(*self._terms[term], score, term) for term, score in matches]
+
+    def search(self, query, columns=None, fuzzy=True, min_similarity=0.5, max_terms=50):
+        """Row positions (sorted) matching the query, plus the ranked matching terms"""
+        positions, _, matches = self.scored_search(query, columns, fuzzy, min_similarity, max_terms)
+        return positions, matches
+
+    def scored_search(self, query, columns=None, fuzzy=True, min_similarity=0.5, max_terms=50):
+        """Row positions (sorted) matching the query, each row's best match score, and the ranked matching terms"""
+        matches = self.match_terms(query, columns, fuzzy, min_similarity, max_terms)
+        if not matches:
+            return np.empty(0, dtype=np.int64), np.empty(0), []
+        chunks = [(chunk, score) for *_, score, term in matches for chunk in self._postings[term]]
+        positions = np.concatenate([chunk for chunk, _ in chunks])
+        scores = np.concatenate([np.full(len(chunk), score) for chunk, score in chunks])
+        # A single posting chunk is already sorted; several may overlap across columns
+        if len(chunks) > 1:
+            order = np.lexsort((-scores, positions))
+            positions, scores = positions[order], scores[order]
+            first = np.ones(len(positions), dtype=bool)
+            first[1:] = positions[1:] != positions[:-1]
+            positions, scores = positions[first], scores[first]
+        return positions, scores, [(col, value, score) for col, value, score, _ in matches]
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+The evidence-based executive summary request for one patient, shared by the
+patient page and the background cache warm-up so both address the same cache entry
+"""
+
+SUMMARY_MODEL = "gpt-4o"
+# One retrieval per patient page: the clinical insights use all of it, the summary the top papers
+PATIENT_EVIDENCE_K = 10
+SUMMARY_PAPERS = 5
+
+# Enhanced system prompt for evidence-based medicine
+SUMMARY_SYSTEM_PROMPT = """You are an experienced hospital administrator with expertise in evidence-based medicine.
+Provide a concise executive summary of the patient's current status based on their clinical data and relevant medical literature.
+
+Focus on:
+1) Key abnormal findings that need attention
+2) Clinical significance based on medical evidence
+3) Evidence-based recommendations
+4) When relevant literature is provided, reference the key findings naturally in your summary
+
+Be brief, actionable, and evidence-based. Skip normal values unless specifically relevant."""
+
+
+def summary_context(patient, notes=""):
+    """Patient demographics, stay, labs and notes as prompt text"""
+    patient_context = f"""Patient: {patient['full_name']}
+Age: {patient['age_at_admission']} years ({patient['age_group']})
+Gender: {'Male' if patient['gender'] == 'M' else 'Female'}
+Department: {patient['facid']}
+Length of Stay: {patient['lengthofstay']} days
+Admission Date: {patient['vdate']}
+Discharge Date: {patient['discharged']}
+
+Lab Results:
+- Glucose: {patient['glucose']:.1f} mg/dL (normal: 70-100)
+- Creatinine: {patient['creatinine']:.2f} mg/dL (normal: 0.6-1.2)
+- Hematocrit: {patient['hematocrit']:.1f}% (normal: 38-46% female, 42-54% male)
+- Sodium: {patient['sodium']:.1f} mEq/L (normal: 135-145)
+- Blood Urea Nitrogen: {patient['bloodureanitro']:.1f} mg/dL (normal: 7-20)
+
+Risk Level: {patient['risk_level']}
+Readmission Flag: {'Yes' if patient['readmit_flag'] == 1 else 'No'}"""
+
+    if notes:
+        patient_context += f"\n\nAdditional Notes:\n{notes}"
+    return patient_context
+
+
+def patient_evidence(rag, symptoms, api_key=None):
+    """Papers for the detected symptoms, from the precomputed per-condition table; shared by the page's sections"""
+    if rag is None or not symptoms:
+        return []
+    try:
+        return rag.evidence_for_symptoms(symptoms, top_k=PATIENT_EVIDENCE_K, api_key=api_key)
+    except Exception as e:
+        print(f"RAG search failed: {e}")
+        return []
+
+
+def summary_evidence(rag, papers):
+    """The relevant ones among the top papers of patient_evidence()"""
+    return [paper for paper in papers[:SUMMARY_PAPERS] if rag.is_relevant(paper)]
+
+
+def summary_request(patient, notes="", papers=()):
+    """Chat completion arguments for the patient's executive summary"""
+    user_prompt = f"""Provide an executive summary for this patient:
+
+{summary_context(patient, notes)}"""
+
+    literature_context = "".join(f"\n\nRelevant research finding:\n{paper['chunk_text'][:500]}" for paper in papers)
+    if literature_context:
+        user_prompt += f"""\n\nRelevant Medical Literature:{literature_context}
+
+Based on the patient data and medical literature above, provide an evidence-based summary."""
+
+    return dict(
+        model=SUMMARY_MODEL,
+        messages=[
+            {"role": "system", "content": SUMMARY_SYSTEM_PROMPT},
+            {"role": "user", "content": user_prompt}
+        ],
+        max_tokens=300,  # Increased for evidence-based content
+        temperature=0.7
+    )
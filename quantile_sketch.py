@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+"""
+Mergeable streaming quantile sketch (KLL) for length-of-stay and lab thresholds
+"""
+
+import threading
+
+import numpy as np
+
+
+class KLLSketch:
+    """KLL quantile sketch: bounded memory, mergeable, built from batches of values
+
+    Level h holds items of weight 2**h. When a level overflows it is sorted and
+    every other item (random offset) is promoted to the next level. While fewer
+    than ~k values have been seen the sketch is exact and quantile() matches
+    pandas' linear interpolation.
+    """
+
+    def __init__(self, k=200, seed=None):
+        self.k = k
+        self.n = 0
+        self.min = np.inf
+        self.max = -np.inf
+        self._levels = [np.empty(0)]
+        self._rng = np.random.default_rng(seed)
+
+    def _capacity(self, level):
+        depth = len(self._levels) - level - 1
+        return max(2, int(np.ceil(self.k * (2 / 3) ** depth)))
+
+    def _compress(self):
+        level = 0
+        while level < len(self._levels):
+            items = self._levels[level]
+            if len(items) > self._capacity(level):
+                if level + 1 == len(self._levels):
+                    self._levels.append(np.empty(0))
+                items = np.sort(items)
+                # An odd leftover stays at this level so total weight is preserved
+                leftover = items[:0]
+                if len(items) % 2:
+                    leftover, items = items[-1:], items[:-1]
+                promoted = items[self._rng.integers(2)::2]
+                self._levels[level] = leftover
+                self._levels[level + 1] = np.concatenate([self._levels[level + 1], promoted])
+            level += 1
+
+    def update(self, values):
+        """Add a batch of values (NaNs are ignored)"""
+        values = np.asarray(values, dtype=np.float64).ravel()
+        values = values[~np.isnan(values)]
+        if len(values) == 0:
+            return self
+        self.n += len(values)
+        self.min = min(self.min, values.min())
+        self.max = max(self.max, values.max())
+        self._levels[0] = np.concatenate([self._levels[0], values])
+        self._compress()
+        return self
+
+    def merge(self, other):
+        """Fold another sketch into this one"""
+        if other.n == 0:
+            return self
+        while len(self._levels) < len(other._levels):
+            self._levels.append(np.empty(0))
+        for level, items in enumerate(other._levels):
+            self._levels[level] = np.concatenate([self._levels[level], items])
+        self.n += other.n
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self._compress()
+        return self
+
+    def copy(self):
+        clone = KLLSketch(self.k)
+        clone.n, clone.min, clone.max = self.n, self.min, self.max
+        clone._levels = [items.copy() for items in self._levels]
+        return clone
+
+    def _weighted_items(self):
+        items = np.concatenate(self._levels)
+        weights = np.concatenate([np.full(len(level), 2.0 ** h) for h, level in enumerate(self._levels)])
+        order = np.argsort(items, kind='stable')
+        return items[order], weights[order]
+
+    def quantile(self, q):
+        """Approximate q-quantile (scalar or array of q), NaN when empty"""
+        scalar = np.ndim(q) == 0
+        q = np.atleast_1d(np.asarray(q, dtype=np.float64))
+        if self.n == 0:
+            result = np.full(q.shape, np.nan)
+            return float(result[0]) if scalar else result
+
+        items, weights = self._weighted_items()
+        # Each item covers `weight` consecutive ranks; interpolate between rank centres
+        centres = np.cumsum(weights) - (weights + 1) / 2
+        ranks = q * (weights.sum() - 1)
+        result = np.interp(ranks, centres, items)
+        result = np.clip(result, self.min, self.max)
+        return float(result[0]) if scalar else result
+
+    def to_dict(self):
+        """JSON-serializable state"""
+        return {
+            'k': self.k,
+            'n': self.n,
+            'min': None if self.n == 0 else float(self.min),
+            'max': None if self.n == 0 else float(self.max),
+            'levels': [items.tolist() for items in self._levels],
+        }
+
+    @classmethod
+    def from_dict(cls, state):
+        sketch = cls(state['k'])
+        sketch.n = state['n']
+        if sketch.n:
+            sketch.min, sketch.max = state['min'], state['max']
+        sketch._levels = [np.asarray(items, dtype=np.float64) for items in state['levels']]
+        return sketch
+
+    def __len__(self):
+        return self.n
+
+
+class SketchIndex:
+    """KLL sketches per numeric column for every (department, month) cell
+
+    Percentiles for a department/month selection are answered by merging the
+    matching cells, so cost depends on the number of cells, not on row count.
+    Merged sketches are memoized per selection. New admissions go through
+    extended(), which returns a new index, so readers of this one never see
+    it change.
+    """
+
+    def __init__(self, df, columns, k=200, max_merged=512):
+        self.columns = list(columns)
+        self.k = k
+        self.max_merged = max_merged
+        self._cells = {col: {} for col in self.columns}
+        self._merged = {}
+        self._merged_lock = threading.Lock()
+
+        groups = df.groupby(['facid', 'month'], observed=True, sort=True).indices
+        values = {col: df[col].to_numpy(dtype=np.float64) for col in self.columns}
+        for cell, rows in groups.items():
+            for col in self.columns:
+                self._cells[col][cell] = KLLSketch(k).update(values[col][rows])
+
+        bounds = df.groupby('month', observed=True)['vdate'].agg(['min', 'max'])
+        self._month_bounds = {month: (row['min'].date(), row['max'].date()) for month, row in bounds.iterrows()}
+
+    def months_within(self, start_date, end_date):
+        """Months whose admissions all fall inside the date range
+
+        Returns None when the range cuts through a month, i.e. the selection
+        cannot be expressed in whole (department, month) cells.
+        """
+        months = []
+        for month, (first, last) in self._month_bounds.items():
+            if last < start_date or first > end_date:
+                continue
+            if first < start_date or last > end_date:
+                return None
+            months.append(month)
+        return months
+
+    def extended(self, df):
+        """New index with new admissions folded in; cells they touch are copied, the rest shared"""
+        index = object.__new__(SketchIndex)
+        index.__dict__.update(self.__dict__)
+        index._cells = {col: dict(cells) for col, cells in self._cells.items()}
+        index._month_bounds = dict(self._month_bounds)
+        index._merged = {}
+        index._merged_lock = threading.Lock()
+
+        groups = df.groupby(['facid', 'month'], observed=True, sort=True).indices
+        for col in self.columns:
+            values = df[col].to_numpy(dtype=np.float64)
+            for cell, rows in groups.items():
+                sketch = self._cells[col].get(cell)
+                sketch = KLLSketch(self.k) if sketch is None else sketch.copy()
+                index._cells[col][cell] = sketch.update(values[rows])
+        for month, vdates in df.groupby('month', observed=True)['vdate']:
+            first, last = vdates.min().date(), vdates.max().date()
+            if month in self._month_bounds:
+                old_first, old_last = self._month_bounds[month]
+                first, last = min(first, old_first), max(last, old_last)
+            index._month_bounds[month] = (first, last)
+        return index
+
+    def sketch(self, col, facids=None, months=None):
+        """Merged sketch for the selected departments and months (None means all)"""
+        key = (col,
+               None if facids is None else tuple(sorted(facids)),
+               None if months is None else tuple(sorted(months)))
+        with self._merged_lock:
+            merged = self._merged.get(key)
+        if merged is None:
+            facid_set = None if facids is None else set(facids)
+            month_set = None if months is None else set(months)
+            merged = KLLSketch(self.k)
+            for (facid, month), cell in self._cells[col].items():
+                if (facid_set is None or facid in facid_set) and (month_set is None or month in month_set):
+                    merged.merge(cell)
+            with self._merged_lock:
+                if len(self._merged) >= self.max_merged:
+                    self._merged.pop(next(iter(self._merged)))
+                self._merged[key] = merged
+        return merged
+
+    def quantile(self, col, q, facids=None, months=None):
+        """Approximate quantile of col over the selected cells"""
+        return self.sketch(col, facids, months).quantile(q)
@@ -6,16 +6,81 @@ RAG Retrieval System: Search relevant papers based on patient symptoms
 import os
 import sqlite3
 import json
-import openai
+import threading
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
-from sklearn.metrics.pairwise import cosine_similarity
 from dotenv import load_dotenv
 
+from disk_cache import TwoTierCache, cache_key, normalize_text
+from evidence_table import (EVIDENCE_TOP_K, condition_key, condition_query, corpus_version, evidence_path, file_stamp,
+                            load_evidence_table, save_evidence_table)
+from lexical_index import MIN_BM25_SCORE, bm25_weights, fts_table, match_expression
+from llm_client import cached_completion, classify_openai_error, get_openai_client, open_chat_stream
+from patient_conditions import (SYMPTOM_KEYWORDS, detect_conditions, detect_patient_conditions, diagnostic_basis,
+                                symptoms_for)
+from sqlite_pool import ReadOnlyConnectionPool
+from vector_index import IVFIndex, VectorIndex, sidecar_path, table_fingerprint
+
 # Load environment variables
 load_dotenv()
 
+# Hybrid retrieval: each engine's hits must clear its own floor, then reciprocal-rank fusion ranks them
+MIN_SIMILARITY = 0.65       # cosine floor for vector hits
+MIN_SCAN_SCORE = 3          # floor for the keyword row scan on databases without an FTS index
+RRF_K = 60                  # rank damping constant of reciprocal-rank fusion
+CANDIDATE_BUDGET = 4        # candidates per requested result, shared by the engines that run
+# Fused relevance floor for evidence (1.0 = first everywhere), derived from the fusion: when both
+# engines ran, a chunk only one of them found at rank r scores (RRF_K + 1) / (2 * (RRF_K + r)),
+# so the floor is that score at RELEVANT_RANK. Chunks both engines found clear it down to rank
+# 66 in each, deeper than any candidate list; a search one engine answered alone keeps every hit.
+RELEVANT_RANK = 3
+MIN_RELEVANCE = (1.0 / (RRF_K + RELEVANT_RANK)) / (2 / (RRF_K + 1))   # same arithmetic as _search()
+
+EMBEDDING_MODEL = "text-embedding-ada-002"
+# Query embeddings are cached next to the RAG database (data/.cache/ by default)
+EMBEDDING_CACHE_FILE = os.path.join('.cache', 'query_embeddings.db')
+
+# Display fields of retrieved chunks, per chunk table
+CHUNK_ROWS_SQL = {
+    'paper_chunks': '''
+        SELECT id, filename, title, authors, year, chunk_text
+        FROM paper_chunks
+        WHERE id IN ({})
+    ''',
+    'chunks': '''
+        SELECT c.id, p.filename, p.title, NULL, NULL, c.chunk_text
+        FROM chunks c
+        JOIN papers p ON c.paper_id = p.id
+        WHERE c.id IN ({})
+    ''',
+}
+
+# JSON embeddings written by the ingestion before the embedding store existed
+JSON_EMBEDDINGS_SQL = {
+    'paper_chunks': 'SELECT id, embedding FROM paper_chunks WHERE embedding IS NOT NULL',
+    'chunks': '''
+        SELECT c.id, c.embedding
+        FROM chunks c
+        JOIN papers p ON c.paper_id = p.id
+        WHERE c.embedding IS NOT NULL
+    ''',
+}
+
+
+def reciprocal_rank_fusion(rankings, k=RRF_K):
+    """Fuse best-first id lists: an id scores sum(1 / (k + rank)) over the lists it is in
+
+    Returns (id, score) pairs, best first; ties go to the lower id.
+    """
+    scores = {}
+    for ranking in rankings:
+        for rank, chunk_id in enumerate(ranking, start=1):
+            scores[chunk_id] = scores.get(chunk_id, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+
 class RAGSystem:
-    def __init__(self, db_path=None, api_key=None):
+    def __init__(self, db_path=None, api_key=None, ann_nprobe=16, ann_rerank=200, min_similarity=MIN_SIMILARITY,
+                 retrieval='hybrid', embedding_cache=None):
         # Auto-detect database path for different environments
         if db_path is None:
             possible_paths = [
@@ -31,6 +96,34 @@ class RAGSystem:
         else:
             self.db_path = db_path
 
+        # Pooled read-only connections; the schema is detected once here, not per query
+        self._pool = None
+        self.schema = None
+        self.has_fts = False
+        self._vector_index = None
+        self._vector_lock = threading.Lock()
+        self._evidence = None
+        self._evidence_stamps = None
+        self._evidence_lock = threading.Lock()
+        # ANN search knobs, used when the ingestion built an IVF index (large corpora only):
+        # more probed lists = higher recall and latency; 0/None = exact search
+        self.ann_nprobe = ann_nprobe
+        self.ann_rerank = ann_rerank
+        self.min_similarity = min_similarity
+        if retrieval not in ('hybrid', 'keyword', 'vector'):
+            raise ValueError(f"Unknown retrieval mode: {retrieval}")
+        self.retrieval = retrieval
+        # Runs the embedding request + vector search while the keyword search runs on the caller's thread
+        self._executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix='rag-search')
+        if self.is_available():
+            self._pool = ReadOnlyConnectionPool(self.db_path)
+            self.schema = self._detect_schema()
+        # Query text -> embedding, in memory and on disk: repeated patient views make no embedding requests
+        if embedding_cache is None:
+            cache_path = os.path.join(os.path.dirname(self.db_path), EMBEDDING_CACHE_FILE) if self.is_available() else None
+            embedding_cache = TwoTierCache(cache_path)
+        self.embedding_cache = embedding_cache
+
         # Use provided API key or fall back to environment variable
         self.api_key = api_key or os.getenv('OPENAI_API_KEY')
         self.client = None  # Initialize later when needed
@@ -58,46 +151,102 @@ class RAGSystem:
         }
         
         # Medical symptom keyword mapping
-        self.symptom_keywords = {
-            'anemia': ['anemia', 'anemic', 'hemoglobin', 'hematocrit', 'iron deficiency', 'low blood count'],
-            'pneumonia': ['pneumonia', 'lung infection', 'respiratory infection', 'chest infection'],
-            'asthma': ['asthma', 'breathing problems', 'respiratory issues', 'airway obstruction'],
-            'depression': ['depression', 'depressive', 'mental health', 'psychiatric', 'mood disorder'],
-            'anxiety': ['anxiety', 'anxious', 'stress', 'panic', 'worry'],
-            'diabetes': ['diabetes', 'diabetic', 'blood sugar', 'glucose', 'insulin'],
-            'hypertension': ['hypertension', 'high blood pressure', 'blood pressure'],
-            'heart disease': ['heart disease', 'cardiac', 'cardiovascular', 'heart failure'],
-            'kidney disease': ['kidney disease', 'renal', 'nephrology', 'dialysis'],
-            'substance abuse': ['substance abuse', 'drug abuse', 'addiction', 'substance use disorder']
-        }
+        self.symptom_keywords = SYMPTOM_KEYWORDS
 
     def is_available(self):
         """Check if RAG system is available"""
         return self.db_path is not None and os.path.exists(self.db_path)
 
-    def update_api_key(self, api_key):
-        """Update the API key for OpenAI client"""
-        self.api_key = api_key
-        self.client = None  # Reset client to use new key
+    def _detect_schema(self):
+        """Which retrieval table the database provides: 'paper_chunks', 'chunks' or None
 
-    def _get_client(self):
-        """Get or create OpenAI client with current API key"""
+        Also notes whether the ingestion built the FTS5 keyword index for it.
+        """
+        try:
+            tables = {row[0] for row in self._pool.execute("SELECT name FROM sqlite_master WHERE type='table'")}
+        except Exception as e:
+            print(f"Could not read RAG database schema: {e}")
+            return None
+        for table in ('paper_chunks', 'chunks'):
+            if table in tables:
+                self.has_fts = fts_table(table) in tables
+                return table
+        return None
+
+    def _get_vector_index(self):
+        """Chunk embeddings as a normalized matrix, opened once per process
+
+        Memory-mapped from the embedding store the ingestion scripts write next
+        to the database, with its IVF index attached when one was built.
+        Databases that only carry JSON embeddings are decoded once and
+        migrated into a store. Empty when the table has no embeddings.
+        """
+        with self._vector_lock:
+            if self._vector_index is not None:
+                return self._vector_index
+
+            with self._pool.connection() as conn:
+                meta = table_fingerprint(conn, self.schema)
+            path = sidecar_path(self.db_path, self.schema)
+            index = VectorIndex.load(path, expected_meta=meta)
+            if index is None:
+                try:
+                    rows = self._pool.execute(JSON_EMBEDDINGS_SQL[self.schema])
+                except sqlite3.OperationalError:
+                    rows = []  # no embedding column
+                index = VectorIndex.from_json_rows(rows)
+                if len(index) == 0:
+                    # Nothing to migrate; leave a stale store for the ingestion script to rebuild
+                    if os.path.exists(path):
+                        print(f"Embedding store {path} is out of date; re-run the ingestion")
+                else:
+                    try:
+                        index.save(path, meta)
+                        index = VectorIndex.load(path, expected_meta=meta) or index
+                    except OSError as e:
+                        print(f"Could not write embedding store: {e}")
+            index.ann = IVFIndex.load(path, expected_meta=meta)
+            self._vector_index = index
+            return index
+
+    def is_relevant(self, paper):
+        """Whether a search hit is relevant enough to be used as evidence"""
+        return paper.get('relevance', 0) >= MIN_RELEVANCE
+
+    def close(self):
+        """Close pooled database connections and the search threads"""
+        self._executor.shutdown(wait=False)
+        self.embedding_cache.close()
+        if self._pool is not None:
+            self._pool.close()
+
+    def _get_client(self, api_key=None):
+        """Shared pooled OpenAI client for a caller's API key, else for the instance's own"""
+        if api_key and api_key != self.api_key:
+            return get_openai_client(api_key)
         if self.client is None and self.api_key:
-            self.client = openai.OpenAI(api_key=self.api_key)
+            self.client = get_openai_client(self.api_key)
         return self.client
 
-    def get_embedding(self, text):
-        """Get text embedding"""
+    def get_embedding(self, text, api_key=None):
+        """Get text embedding (float32), from the cache when this model has embedded the same text before"""
+        key = cache_key(EMBEDDING_MODEL, normalize_text(text))
+        cached = self.embedding_cache.get(key)
+        if cached is not None:
+            return np.frombuffer(cached, dtype=np.float32).copy()
         try:
-            client = self._get_client()
+            client = self._get_client(api_key)
             if not client:
                 raise Exception("No valid API key available")
 
             response = client.embeddings.create(
-                model="text-embedding-ada-002",
+                model=EMBEDDING_MODEL,
                 input=text
             )
-            return np.array(response.data[0].embedding)
+            embedding = np.asarray(response.data[0].embedding, dtype=np.float32)
+            # Failures are never cached, so the next view retries
+            self.embedding_cache.put(key, embedding.tobytes())
+            return embedding
         except Exception as e:
             print(f"Failed to get embedding: {e}")
             return None
@@ -176,142 +325,212 @@ class RAGSystem:
     
     def extract_symptoms_from_patient(self, patient_data):
         """Extract symptom keywords and diagnostic basis from patient data"""
-        symptoms = []
-        diagnostic_info = []
-        
-        # Check various medical indicators - using stricter thresholds
-        # Severe anemia: hematocrit < 8
-        if patient_data.get('hematocrit', 0) < 8:
-            symptoms.append('anemia')
-            hct_value = patient_data.get('hematocrit', 0)
-            diagnostic_info.append(f"Severe Anemia (Hematocrit: {hct_value:.1f}g/dL, Normal: 12-16g/dL)")
-        
-        # Check specific disease flags
-        if patient_data.get('irondef', 0) == 1:
-            symptoms.append('anemia')
-            diagnostic_info.append("Iron Deficiency Anemia (Iron deficiency indicator positive)")
-            
-        if patient_data.get('hemo', 0) == 1:
-            symptoms.append('anemia')
-            diagnostic_info.append("Anemia (Hemoglobin abnormal indicator positive)")
-            
-        if patient_data.get('asthma', 0) == 1:
-            symptoms.append('asthma')
-            respiration = patient_data.get('respiration', 0)
-            neutrophils = patient_data.get('neutrophils', 0)
-            lab_findings = []
-            if respiration > 20:
-                lab_findings.append(f"Elevated respiratory rate: {respiration}/min (Normal: 12-20)")
-            if neutrophils > 70:
-                lab_findings.append(f"Elevated neutrophils: {neutrophils:.1f}% (Normal: 40-70%)")
-            
-            if lab_findings:
-                diagnostic_info.append(f"Asthma (Diagnostic marker positive, {'; '.join(lab_findings)})")
-            else:
-                diagnostic_info.append("Asthma (Asthma diagnostic marker positive)")
-            
-        if patient_data.get('pneum', 0) == 1:
-            symptoms.append('pneumonia')
-            respiration = patient_data.get('respiration', 0)
-            neutrophils = patient_data.get('neutrophils', 0)
-            lab_findings = []
-            if respiration > 20:
-                lab_findings.append(f"Elevated respiratory rate: {respiration}/min (Normal: 12-20)")
-            if neutrophils > 70:
-                lab_findings.append(f"Elevated neutrophils: {neutrophils:.1f}% (Normal: 40-70%)")
-            
-            if lab_findings:
-                diagnostic_info.append(f"Pneumonia (Diagnostic marker positive, {'; '.join(lab_findings)})")
-            else:
-                diagnostic_info.append("Pneumonia (Pneumonia diagnostic marker positive)")
-            
-        if patient_data.get('depress', 0) == 1:
-            symptoms.append('depression')
-            diagnostic_info.append("Depression (Diagnostic marker positive)")
-            
-        if patient_data.get('psychologicaldisordermajor', 0) == 1:
-            symptoms.append('depression')
-            diagnostic_info.append("Major Psychological Disorder (Diagnostic marker positive)")
-            
-        if patient_data.get('substancedependence', 0) == 1:
-            symptoms.append('substance abuse')
-            # Substance dependence may lead to malnutrition and electrolyte imbalance, these are reasonable associations
-            sodium = patient_data.get('sodium', 0)
-            if sodium < 135:
-                diagnostic_info.append(f"Substance Dependence (Diagnostic marker positive, possible electrolyte imbalance: Sodium {sodium:.1f} mEq/L, Normal: 135-145)")
-            else:
-                diagnostic_info.append("Substance Dependence (Diagnostic marker positive)")
-            
-        if patient_data.get('dialysisrenalendstage', 0) == 1:
-            symptoms.append('kidney disease')
-            creatinine = patient_data.get('creatinine', 0)
-            bloodureanitro = patient_data.get('bloodureanitro', 0)
-            lab_findings = []
-            if creatinine > 1.2:
-                lab_findings.append(f"Elevated creatinine: {creatinine:.2f} mg/dL (Normal: 0.6-1.2)")
-            if bloodureanitro > 25:
-                lab_findings.append(f"Elevated blood urea nitrogen: {bloodureanitro:.1f} mg/dL (Normal: 7-25)")
-            
-            if lab_findings:
-                diagnostic_info.append(f"End-stage Renal Disease (Dialysis treatment marker positive, {'; '.join(lab_findings)})")
-            else:
-                diagnostic_info.append("End-stage Renal Disease (Dialysis treatment marker positive)")
-        
-        # 检查诊断代码或其他字段中的症状
-        diagnosis = str(patient_data.get('diagnosis', '')).lower()
-        for symptom, keywords in self.symptom_keywords.items():
-            for keyword in keywords:
-                if keyword in diagnosis:
-                    symptoms.append(symptom)
-                    diagnostic_info.append(f"{symptom.title()} (Diagnosis code contains: {keyword})")
-                    break
-        
-        # 如果没有找到特定症状，添加通用医学术语
-        if not symptoms:
-            symptoms = ['length of stay', 'hospital admission', 'medical care']
-        
-        return list(set(symptoms)), diagnostic_info  # 去重，返回症状和诊断依据
-    
-    def search_relevant_papers(self, query, top_k=3):
-        """搜索相关论文"""
+        conditions, basis, diagnosis_basis = detect_patient_conditions(patient_data, self.symptom_keywords)
+        diagnostic_info = diagnostic_basis(patient_data, basis, diagnosis_basis, self.symptom_keywords)
+        # 去重并排序：same symptom set -> same query text (and evidence table key)
+        return symptoms_for(conditions), diagnostic_info
+
+    def extract_symptoms_batch(self, df):
+        """Condition flags and diagnostic-basis codes of every patient in df, in one vectorized pass
+
+        See patient_conditions.detect_conditions; render a row's text with
+        patient_conditions.diagnostic_basis when it is displayed.
+        """
+        return detect_conditions(df, self.symptom_keywords)
+
+    def search_relevant_papers(self, query, top_k=3, api_key=None):
+        """搜索相关论文
+
+        Hybrid retrieval over the chunk table: the keyword search (FTS5/BM25,
+        or the row scan on databases without the index) and the vector search
+        run concurrently, each taking an equal share of one candidate budget,
+        and are fused with reciprocal-rank fusion. retrieval='keyword' or
+        'vector' runs one engine only. Every hit carries a single 'relevance'
+        in (0, 1] and the engines that found it in 'retrieved_by'. api_key is
+        the caller's key for the query embedding; the instance is shared, so
+        it is passed per call rather than stored.
+        """
         try:
-            # 检查数据库是否存在
-            if not self.is_available():
-                return []
-
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-
-            # 检查数据库结构 - 支持新的轻量数据库
-            cursor.execute("SELECT name FROM sqlite_master WHERE type='table';")
-            tables = [row[0] for row in cursor.fetchall()]
-
-            if 'paper_chunks' in tables:
-                # 新的轻量数据库结构 - 基于关键词搜索
-                return self._search_lightweight_db(cursor, query, top_k)
-            elif 'chunks' in tables:
-                # 原有的向量数据库结构
-                return self._search_vector_db(cursor, query, top_k)
-            else:
-                conn.close()
-                return []
-
+            hits, _ = self._search(query, top_k, api_key)
+            return self._papers_for(hits)
         except Exception as e:
             print(f"Search error: {e}")
             return []
 
+    def _engines(self):
+        """Names of the retrieval engines a search runs: 'keyword' and/or 'vector'"""
+        # 检查数据库是否存在
+        if not self.is_available() or self.schema is None:
+            return []
+        engines = []
+        if self.retrieval != 'vector' and (self.has_fts or self.schema == 'paper_chunks'):
+            engines.append('keyword')
+        if self.retrieval != 'keyword' and len(self._get_vector_index()) > 0:
+            engines.append('vector')
+        return engines
+
+    def _search(self, query, top_k, api_key=None):
+        """Fused (chunk_id, relevance, retrieved_by) hits, best first, and the engines that contributed"""
+        engines = self._engines()
+        if not engines:
+            return [], []
+        depth = max(top_k, CANDIDATE_BUDGET * top_k // len(engines))
+
+        # The embedding request dominates; the keyword search runs meanwhile on this thread
+        vector_future = self._executor.submit(self._vector_ranking, query, depth, api_key) if 'vector' in engines else None
+        rankings = {}
+        if 'keyword' in engines:
+            rankings['keyword'] = self._keyword_ranking(query, depth)
+        if vector_future is not None:
+            vector_ids = vector_future.result()
+            if vector_ids is not None:
+                rankings['vector'] = vector_ids
+
+        # 1.0 = ranked first by every engine that ran
+        best_possible = len(rankings) / (RRF_K + 1)
+        hits = [(chunk_id, score / best_possible,
+                 [name for name, ranking in rankings.items() if chunk_id in ranking])
+                for chunk_id, score in reciprocal_rank_fusion(rankings.values())[:top_k]]
+        return hits, list(rankings)
+
+    def _papers_for(self, hits):
+        """Result dicts for (chunk_id, relevance, retrieved_by) hits, fetched with one primary-key lookup"""
+        if not hits:
+            return []
+        ids = [chunk_id for chunk_id, _, _ in hits]
+        with self._pool.connection() as conn:
+            rows = conn.execute(CHUNK_ROWS_SQL[self.schema].format(','.join('?' * len(ids))), ids).fetchall()
+        rows = {row[0]: row for row in rows}
+
+        papers = []
+        for chunk_id, relevance, retrieved_by in hits:
+            if chunk_id not in rows:
+                continue
+            _, filename, title, authors, year, chunk_text = rows[chunk_id]
+            papers.append({
+                'chunk_id': chunk_id,
+                'filename': filename,
+                'title': title,
+                'authors': authors,
+                'year': year,
+                'chunk_text': chunk_text,
+                'relevance': relevance,
+                'retrieved_by': list(retrieved_by),
+            })
+        return papers
+
+    def evidence_version(self):
+        """Corpus version the evidence table must match: database and embedding store files plus search settings"""
+        with self._pool.connection() as conn:
+            fingerprint = table_fingerprint(conn, self.schema)
+        store = sidecar_path(self.db_path, self.schema)
+        return corpus_version({
+            'database': file_stamp(self.db_path),
+            'table': self.schema,
+            'fingerprint': fingerprint,
+            'store': file_stamp(store),
+            'ann': file_stamp(f"{store}.ivf.npz"),
+            'embedding_model': EMBEDDING_MODEL,
+            'retrieval': self.retrieval,
+            'min_similarity': self.min_similarity,
+            'ann_search': [self.ann_nprobe, self.ann_rerank],
+            'top_k': EVIDENCE_TOP_K,
+        })
+
+    def build_evidence_table(self, symptom_sets):
+        """Run retrieval once per distinct symptom set and store the top chunks for lookup
+
+        Returns the number of stored condition sets. Refuses to store results
+        that a live search would not reproduce, e.g. keyword-only hits because
+        embeddings could not be requested.
+        """
+        if not self.is_available() or self.schema is None:
+            raise RuntimeError("RAG database not available")
+        engines = self._engines()
+        entries = {}
+        for symptoms in {condition_key(symptoms): symptoms for symptoms in symptom_sets}.values():
+            hits, used = self._search(condition_query(symptoms), EVIDENCE_TOP_K)
+            if hits and used != engines:
+                raise RuntimeError(f"Search ran {used or 'no engine'} instead of {engines}; "
+                                   "check the OpenAI API key")
+            entries[condition_key(symptoms)] = [[int(chunk_id), relevance, retrieved_by]
+                                                for chunk_id, relevance, retrieved_by in hits]
+        save_evidence_table(evidence_path(self.db_path, self.schema), self.evidence_version(), engines, entries)
+        with self._evidence_lock:
+            self._evidence = None
+        return len(entries)
+
+    def _corpus_stamps(self):
+        """Size and mtime of the files the evidence table depends on, itself included: a cheap change check"""
+        store = sidecar_path(self.db_path, self.schema)
+        paths = [self.db_path, f"{self.db_path}-wal", store, f"{store}.ivf.npz", evidence_path(self.db_path, self.schema)]
+        return [file_stamp(path) for path in paths]
+
+    def _get_evidence_table(self):
+        """The precomputed evidence table; None when missing or out of date
+
+        Reloaded, and its corpus version re-checked, whenever one of the
+        stamped files changes, so a rebuilt corpus or table is picked up by a
+        running process.
+        """
+        stamps = self._corpus_stamps()
+        with self._evidence_lock:
+            if self._evidence is None or stamps != self._evidence_stamps:
+                path = evidence_path(self.db_path, self.schema)
+                self._evidence = (load_evidence_table(path, self.evidence_version())
+                                  if os.path.exists(path) else None) or {}
+                self._evidence_stamps = stamps
+            return self._evidence or None
+
+    def evidence_for_symptoms(self, symptoms, top_k=3, api_key=None):
+        """Evidence for a detected symptom set: from the precomputed table when it covers the set, else a live search
+
+        Served entries use the same engines a live search would run now, so a
+        table built without embeddings is not used once an API key is set.
+        """
+        try:
+            if self.is_available() and self.schema is not None and top_k <= EVIDENCE_TOP_K:
+                table = self._get_evidence_table()
+                engines = [name for name in self._engines() if name != 'vector' or api_key or self.api_key]
+                if table is not None and set(table['engines']) == set(engines):
+                    hits = table['entries'].get(condition_key(symptoms))
+                    if hits is not None:
+                        return self._papers_for(hits[:top_k])
+        except Exception as e:
+            print(f"Evidence table lookup failed: {e}")
+        return self.search_relevant_papers(condition_query(symptoms), top_k=top_k, api_key=api_key)
+
+    def _keyword_ranking(self, query, depth):
+        """Chunk ids best first from the keyword engine, above its score floor"""
+        with self._pool.connection() as conn:
+            if self.has_fts:
+                hits = self._search_fts(conn.cursor(), query, depth)
+                return [chunk_id for chunk_id, score in hits if score >= MIN_BM25_SCORE]
+            hits = self._search_lightweight_db(conn.cursor(), query, depth)
+            return [paper['chunk_id'] for paper in hits if paper['score'] >= MIN_SCAN_SCORE]
+
+    def _vector_ranking(self, query, depth, api_key=None):
+        """Chunk ids best first from the vector engine, above the similarity floor; None without an embedding"""
+        query_embedding = self.get_embedding(query, api_key)
+        if query_embedding is None:
+            return None
+        # One matrix-vector product over the preloaded, normalized embeddings (or an IVF probe + exact rerank)
+        chunk_ids, scores = self._get_vector_index().search(
+            query_embedding, depth, nprobe=self.ann_nprobe, rerank=self.ann_rerank)
+        return [int(chunk_id) for chunk_id, score in zip(chunk_ids, scores) if score >= self.min_similarity]
+
     def _search_lightweight_db(self, cursor, query, top_k=3):
-        """在轻量数据库中基于关键词搜索"""
+        """在轻量数据库中基于关键词搜索（没有FTS索引的旧数据库：逐行扫描）"""
         query_lower = query.lower()
 
         # 获取所有论文 - 使用正确的字段名
-        cursor.execute('SELECT filename, title, authors, year, chunk_text FROM paper_chunks')
+        cursor.execute('SELECT id, filename, title, authors, year, chunk_text FROM paper_chunks')
         all_papers = cursor.fetchall()
 
         scored_papers = []
 
         for paper in all_papers:
-            filename, title, authors, year, chunk_text = paper
+            chunk_id, filename, title, authors, year, chunk_text = paper
             score = 0
 
             # 基于内容匹配计分
@@ -357,6 +576,7 @@ class RAGSystem:
 
             if score > 0:
                 scored_papers.append({
+                    'chunk_id': chunk_id,
                     'filename': filename,
                     'title': title,
                     'authors': authors,  # 修正字段名
@@ -369,82 +589,60 @@ class RAGSystem:
         scored_papers.sort(key=lambda x: x['score'], reverse=True)
         return scored_papers[:top_k]
 
-    def _search_vector_db(self, cursor, query, top_k=3):
-        """在向量数据库中搜索（原有方法）"""
-        # 检查数据库中是否有数据
-        cursor.execute('SELECT COUNT(*) FROM chunks')
-        count = cursor.fetchone()[0]
-        if count == 0:
-            return []
-
-        # 获取查询的embedding
-        query_embedding = self.get_embedding(query)
-        if query_embedding is None:
-            return []
-
-        # 获取所有chunks和它们的embeddings
-        cursor.execute('''
-            SELECT c.id, c.chunk_text, c.embedding, p.title, p.filename
-            FROM chunks c
-            JOIN papers p ON c.paper_id = p.id
-            WHERE c.embedding IS NOT NULL
-        ''')
-
-        results = cursor.fetchall()
-
-        if not results:
+    def _search_fts(self, cursor, query, top_k=3):
+        """BM25 keyword search through the FTS5 index: (chunk id, BM25 score) best first"""
+        expression = match_expression(query)
+        if expression is None:
             return []
-
-        # 计算相似度
-        similarities = []
-        for result in results:
-            chunk_id, chunk_text, embedding_json, title, filename = result
-            try:
-                chunk_embedding = np.array(json.loads(embedding_json))
-                similarity = cosine_similarity([query_embedding], [chunk_embedding])[0][0]
-                similarities.append({
-                    'chunk_id': chunk_id,
-                    'chunk_text': chunk_text,
-                    'title': title,
-                    'filename': filename,
-                    'similarity': similarity
-                })
-            except Exception as e:
-                continue
-
-        # 按相似度排序并返回top_k结果
-        similarities.sort(key=lambda x: x['similarity'], reverse=True)
-        return similarities[:top_k]
-    
-    def get_rag_response_for_patient(self, patient_data, user_question=None):
-        """Generate RAG-based response for patient"""
+        fts = fts_table(self.schema)
+        weights = ', '.join(str(weight) for weight in bm25_weights(self.schema))
+        cursor.execute(f'''
+            SELECT rowid, bm25({fts}, {weights}) AS rank
+            FROM {fts}
+            WHERE {fts} MATCH ?
+            ORDER BY rank
+            LIMIT ?
+        ''', (expression, top_k))
+        # FTS5 bm25() is negated so that ORDER BY puts the best first
+        return [(chunk_id, -rank) for chunk_id, rank in cursor.fetchall()]
+
+    def get_rag_response_for_patient(self, patient_data, user_question=None, stream=False,
+                                     detected=None, papers=None, cache=None, api_key=None):
+        """Generate RAG-based response for patient
+
+        With stream=True the response is an iterator of text deltas (for
+        st.write_stream); API errors are still reported as messages up front.
+        A caller that already has the patient's (symptoms, diagnostic_info) or
+        the retrieved papers passes them as detected / papers instead of
+        having them computed again; with a cache (a TwoTierCache) identical
+        requests are answered from it. api_key is the caller's key (the
+        instance's own when None).
+        """
         # 提取患者症状和诊断依据
-        symptoms, diagnostic_info = self.extract_symptoms_from_patient(patient_data)
-        
-        # 构建搜索查询
-        if user_question:
-            search_query = f"{user_question} {' '.join(symptoms)}"
-        else:
-            search_query = ' '.join(symptoms)
+        symptoms, diagnostic_info = detected or self.extract_symptoms_from_patient(patient_data)
         
         # 搜索相关论文 - 增加数量以获取更多相关文献
-        relevant_papers = self.search_relevant_papers(search_query, top_k=10)
+        if papers is not None:
+            relevant_papers = papers
+        elif user_question:
+            relevant_papers = self.search_relevant_papers(f"{user_question} {' '.join(symptoms)}", top_k=10,
+                                                          api_key=api_key)
+        else:
+            # Symptom-only queries come from a small fixed vocabulary: served from the precomputed table
+            relevant_papers = self.evidence_for_symptoms(symptoms, top_k=10, api_key=api_key)
         
         if not relevant_papers:
             return None, [], diagnostic_info
         
-        # Filter high similarity papers (0.8 and above) and build context (deduplicate)
+        # Filter relevant papers and build context (deduplicate)
         context_texts = []
         paper_references = []
         seen_titles = set()
         high_quality_papers = []
         
         for paper in relevant_papers:
-            # Handle both similarity (vector DB) and score (lightweight DB)
-            paper_score = paper.get('similarity', paper.get('score', 0))
-            score_threshold = 0.65 if 'similarity' in paper else 3  # Lowered thresholds for broader matching
-
-            if paper_score >= score_threshold and paper['title'] not in seen_titles:
+            # One fused relevance score for keyword and vector hits
+            if self.is_relevant(paper) and paper['title'] not in seen_titles:
                 # 优先使用数据库中的元数据，如果没有再从文件名提取
                 author = paper.get('authors', 'Unknown')
                 year = paper.get('year', None)
@@ -465,7 +663,7 @@ class RAGSystem:
                         metadata_parts.append(str(year))
                     metadata_str = f" ({', '.join(metadata_parts)})"
                 
-                score_text = f"similarity: {paper_score:.3f}" if 'similarity' in paper else f"relevance score: {paper_score}"
+                score_text = f"relevance: {paper['relevance']:.2f}"
                 # 只添加纯文本内容到context，不包含论文标题和元数据
                 context_texts.append(paper['chunk_text'][:800])
 
@@ -505,11 +703,11 @@ Please provide ONLY the clinical conclusions and medical recommendations. Do NOT
 Start directly with the clinical content without any introductory phrases or headers."""
         
         try:
-            client = self._get_client()
+            client = self._get_client(api_key)
             if not client:
                 raise Exception("No valid API key available")
 
-            response = client.chat.completions.create(
+            request = dict(
                 model="gpt-3.5-turbo",
                 messages=[
                     {"role": "system", "content": "You are a medical assistant that answers questions based on provided literature content."},
@@ -519,25 +717,23 @@ Start directly with the clinical content without any introductory phrases or hea
                 temperature=0.6,  # Slightly more deterministic for medical content
                 presence_penalty=0.1
             )
-            
-            ai_response = response.choices[0].message.content
+            if stream:
+                return open_chat_stream(client, cache=cache, **request), relevant_papers, diagnostic_info
+
+            if cache is not None:
+                ai_response, _ = cached_completion(client, cache, **request)
+            else:
+                response = client.chat.completions.create(**request)
+                ai_response = response.choices[0].message.content
 
             # 不在这里添加引用，让app.py单独处理
             return ai_response, relevant_papers, diagnostic_info
             
         except Exception as e:
-            error_str = str(e)
             print(f"Failed to generate RAG response: {e}")
 
             # Return specific error message for API key issues
-            if "401" in error_str or "invalid_request_error" in error_str or "Incorrect API key" in error_str:
-                return "❌ **API密钥无效** - 请在侧边栏检查并重新输入正确的OpenAI API密钥", [], []
-            elif "403" in error_str or "insufficient_quota" in error_str:
-                return "❌ **API配额不足** - 您的OpenAI账户余额不足或已达到使用限制", [], []
-            elif "429" in error_str or "rate_limit" in error_str:
-                return "❌ **请求过于频繁** - 请稍等片刻后重试", [], []
-            else:
-                return None, relevant_papers, diagnostic_info
-
-# Global RAG system instance
-rag_system = RAGSystem()
\ No newline at end of file
+            message = classify_openai_error(e)
+            if message:
+                return message, [], []
+            return None, relevant_papers, diagnostic_info
\ No newline at end of file
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Recall@k and latency of IVF approximate search vs exact search on a synthetic clustered corpus,
+for choosing nlist / nprobe / rerank offline
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from vector_index import EmbeddingStoreWriter, IVFIndex, VectorIndex  # noqa: E402
+
+
+def make_model(dim, topics, latent, seed=0):
+    """Topic centres plus a shared low-rank basis; text embeddings vary along few directions, not all dim"""
+    rng = np.random.default_rng(seed)
+    centres = rng.standard_normal((topics, dim)).astype(np.float32)
+    basis = (rng.standard_normal((latent, dim)) / np.sqrt(latent)).astype(np.float32)
+    return centres, basis
+
+
+def sample(model, count, spread, rng):
+    """Points around random topic centres; spread scales the within-topic variation"""
+    centres, basis = model
+    dim = centres.shape[1]
+    points = centres[rng.integers(0, len(centres), count)]
+    points += spread * (rng.standard_normal((count, len(basis))).astype(np.float32) @ basis)
+    points += 0.1 * spread * rng.standard_normal((count, dim)).astype(np.float32)
+    return points
+
+
+def make_corpus(path, rows, model, spread, seed=0):
+    """Write a store of synthetic chunk embeddings"""
+    rng = np.random.default_rng(seed)
+    with EmbeddingStoreWriter(path) as writer:
+        for start in range(0, rows, 65536):
+            count = min(65536, rows - start)
+            writer.add_many(list(range(start, start + count)), sample(model, count, spread, rng))
+
+
+def benchmark(rows, dim, topics, latent, spread, queries, k, nlists, nprobes, reranks):
+    """Print recall@k and mean latency for each parameter combination"""
+    work_dir = tempfile.mkdtemp(prefix='ann_bench_')
+    try:
+        path = os.path.join(work_dir, 'corpus.vectors')
+        model = make_model(dim, topics, latent)
+        make_corpus(path, rows, model, spread)
+        index = VectorIndex.load(path)
+        query_set = sample(model, queries, spread, np.random.default_rng(1))
+
+        start = time.perf_counter()
+        exact = [set(index.search(q, k)[0].tolist()) for q in query_set]
+        exact_ms = (time.perf_counter() - start) / queries * 1000
+        print(f"{rows} chunks x {dim} dims, {queries} queries; exact search {exact_ms:.2f} ms/query")
+        print(f"{'nlist':>6} {'nprobe':>7} {'rerank':>7} {'recall@' + str(k):>10} {'ms/query':>9} {'speedup':>8}")
+
+        for nlist in nlists:
+            started = time.perf_counter()
+            index.ann = IVFIndex.build(index, nlist=nlist)
+            print(f"  (nlist={index.ann.nlist} built in {time.perf_counter() - started:.1f} s)")
+            for nprobe in nprobes:
+                for rerank in reranks:
+                    start = time.perf_counter()
+                    found = [set(index.search(q, k, nprobe=nprobe, rerank=rerank)[0].tolist()) for q in query_set]
+                    ann_ms = (time.perf_counter() - start) / queries * 1000
+                    recall = np.mean([len(a & e) / k for a, e in zip(found, exact)])
+                    print(f"{index.ann.nlist:>6} {nprobe:>7} {rerank:>7} {recall:>10.3f} {ann_ms:>9.2f} "
+                          f"{exact_ms / ann_ms:>7.1f}x")
+        del index
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=200_000)
+    parser.add_argument('--dim', type=int, default=1536, help='embedding size (ada-002: 1536)')
+    parser.add_argument('--topics', type=int, default=2_000, help='number of cluster centres in the corpus')
+    parser.add_argument('--latent', type=int, default=32, help='intrinsic dimension of within-topic variation')
+    parser.add_argument('--spread', type=float, default=0.5, help='within-topic variation vs centre scale (higher = harder)')
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--nlist', type=int, nargs='+', default=[0], help='0 = sqrt(rows)')
+    parser.add_argument('--nprobe', type=int, nargs='+', default=[1, 4, 8, 16, 32, 64])
+    parser.add_argument('--rerank', type=int, nargs='+', default=[50, 200])
+    args = parser.parse_args()
+
+    benchmark(args.rows, args.dim, args.topics, args.latent, args.spread, args.queries, args.k,
+              [n or None for n in args.nlist], args.nprobe, args.rerank)
+
+
+if __name__ == "__main__":
+    main()
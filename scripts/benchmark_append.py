@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""
+Benchmark appending a batch of admissions against a full reload of the dataset
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'scripts'))
+
+from live_dataset import LiveDataset  # noqa: E402
+from patient_data import ingest_csv_chunked, read_raw_csv  # noqa: E402
+from make_synthetic_extract import make_synthetic_extract  # noqa: E402
+
+
+def benchmark(rows_list, batch_size=100, batches=5):
+    """Print the mean append time per batch and the full reload time for each table size"""
+    work_dir = tempfile.mkdtemp(prefix='los_append_')
+    try:
+        print(f"{'rows':>10} {'append ' + str(batch_size) + ' (s)':>15} {'full reload (s)':>16}")
+        for rows in rows_list:
+            csv_path = os.path.join(work_dir, f'extract_{rows}.csv')
+            make_synthetic_extract(rows, csv_path)
+            store_dir = os.path.join(work_dir, f'store_{rows}')
+            ingest_csv_chunked(csv_path, store_dir)
+            new_rows = read_raw_csv(csv_path, nrows=batch_size * batches)
+
+            start = time.perf_counter()
+            live = LiveDataset.load(csv_path, store_dir, os.path.join(work_dir, 'cache'))
+            reload_time = time.perf_counter() - start
+
+            timings = []
+            for i in range(batches):
+                batch = new_rows.iloc[i * batch_size:(i + 1) * batch_size]
+                start = time.perf_counter()
+                live.append_admissions(batch)
+                timings.append(time.perf_counter() - start)
+
+            print(f"{rows:>10} {sum(timings) / len(timings):>15.3f} {reload_time:>16.3f}")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, nargs='+', default=[100_000, 1_000_000])
+    parser.add_argument('--batch-size', type=int, default=100)
+    args = parser.parse_args()
+
+    benchmark(args.rows, batch_size=args.batch_size)
+
+
+if __name__ == "__main__":
+    main()
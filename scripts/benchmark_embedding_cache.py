@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Benchmark repeated patient views with the query-embedding cache: a cold view pays the
+embedding request, warm views (same process or after a restart) are served from the cache
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmark_hybrid_search import build_corpus  # noqa: E402
+from benchmark_lexical_search import QUERIES  # noqa: E402
+from rag_system import RAGSystem  # noqa: E402
+
+
+class SlowEmbeddingsClient:
+    """Stands in for openai.OpenAI with a fixed request latency"""
+
+    def __init__(self, dim, latency):
+        self.rng = np.random.default_rng(4)
+        self.dim = dim
+        self.latency = latency
+        self.requests = 0
+        self.embeddings = self
+
+    def create(self, model, input):
+        self.requests += 1
+        time.sleep(self.latency)
+        return SimpleNamespace(data=[SimpleNamespace(embedding=self.rng.standard_normal(self.dim).tolist())])
+
+
+def time_views(rag, top_k):
+    start = time.perf_counter()
+    for query in QUERIES:
+        rag.search_relevant_papers(query, top_k=top_k)
+    return (time.perf_counter() - start) / len(QUERIES)
+
+
+def benchmark(rows, dim, latency, top_k):
+    work_dir = tempfile.mkdtemp(prefix='embedding_cache_bench_')
+    try:
+        path = os.path.join(work_dir, 'papers.db')
+        build_corpus(path, rows, dim)
+        client = SlowEmbeddingsClient(dim, latency)
+
+        rag = RAGSystem(db_path=path, min_similarity=-1.0)
+        rag.client = client
+        rag._get_vector_index()  # load the store outside the timings
+        cold = time_views(rag, top_k)
+        warm = time_views(rag, top_k)
+        rag.close()
+
+        restarted = RAGSystem(db_path=path, min_similarity=-1.0)
+        restarted.client = client
+        restarted._get_vector_index()
+        after_restart = time_views(restarted, top_k)
+        stats = restarted.embedding_cache.stats()
+        restarted.close()
+
+        print(f"{rows} chunks x {dim} dims, embedding request {latency * 1000:.0f} ms, {len(QUERIES)} queries")
+        print(f"  cold view:          {cold * 1000:8.1f} ms per query")
+        print(f"  repeat view:        {warm * 1000:8.1f} ms per query")
+        print(f"  after restart:      {after_restart * 1000:8.1f} ms per query (disk hits: {stats['disk_hits']})")
+        print(f"  embedding requests: {client.requests}")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=20_000)
+    parser.add_argument('--dim', type=int, default=1536)
+    parser.add_argument('--embedding-latency', type=float, default=0.15, help='seconds per embedding request')
+    parser.add_argument('--top-k', type=int, default=10)
+    args = parser.parse_args()
+
+    benchmark(args.rows, args.dim, args.embedding_latency, args.top_k)
+
+
+if __name__ == "__main__":
+    main()
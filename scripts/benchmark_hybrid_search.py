@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Benchmark hybrid retrieval latency against the vector-only and keyword-only paths,
+with a simulated embedding request
+"""
+
+import argparse
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmark_lexical_search import QUERIES, make_paper_db  # noqa: E402
+from lexical_index import build_fts_index  # noqa: E402
+from rag_system import RAGSystem  # noqa: E402
+from vector_index import EmbeddingStoreWriter, sidecar_path, table_fingerprint  # noqa: E402
+
+
+def build_corpus(path, rows, dim):
+    """paper_chunks with an FTS index and a random embedding store"""
+    conn = make_paper_db(path, rows)
+    build_fts_index(conn)
+    rng = np.random.default_rng(2)
+    writer = EmbeddingStoreWriter(sidecar_path(path, 'paper_chunks'))
+    for start in range(0, rows, 65536):
+        count = min(65536, rows - start)
+        writer.add_many(list(range(start + 1, start + count + 1)), rng.standard_normal((count, dim)))
+    writer.close(table_fingerprint(conn, 'paper_chunks'))
+    conn.close()
+
+
+def time_mode(rag, repeat, top_k):
+    timings = []
+    for _ in range(repeat):
+        for query in QUERIES:
+            start = time.perf_counter()
+            rag.search_relevant_papers(query, top_k=top_k)
+            timings.append(time.perf_counter() - start)
+    return np.median(timings)
+
+
+def benchmark(rows, dim, embedding_latency, repeat, top_k):
+    work_dir = tempfile.mkdtemp(prefix='hybrid_bench_')
+    try:
+        path = os.path.join(work_dir, 'papers.db')
+        build_corpus(path, rows, dim)
+        rng = np.random.default_rng(3)
+
+        def embedding(text, api_key=None):
+            time.sleep(embedding_latency)  # stands in for the embeddings API round trip
+            return rng.standard_normal(dim)
+
+        # Random vectors are far apart, so drop the similarity floor to keep vector hits in play
+        latencies = {}
+        for mode in ('keyword', 'vector', 'hybrid'):
+            rag = RAGSystem(db_path=path, min_similarity=-1.0, retrieval=mode)
+            rag.get_embedding = embedding
+            rag.search_relevant_papers(QUERIES[0], top_k=top_k)  # open the store once
+            latencies[mode] = time_mode(rag, repeat, top_k)
+            rag.close()
+
+        print(f"{rows} chunks x {dim} dims, embedding request {embedding_latency * 1000:.0f} ms, top {top_k}")
+        for mode, latency in latencies.items():
+            print(f"  {mode:>8}: {latency * 1000:8.1f} ms (median per query)")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=100_000)
+    parser.add_argument('--dim', type=int, default=1536)
+    parser.add_argument('--embedding-latency', type=float, default=0.15, help='seconds per embedding request')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--top-k', type=int, default=10)
+    args = parser.parse_args()
+
+    benchmark(args.rows, args.dim, args.embedding_latency, args.repeat, args.top_k)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Benchmark keyword search over paper_chunks: the full-table Python scan vs the FTS5/BM25 index
+"""
+
+import argparse
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from lexical_index import build_fts_index  # noqa: E402
+from rag_system import RAGSystem  # noqa: E402
+
+MEDICAL_TERMS = [
+    'anemia', 'pneumonia', 'diabetes', 'kidney', 'renal', 'asthma', 'depression', 'readmission',
+    'mortality', 'complications', 'treatment', 'diagnosis', 'creatinine', 'glucose', 'hematocrit',
+    'blood', 'medication', 'hospital', 'length', 'stay', 'infection', 'sepsis', 'cardiac', 'fluid',
+]
+QUERIES = [
+    'anemia hematocrit length of stay',
+    'pneumonia respiratory infection hospital admission',
+    'kidney disease creatinine dialysis',
+    'diabetes glucose insulin complications',
+]
+
+
+def make_paper_db(path, rows, seed=0):
+    """paper_chunks as written by extract_papers_enhanced.py, with ~150-word synthetic chunks"""
+    rng = np.random.default_rng(seed)
+    vocabulary = MEDICAL_TERMS + [f'word{i}' for i in range(5000)]
+    weights = np.r_[np.full(len(MEDICAL_TERMS), 0.2), np.full(5000, 1.0)]
+    weights /= weights.sum()
+    conn = sqlite3.connect(path)
+    conn.execute('''
+        CREATE TABLE paper_chunks (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, filename TEXT NOT NULL, title TEXT, authors TEXT,
+            year INTEGER, content TEXT NOT NULL, chunk_text TEXT NOT NULL, chunk_index INTEGER, embedding TEXT
+        )
+    ''')
+    words = rng.choice(len(vocabulary), size=(rows, 160), p=weights)
+    conn.executemany(
+        'INSERT INTO paper_chunks (filename, title, authors, year, content, chunk_text, chunk_index) '
+        'VALUES (?, ?, ?, ?, ?, ?, ?)',
+        [(f'paper{i // 20}.pdf', ' '.join(vocabulary[w] for w in row[:8]), 'Author et al.', 2020, '',
+          ' '.join(vocabulary[w] for w in row[8:]), i % 20) for i, row in enumerate(words)])
+    conn.commit()
+    return conn
+
+
+def time_queries(rag, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for query in QUERIES:
+            rag.search_relevant_papers(query, top_k=10)
+        timings.append((time.perf_counter() - start) / len(QUERIES))
+    return min(timings)
+
+
+def benchmark(rows_list, repeat):
+    """Print per-query latency of both paths for each table size"""
+    work_dir = tempfile.mkdtemp(prefix='lexical_bench_')
+    try:
+        print(f"{'chunks':>8} {'scan (ms)':>10} {'fts5 (ms)':>10} {'speedup':>8} {'index (s)':>10}")
+        for rows in rows_list:
+            path = os.path.join(work_dir, f'papers_{rows}.db')
+            conn = make_paper_db(path, rows)
+
+            rag = RAGSystem(db_path=path)
+            scan = time_queries(rag, 1)
+            rag.close()
+
+            start = time.perf_counter()
+            build_fts_index(conn)
+            index_seconds = time.perf_counter() - start
+            conn.close()
+
+            rag = RAGSystem(db_path=path)
+            assert rag.has_fts
+            indexed = time_queries(rag, repeat)
+            rag.close()
+            print(f"{rows:>8} {scan * 1000:>10.1f} {indexed * 1000:>10.2f} {scan / indexed:>7.0f}x "
+                  f"{index_seconds:>10.2f}")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, nargs='+', default=[1_000, 10_000, 100_000])
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    benchmark(args.rows, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+Benchmark cold CSV load + derivation against a warm Parquet cache load
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'scripts'))
+
+from patient_data import DATA_FILE, derive_columns, load_patient_frame, read_raw_csv  # noqa: E402
+from make_synthetic_extract import make_synthetic_extract  # noqa: E402
+
+
+def best_of(fn, repeat):
+    """Best wall time of fn() over repeat runs"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def benchmark(rows_list, repeat=3):
+    """Print cold vs warm load times for each row count"""
+    work_dir = tempfile.mkdtemp(prefix='los_bench_')
+    try:
+        print(f"{'rows':>10} {'cold CSV (s)':>14} {'warm cache (s)':>15} {'speedup':>9}")
+        for rows in rows_list:
+            if rows is None:
+                csv_path = os.path.join(ROOT, DATA_FILE)
+                rows = sum(1 for _ in open(csv_path)) - 1
+            else:
+                csv_path = os.path.join(work_dir, f'extract_{rows}.csv')
+                make_synthetic_extract(rows, csv_path)
+            cache_dir = os.path.join(work_dir, f'cache_{rows}')
+
+            cold = best_of(lambda: derive_columns(read_raw_csv(csv_path)), repeat)
+            load_patient_frame(csv_path, cache_dir=cache_dir)  # populate the cache
+            warm = best_of(lambda: load_patient_frame(csv_path, cache_dir=cache_dir), repeat)
+
+            print(f"{rows:>10} {cold:>14.3f} {warm:>15.3f} {cold / warm:>8.1f}x")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, nargs='+', default=[100_000, 1_000_000],
+                        help='synthetic row counts (the 1.8k sample CSV is always included)')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    benchmark([None] + args.rows, repeat=args.repeat)
+
+
+if __name__ == "__main__":
+    main()
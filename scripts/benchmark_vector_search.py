@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Benchmark vector search: per-row JSON decode + sklearn cosine vs the memory-mapped VectorIndex
+(query latency, time to open the store, bytes on disk)
+"""
+
+import argparse
+import json
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+
+import numpy as np
+from sklearn.metrics.pairwise import cosine_similarity
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from vector_index import EmbeddingStoreWriter, VectorIndex  # noqa: E402
+
+
+def make_chunk_db(path, rows, dim, seed=0):
+    """chunks/papers tables as written by build_rag_database.py, with random embeddings"""
+    rng = np.random.default_rng(seed)
+    conn = sqlite3.connect(path)
+    conn.execute('CREATE TABLE papers (id INTEGER PRIMARY KEY, filename TEXT, title TEXT)')
+    conn.execute('CREATE TABLE chunks (id INTEGER PRIMARY KEY, paper_id INTEGER, chunk_text TEXT, embedding TEXT)')
+    conn.execute("INSERT INTO papers VALUES (1, 'paper.pdf', 'Paper')")
+    for start in range(0, rows, 1000):
+        batch = rng.standard_normal((min(1000, rows - start), dim)).astype(np.float32)
+        conn.executemany('INSERT INTO chunks VALUES (?, 1, ?, ?)',
+                         [(start + i + 1, f'chunk {start + i}', json.dumps(vec.round(6).tolist()))
+                          for i, vec in enumerate(batch)])
+    conn.commit()
+    conn.close()
+
+
+def legacy_search(cursor, query_embedding, top_k):
+    """The previous _search_vector_db: decode every JSON embedding, one cosine call per row"""
+    cursor.execute('''
+        SELECT c.id, c.chunk_text, c.embedding, p.title, p.filename
+        FROM chunks c JOIN papers p ON c.paper_id = p.id
+        WHERE c.embedding IS NOT NULL
+    ''')
+    similarities = []
+    for chunk_id, chunk_text, embedding_json, title, filename in cursor.fetchall():
+        chunk_embedding = np.array(json.loads(embedding_json))
+        similarity = cosine_similarity([query_embedding], [chunk_embedding])[0][0]
+        similarities.append((similarity, chunk_id))
+    similarities.sort(reverse=True)
+    return similarities[:top_k]
+
+
+def best_of(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def benchmark(rows_list, dim, legacy_rows, repeat, dtype='float32', top_k=10):
+    """Print legacy vs indexed per-query latency, store open time and size for each corpus size"""
+    work_dir = tempfile.mkdtemp(prefix='vector_bench_')
+    rng = np.random.default_rng(1)
+    try:
+        # The legacy path is strictly linear per row, so it is timed on a sample and scaled
+        db_path = os.path.join(work_dir, 'legacy.db')
+        make_chunk_db(db_path, legacy_rows, dim)
+        conn = sqlite3.connect(db_path)
+        json_bytes_per_row = conn.execute('SELECT AVG(LENGTH(embedding)) FROM chunks').fetchone()[0]
+        query = rng.standard_normal(dim)
+        legacy_per_row = best_of(lambda: legacy_search(conn.cursor(), query, top_k), 1) / legacy_rows
+        conn.close()
+
+        print(f"{'chunks':>10} {'legacy (s)':>12} {'index (ms)':>11} {'speedup':>10} "
+              f"{'open (ms)':>10} {'store MB':>9} {'JSON MB':>9}")
+        for rows in rows_list:
+            path = os.path.join(work_dir, f'chunks_{rows}.vectors')
+            with EmbeddingStoreWriter(path, dtype=dtype) as writer:
+                for start in range(0, rows, 65536):
+                    block = rng.standard_normal((min(65536, rows - start), dim)).astype(np.float32)
+                    writer.add_many(list(range(start, start + len(block))), block)
+
+            opened = best_of(lambda: VectorIndex.load(path), repeat)
+            index = VectorIndex.load(path)
+            query = rng.standard_normal(dim)
+            indexed = best_of(lambda: index.search(query, top_k), repeat)
+            legacy = legacy_per_row * rows
+            print(f"{rows:>10} {legacy:>11.1f}* {indexed * 1000:>11.2f} {legacy / indexed:>9.0f}x "
+                  f"{opened * 1000:>10.2f} {os.path.getsize(path) / 2 ** 20:>9.0f} "
+                  f"{json_bytes_per_row * rows / 2 ** 20:>9.0f}")
+            del index
+            os.remove(path)
+        print(f"* legacy measured on {legacy_rows} chunks and scaled linearly; store dtype {dtype}")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, nargs='+', default=[10_000, 100_000, 1_000_000])
+    parser.add_argument('--dim', type=int, default=1536, help='embedding size (ada-002: 1536)')
+    parser.add_argument('--legacy-rows', type=int, default=2_000, help='sample size for the legacy timing')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--dtype', choices=['float32', 'float16'], default='float32')
+    args = parser.parse_args()
+
+    benchmark(args.rows, args.dim, args.legacy_rows, args.repeat, args.dtype)
+
+
+if __name__ == "__main__":
+    main()
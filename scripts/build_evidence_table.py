@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""
+Precompute the condition -> evidence table: run retrieval once for every symptom set
+detected in the patient table, so patient auto-summaries do no similarity search.
+Re-run after the paper corpus changes; stale tables are ignored until then.
+"""
+
+import argparse
+import os
+import sys
+import time
+from collections import Counter
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from evidence_table import condition_key, evidence_path  # noqa: E402
+from patient_data import CACHE_DIR, DATA_FILE, STORE_DIR, load_current_frame  # noqa: E402
+from rag_system import RAGSystem  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('db_path', nargs='?', default=os.path.join(ROOT, 'data', 'papers_rag.db'))
+    args = parser.parse_args()
+
+    rag = RAGSystem(db_path=args.db_path)
+    if not rag.is_available():
+        sys.exit("RAG database not found")
+    try:
+        df = load_current_frame(*(os.path.join(ROOT, path) for path in (DATA_FILE, STORE_DIR, CACHE_DIR)))
+        start = time.perf_counter()
+        symptom_sets = Counter()
+        for patient in df.to_dict('records'):
+            symptoms, _ = rag.extract_symptoms_from_patient(patient)
+            symptom_sets[tuple(symptoms)] += 1
+        print(f"{len(df)} patients, {len(symptom_sets)} distinct symptom sets "
+              f"({time.perf_counter() - start:.2f} s)")
+
+        start = time.perf_counter()
+        try:
+            stored = rag.build_evidence_table(symptom_sets)
+        except RuntimeError as e:
+            sys.exit(f"Evidence table not written: {e}")
+        print(f"Stored evidence for {stored} condition sets in {evidence_path(rag.db_path, rag.schema)} "
+              f"({time.perf_counter() - start:.2f} s)")
+        for symptoms, patients in symptom_sets.most_common(5):
+            print(f"  {patients:>6} patients  {condition_key(symptoms)}")
+    finally:
+        rag.close()
+
+
+if __name__ == "__main__":
+    main()
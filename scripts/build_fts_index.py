@@ -0,0 +1,37 @@
+#!/usr/bin/env python3
+"""
+Add (or rebuild) the FTS5 keyword index on an existing RAG database
+"""
+
+import argparse
+import os
+import sqlite3
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from lexical_index import build_fts_index  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('db_path', nargs='?', default=os.path.join(ROOT, 'data', 'papers_rag.db'))
+    parser.add_argument('--table', default='paper_chunks')
+    args = parser.parse_args()
+
+    if not os.path.exists(args.db_path):
+        sys.exit(f"Database not found: {args.db_path}")
+    conn = sqlite3.connect(args.db_path)
+    try:
+        start = time.perf_counter()
+        build_fts_index(conn, args.table)
+        rows = conn.execute(f'SELECT COUNT(*) FROM {args.table}').fetchone()[0]
+    finally:
+        conn.close()
+    print(f"Indexed {rows} rows of {args.table} in {time.perf_counter() - start:.2f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -4,8 +4,8 @@
 """
 
 import os
+import sys
 import sqlite3
-import json
 import openai
 import numpy as np
 from pathlib import Path
@@ -13,9 +13,17 @@ from PyPDF2 import PdfReader
 from dotenv import load_dotenv
 import time
 
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from lexical_index import build_fts_index  # noqa: E402
+from vector_index import EmbeddingStoreWriter, build_ann_index, sidecar_path, table_fingerprint  # noqa: E402
+
 # 加载环境变量
 load_dotenv()
 
+DB_PATH = '/Users/pc/Documents/cursor/ml_course/project/data/papers_rag.db'
+
 def extract_pdf_text(pdf_path):
     """从PDF文件中提取文本"""
     try:
@@ -75,7 +83,7 @@ def get_embedding(text, client):
 
 def create_database():
     """创建SQLite数据库"""
-    conn = sqlite3.connect('/Users/pc/Documents/cursor/ml_course/project/data/papers_rag.db')
+    conn = sqlite3.connect(DB_PATH)
     cursor = conn.cursor()
     
     # 创建表格
@@ -113,8 +121,12 @@ def extract_title_from_filename(filename):
     # 首字母大写
     return title.title()
 
-def build_rag_database():
-    """构建RAG数据库"""
+def build_rag_database(embedding_dtype='float32'):
+    """构建RAG数据库
+
+    Embeddings go to the memory-mapped store next to the database (float32 or
+    float16), not into chunks.embedding as JSON.
+    """
     print("开始构建RAG数据库...")
     
     # 初始化OpenAI客户端
@@ -128,6 +140,8 @@ def build_rag_database():
     cursor.execute('DELETE FROM chunks')
     cursor.execute('DELETE FROM papers')
     conn.commit()
+
+    store = EmbeddingStoreWriter(sidecar_path(DB_PATH, 'chunks'), dtype=embedding_dtype)
     
     papers_dir = Path('/Users/pc/Documents/cursor/ml_course/project/data/papers')
     
@@ -169,13 +183,12 @@ def build_rag_database():
                 # 获取embedding
                 embedding = get_embedding(chunk, client)
                 if embedding:
-                    embedding_json = json.dumps(embedding)
-                    
-                    # 插入chunk记录
+                    # 插入chunk记录，embedding写入向量文件
                     cursor.execute('''
-                        INSERT INTO chunks (paper_id, chunk_text, chunk_index, embedding)
-                        VALUES (?, ?, ?, ?)
-                    ''', (paper_id, chunk, i, embedding_json))
+                        INSERT INTO chunks (paper_id, chunk_text, chunk_index)
+                        VALUES (?, ?, ?)
+                    ''', (paper_id, chunk, i))
+                    store.add(cursor.lastrowid, embedding)
                     
                     print("✅")
                 else:
@@ -187,6 +200,14 @@ def build_rag_database():
             conn.commit()
             print(f"  完成处理: {file_path.name}")
     
+    # 构建FTS5关键词索引，与向量检索混合使用
+    build_fts_index(conn, 'chunks')
+    fingerprint = table_fingerprint(conn, 'chunks')
+    store.close(fingerprint)
+    # 大规模语料时构建IVF近似索引
+    if build_ann_index(store.path, fingerprint) is not None:
+        print("已构建IVF近似检索索引")
+
     # 统计信息
     cursor.execute('SELECT COUNT(*) FROM papers')
     paper_count = cursor.fetchone()[0]
@@ -197,8 +218,9 @@ def build_rag_database():
     print(f"\n数据库构建完成!")
     print(f"总共处理: {paper_count} 篇论文")
     print(f"生成文本块: {chunk_count} 个")
+    print(f"向量文件: {store.path} ({store.dtype.name})")
     
     conn.close()
 
 if __name__ == "__main__":
-    build_rag_database()
\ No newline at end of file
+    build_rag_database(embedding_dtype=sys.argv[1] if len(sys.argv) > 1 else 'float32')
\ No newline at end of file
@@ -6,6 +6,12 @@ Create a lightweight RAG system for Streamlit Cloud deployment
 import sqlite3
 import json
 import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from lexical_index import build_fts_index  # noqa: E402
 
 def create_lightweight_db():
     """Create a lightweight database with just paper metadata and text chunks"""
@@ -76,7 +82,7 @@ def create_lightweight_db():
             id INTEGER PRIMARY KEY,
             filename TEXT,
             title TEXT,
-            author TEXT,
+            authors TEXT,
             year TEXT,
             chunk_text TEXT,
             keywords TEXT,
@@ -87,7 +93,7 @@ def create_lightweight_db():
     # Insert sample data
     for paper in sample_papers:
         cursor.execute('''
-            INSERT INTO paper_chunks (filename, title, author, year, chunk_text, keywords, embedding)
+            INSERT INTO paper_chunks (filename, title, authors, year, chunk_text, keywords, embedding)
             VALUES (?, ?, ?, ?, ?, ?, ?)
         ''', (
             paper['filename'],
@@ -100,6 +106,9 @@ def create_lightweight_db():
         ))
 
     conn.commit()
+
+    # BM25 keyword index used by RAGSystem
+    build_fts_index(conn, 'paper_chunks')
     conn.close()
 
     print(f"Created lightweight database at {db_path}")
@@ -4,8 +4,8 @@
 """
 
 import os
+import sys
 import sqlite3
-import json
 import openai
 import numpy as np
 from pathlib import Path
@@ -17,13 +17,21 @@ from datetime import datetime
 # PDF处理相关
 import fitz  # PyMuPDF
 
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from lexical_index import build_fts_index, fts_table  # noqa: E402
+from vector_index import EmbeddingStoreWriter, build_ann_index, sidecar_path, table_fingerprint  # noqa: E402
+
 # 加载环境变量
 load_dotenv()
 
 class EnhancedPaperExtractor:
-    def __init__(self, papers_dir="data/papers", db_path="data/papers_rag.db"):
+    def __init__(self, papers_dir="data/papers", db_path="data/papers_rag.db", embedding_dtype='float32'):
         self.papers_dir = Path(papers_dir)
         self.db_path = db_path
+        self.embedding_dtype = embedding_dtype
+        self.embedding_store = None
         self.client = openai.OpenAI(api_key=os.getenv('OPENAI_API_KEY'))
         self.init_database()
 
@@ -33,6 +41,7 @@ class EnhancedPaperExtractor:
         cursor = conn.cursor()
 
         # 删除旧表重新创建
+        cursor.execute(f"DROP TABLE IF EXISTS {fts_table('paper_chunks')}")
         cursor.execute("DROP TABLE IF EXISTS paper_chunks")
 
         cursor.execute('''
@@ -383,12 +392,11 @@ class EnhancedPaperExtractor:
         try:
             for i, chunk in enumerate(chunks):
                 embedding = self.get_embedding(chunk)
-                embedding_json = json.dumps(embedding) if embedding else None
 
                 cursor.execute('''
                 INSERT INTO paper_chunks
-                (filename, title, authors, year, content, chunk_text, chunk_index, embedding)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                (filename, title, authors, year, content, chunk_text, chunk_index)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
                 ''', (
                     paper_data['filename'],
                     paper_data['title'],
@@ -396,9 +404,11 @@ class EnhancedPaperExtractor:
                     paper_data['year'],
                     paper_data['content'],
                     chunk,
-                    i,
-                    embedding_json
+                    i
                 ))
+                # embedding写入向量文件（不再以JSON存入数据库）
+                if embedding and self.embedding_store is not None:
+                    self.embedding_store.add(cursor.lastrowid, embedding)
 
                 time.sleep(0.1)
 
@@ -422,6 +432,9 @@ class EnhancedPaperExtractor:
 
         print(f"发现 {len(txt_files)} 个TXT文件，{len(pdf_files)} 个PDF文件")
 
+        self.embedding_store = EmbeddingStoreWriter(sidecar_path(self.db_path, 'paper_chunks'),
+                                                    dtype=self.embedding_dtype)
+
         total_processed = 0
 
         # 处理TXT文件
@@ -454,6 +467,19 @@ class EnhancedPaperExtractor:
                 print(f"  作者: {paper_data['authors']}")
                 print(f"  年份: {paper_data['year']}")
 
+        conn = sqlite3.connect(self.db_path)
+        try:
+            # 构建FTS5关键词索引（BM25检索）
+            build_fts_index(conn, 'paper_chunks')
+            fingerprint = table_fingerprint(conn, 'paper_chunks')
+        finally:
+            conn.close()
+        self.embedding_store.close(fingerprint)
+        # 大规模语料时构建IVF近似索引
+        if build_ann_index(self.embedding_store.path, fingerprint) is not None:
+            print("已构建IVF近似检索索引")
+        print(f"向量文件: {self.embedding_store.path} ({len(self.embedding_store.ids)} 条)")
+
         print(f"\n🎉 提取完成！总共处理了 {total_processed} 篇论文")
 
 def main():
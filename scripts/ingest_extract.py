@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+"""
+Ingest a large LengthOfStay extract into the chunked Parquet patient store
+"""
+
+import argparse
+import os
+import resource
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from patient_data import STORE_DIR, ingest_csv_chunked  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('csv', help='extract to ingest')
+    parser.add_argument('--store', default=os.path.join(ROOT, STORE_DIR), help='store directory')
+    parser.add_argument('--chunksize', type=int, default=100_000, help='rows per chunk / part file')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    manifest = ingest_csv_chunked(args.csv, args.store, chunksize=args.chunksize)
+    elapsed = time.perf_counter() - start
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    peak_mb = peak / 1e6 if sys.platform == 'darwin' else peak / 1e3
+
+    print(f"Ingested {manifest['n_rows']} rows into {len(manifest['parts'])} parts in {elapsed:.1f}s")
+    print(f"LOS thresholds (sketch): long stay > {manifest['thresholds']['long_stay']:.2f}, "
+          f"high risk > {manifest['thresholds']['high_risk']:.2f}")
+    print(f"Peak RSS: {peak_mb:.0f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+"""
+Generate a large synthetic LengthOfStay extract by resampling the sample CSV
+"""
+
+import argparse
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SAMPLE_CSV = os.path.join(ROOT, 'data', 'LengthOfStay.csv')
+
+
+def make_synthetic_extract(n_rows, out_path, seed=0):
+    """Write n_rows resampled admissions with unique eids to out_path"""
+    sample = pd.read_csv(SAMPLE_CSV, dtype={'rcount': str})
+    rng = np.random.default_rng(seed)
+    df = sample.iloc[rng.integers(0, len(sample), size=n_rows)].reset_index(drop=True)
+    df['eid'] = np.arange(1, n_rows + 1)
+    df.to_csv(out_path, index=False)
+    return out_path
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('rows', type=int, help='number of admissions to generate')
+    parser.add_argument('out', help='output CSV path')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    make_synthetic_extract(args.rows, args.out, seed=args.seed)
+    print(f"Wrote {args.rows} rows to {args.out} ({os.path.getsize(args.out) / 1e6:.1f} MB)")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+"""
+Report patient DataFrame memory per column before and after the typed schema
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'scripts'))
+
+import pandas as pd  # noqa: E402
+
+from patient_data import DATA_FILE, apply_schema, derive_columns, memory_report, read_raw_csv  # noqa: E402
+from make_synthetic_extract import make_synthetic_extract  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=None,
+                        help='use a synthetic extract with this many rows instead of the sample CSV')
+    args = parser.parse_args()
+
+    csv_path = os.path.join(ROOT, DATA_FILE)
+    if args.rows:
+        csv_path = os.path.join(tempfile.mkdtemp(prefix='los_mem_'), 'extract.csv')
+        make_synthetic_extract(args.rows, csv_path)
+
+    before = derive_columns(read_raw_csv(csv_path))
+    after = apply_schema(before.copy())
+    report = memory_report(before, after)
+
+    with pd.option_context('display.max_rows', None, 'display.width', 120):
+        print(report.to_string(float_format=lambda v: f"{v:.1f}"))
+    total = report.loc['TOTAL']
+    print(f"\n{len(before)} rows: {total['bytes_before'] / 1e6:.1f} MB -> "
+          f"{total['bytes_after'] / 1e6:.1f} MB ({total['ratio']:.1f}x smaller)")
+
+
+if __name__ == "__main__":
+    main()
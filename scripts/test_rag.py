@@ -4,7 +4,9 @@
 """
 
 import os
-from rag_system import rag_system
+from rag_system import RAGSystem
+
+rag_system = RAGSystem()
 
 def test_rag_system():
     """测试RAG系统的基本功能"""
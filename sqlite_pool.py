@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Thread-safe pool of read-only SQLite connections
+"""
+
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import quote
+
+# Pragmas applied to every pooled connection
+READ_PRAGMAS = [
+    "PRAGMA query_only = ON",
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA cache_size = -16000",      # ~16 MB page cache per connection
+    "PRAGMA mmap_size = 268435456",    # map up to 256 MB of the file
+]
+
+
+class ReadOnlyConnectionPool:
+    """Bounded pool of read-only connections shared across threads
+
+    Connections are opened once with mode=ro (or immutable=1 when the file is
+    known not to change while the process runs) and reused, so a query pays
+    only for itself. sqlite3 keeps a per-connection cache of prepared
+    statements keyed by SQL text, so callers should use constant SQL with
+    parameters. At most max_size connections (file descriptors) are ever open;
+    a connection discarded after an error frees its slot for a waiting thread.
+    """
+
+    def __init__(self, db_path, max_size=8, immutable=False, timeout=30.0, cached_statements=128):
+        self.db_path = db_path
+        self.max_size = max_size
+        self.immutable = immutable
+        self.timeout = timeout
+        self.cached_statements = cached_statements
+        self._idle = []
+        self._lock = threading.Lock()
+        self._available = threading.Condition(self._lock)
+        self._open = 0
+        self._closed = False
+
+    @property
+    def uri(self):
+        path = quote(os.path.abspath(self.db_path))
+        flags = "immutable=1" if self.immutable else "mode=ro"
+        return f"file:{path}?{flags}"
+
+    @property
+    def open_connections(self):
+        return self._open
+
+    def _connect(self):
+        conn = sqlite3.connect(self.uri, uri=True, check_same_thread=False,
+                               cached_statements=self.cached_statements, timeout=self.timeout)
+        for pragma in READ_PRAGMAS:
+            conn.execute(pragma)
+        return conn
+
+    def _acquire(self):
+        deadline = time.monotonic() + self.timeout
+        with self._available:
+            while True:
+                if self._closed:
+                    raise RuntimeError("Connection pool is closed")
+                if self._idle:
+                    return self._idle.pop()
+                if self._open < self.max_size:
+                    self._open += 1
+                    break
+                # Pool exhausted: wait for another thread to return or discard a connection
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise TimeoutError(f"No pooled connection to {self.db_path} became free in {self.timeout}s")
+                self._available.wait(remaining)
+        try:
+            return self._connect()
+        except Exception:
+            self._free_slot()
+            raise
+
+    def _free_slot(self):
+        with self._available:
+            self._open -= 1
+            self._available.notify()
+
+    def _discard(self, conn):
+        self._free_slot()
+        conn.close()
+
+    @contextmanager
+    def connection(self):
+        """Borrow a connection for the duration of the with block"""
+        conn = self._acquire()
+        try:
+            yield conn
+        except sqlite3.DatabaseError:
+            # The connection may be in a bad state (e.g. file replaced); do not reuse it
+            self._discard(conn)
+            raise
+        except BaseException:
+            self._release(conn)
+            raise
+        else:
+            self._release(conn)
+
+    def _release(self, conn):
+        with self._available:
+            if not self._closed:
+                self._idle.append(conn)
+                self._available.notify()
+                return
+        self._discard(conn)
+
+    def execute(self, sql, params=()):
+        """Run one query and return all rows"""
+        with self.connection() as conn:
+            return conn.execute(sql, params).fetchall()
+
+    def close(self):
+        """Close every idle connection; borrowed ones close when returned"""
+        with self._available:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._available.notify_all()
+        for conn in idle:
+            self._discard(conn)
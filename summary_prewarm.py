@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+"""
+Background warm-up of the patient summary cache: high-risk admissions, newly admitted
+ones first and then the most recent, so the first viewer of a patient page gets a cached summary
+"""
+
+import itertools
+import queue
+import random
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+from llm_client import INVALID_KEY_MESSAGE, QUOTA_MESSAGE, RATE_LIMIT_MESSAGE, cached_completion, classify_openai_error
+
+PREWARM_RISK_LEVEL = 'High Risk'
+PREWARM_WORKERS = 2
+MAX_ATTEMPTS = 3                # tries per patient for errors other than rate limits
+BACKOFF_BASE = 2.0              # seconds after the first rate-limit error, doubled per consecutive one
+BACKOFF_MAX = 120.0
+THROUGHPUT_WINDOW = 300.0       # seconds of completions the per-minute rate is measured over
+KEY_RECHECK = 30.0              # seconds between client_factory() calls while paused or without a client
+
+NEWLY_ADMITTED, BACKLOG = 0, 1
+
+
+def prewarm_order(df, risk_level=PREWARM_RISK_LEVEL):
+    """(eid, admission timestamp) of the rows at risk_level, most recent admission first"""
+    rows = df[df['risk_level'] == risk_level]
+    admitted = rows['vdate'].to_numpy(dtype='datetime64[ns]').astype(np.int64)
+    order = np.argsort(-admitted, kind='stable')
+    return list(zip(rows['eid'].to_numpy()[order].tolist(), admitted[order].tolist()))
+
+
+def _retry_after(error):
+    """Seconds from a Retry-After header on the error's HTTP response, if any"""
+    headers = getattr(getattr(error, 'response', None), 'headers', None) or {}
+    try:
+        return float(headers.get('retry-after'))
+    except (TypeError, ValueError):
+        return None
+
+
+class SummaryPrewarmer:
+    """Bounded worker pool that fills the summary cache ahead of the first page view
+
+    build_request(eid) returns the same chat request the patient page sends
+    (or None when the admission no longer needs a summary); completions go
+    into cache through cached_completion(), so the page replays them. Work is
+    ordered newly admitted first, then by admission date, newest first.
+    Rate-limit errors pause every worker with exponential backoff (or the
+    server's Retry-After) and requeue the patient; key and quota errors pause
+    the pool until set_client() provides another client. With a
+    client_factory the workers also ask it for the current client while
+    paused (every key_recheck seconds), so a rotated key resumes them.
+    build_request runs on the worker threads: it gets its dependencies
+    passed in, not from per-session state.
+    """
+
+    def __init__(self, build_request, cache, workers=PREWARM_WORKERS, max_attempts=MAX_ATTEMPTS,
+                 backoff_base=BACKOFF_BASE, backoff_max=BACKOFF_MAX, client_factory=None, key_recheck=KEY_RECHECK):
+        self.build_request = build_request
+        self.cache = cache
+        self.client_factory = client_factory
+        self.key_recheck = key_recheck
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._queue = queue.PriorityQueue()
+        self._order = itertools.count()
+        self._lock = threading.Lock()
+        self._scheduled = set()
+        self._client = None
+        self._ready = threading.Event()
+        self._stop = threading.Event()
+        self._threads = []
+        self._started = None
+        self._halted = None
+        self._resume_at = 0.0
+        self._next_recheck = 0.0
+        self._consecutive_limits = 0
+        self._completed = deque()
+        self.counts = {'warmed': 0, 'already_warm': 0, 'skipped': 0, 'failed': 0, 'rate_limited': 0, 'in_progress': 0}
+        self.last_error = None
+
+    def schedule(self, df, newly_admitted=False):
+        """Queue the high-risk admissions of df not queued before; returns how many were added"""
+        tier = NEWLY_ADMITTED if newly_admitted else BACKLOG
+        added = 0
+        with self._lock:
+            for eid, admitted in prewarm_order(df):
+                if eid not in self._scheduled:
+                    self._scheduled.add(eid)
+                    self._queue.put((tier, -admitted, next(self._order), eid, 0))
+                    added += 1
+        return added
+
+    def set_client(self, client):
+        """Use client for new requests; a new client lifts a pause after a key or quota error"""
+        with self._lock:
+            if client is not self._client:
+                self._client = client
+                self._halted = None
+            if self._client is not None and self._halted is None:
+                self._ready.set()
+            else:
+                self._ready.clear()
+
+    def start(self):
+        """Start the worker threads (once)"""
+        self._recheck_client()
+        with self._lock:
+            if self._threads:
+                return
+            self._started = time.monotonic()
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._run, name=f"summary-prewarm-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def stop(self, timeout=5.0):
+        """Stop the workers after their current request"""
+        self._stop.set()
+        self._ready.set()
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def join(self, timeout=None):
+        """Wait until every queued patient has been handled (for scripts and tests); True when drained"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self._queue.unfinished_tasks:
+            if deadline is not None and time.monotonic() > deadline:
+                return False
+            time.sleep(0.01)
+        return True
+
+    def _run(self):
+        while not self._stop.is_set():
+            if not self._ready.wait(0.5):
+                self._recheck_client()
+                continue
+            try:
+                item = self._queue.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            try:
+                self._wait_for_backoff()
+                if not self._stop.is_set():
+                    self._warm(item)
+            finally:
+                self._queue.task_done()
+
+    def _recheck_client(self):
+        """Take client_factory()'s client, at most every key_recheck seconds; the same client keeps a pause"""
+        if self.client_factory is None or self._stop.is_set():
+            return
+        with self._lock:
+            now = time.monotonic()
+            if now < self._next_recheck:
+                return
+            self._next_recheck = now + self.key_recheck
+        try:
+            client = self.client_factory()
+        except Exception as e:
+            with self._lock:
+                self.last_error = str(e)[:200]
+            return
+        self.set_client(client)
+
+    def _wait_for_backoff(self):
+        while not self._stop.is_set():
+            remaining = self._resume_at - time.monotonic()
+            if remaining <= 0:
+                return
+            self._stop.wait(remaining)
+
+    def _requeue(self, item, attempt):
+        tier, order, seq, eid, _ = item
+        self._queue.put((tier, order, seq, eid, attempt))
+
+    def _warm(self, item):
+        eid, attempt = item[3], item[4]
+        client = self._client
+        if client is None or self._halted is not None:
+            self._requeue(item, attempt)
+            return
+        with self._lock:
+            self.counts['in_progress'] += 1
+        try:
+            request = self.build_request(eid)
+            if request is None:
+                self._count('skipped')
+                return
+            _, from_cache = cached_completion(client, self.cache, **request)
+            with self._lock:
+                self._consecutive_limits = 0
+                self.counts['already_warm' if from_cache else 'warmed'] += 1
+                self._completed.append(time.monotonic())
+        except Exception as e:
+            self._failed(item, attempt, e)
+        finally:
+            with self._lock:
+                self.counts['in_progress'] -= 1
+
+    def _failed(self, item, attempt, error):
+        message = classify_openai_error(error)
+        with self._lock:
+            self.last_error = message or str(error)[:200]
+            if message == RATE_LIMIT_MESSAGE:
+                self.counts['rate_limited'] += 1
+                delay = _retry_after(error)
+                if delay is None:
+                    delay = min(self.backoff_max, self.backoff_base * 2 ** self._consecutive_limits)
+                    delay *= 0.5 + random.random() / 2
+                self._consecutive_limits += 1
+                self._resume_at = max(self._resume_at, time.monotonic() + delay)
+                self._requeue(item, attempt)
+            elif message == QUOTA_MESSAGE or (message == INVALID_KEY_MESSAGE
+                                              and getattr(error, 'status_code', None) != 400):
+                # Every request would fail the same way: wait for another key
+                self._halted = message
+                self._ready.clear()
+                self._requeue(item, attempt)
+            elif attempt + 1 < self.max_attempts:
+                self._requeue(item, attempt + 1)
+            else:
+                self.counts['failed'] += 1
+
+    def _count(self, name):
+        with self._lock:
+            self.counts[name] += 1
+
+    def status(self):
+        """Queue depth, progress counters, throughput and the current state"""
+        now = time.monotonic()
+        with self._lock:
+            while self._completed and now - self._completed[0] > THROUGHPUT_WINDOW:
+                self._completed.popleft()
+            backoff = max(0.0, self._resume_at - now)
+            if self._stop.is_set():
+                state = 'stopped'
+            elif self._halted is not None:
+                state = 'paused'
+            elif self._client is None:
+                state = 'waiting for API key'
+            elif backoff > 0:
+                state = 'backing off'
+            elif self._queue.unfinished_tasks:
+                state = 'running'
+            else:
+                state = 'idle'
+            window = min(THROUGHPUT_WINDOW, now - self._started) if self._started is not None else 0.0
+            return dict(self.counts,
+                        state=state,
+                        queued=self._queue.qsize(),
+                        scheduled=len(self._scheduled),
+                        per_minute=60 * len(self._completed) / window if window > 0 else 0.0,
+                        backoff_seconds=backoff,
+                        last_error=self._halted or self.last_error)
@@ -0,0 +1,60 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Tests for dashboard aggregates and the filter-state aggregate cache
+"""
+from datetime import date
+
+import numpy as np
+
+from dashboard_stats import AggregateCache, condition_los_stats, filter_state_key
+from patient_data import DATA_FILE, DISEASE_COLS, apply_schema, derive_columns, read_raw_csv
+
+
+def test_filter_state_key_is_canonical():
+    """Selection order does not matter, values and dataset version do"""
+    a = filter_state_key('v1', start_date=date(2024, 1, 1), facid=['A', 'B'], gender=['M', 'F'])
+    b = filter_state_key('v1', gender=['F', 'M'], facid=['B', 'A'], start_date=date(2024, 1, 1))
+    assert a == b
+    assert a != filter_state_key('v2', start_date=date(2024, 1, 1), facid=['A', 'B'], gender=['M', 'F'])
+    assert a != filter_state_key('v1', start_date=date(2024, 1, 1), facid=['A'], gender=['M', 'F'])
+
+
+def test_aggregate_cache_lru():
+    """Hits skip the computation and the least recently used entry is evicted"""
+    cache = AggregateCache(maxsize=2)
+    calls = []
+
+    def compute(value):
+        calls.append(value)
+        return value
+
+    assert cache.get_or_compute('a', lambda: compute(1)) == 1
+    assert cache.get_or_compute('b', lambda: compute(2)) == 2
+    assert cache.get_or_compute('a', lambda: compute(99)) == 1
+    cache.get_or_compute('c', lambda: compute(3))  # evicts 'b'
+    assert cache.get_or_compute('b', lambda: compute(4)) == 4
+    assert calls == [1, 2, 3, 4]
+    assert (cache.hits, cache.misses) == (1, 4)
+    assert len(cache) == 2
+
+
+def test_condition_los_stats_matches_per_condition_scan():
+    """Matrix-product counts and means equal the per-condition sub-frame loop"""
+    df = apply_schema(derive_columns(read_raw_csv(DATA_FILE)))
+    overall, by_dept = condition_los_stats(df, DISEASE_COLS, by='facid', block_rows=500)
+
+    for disease in DISEASE_COLS:
+        subset = df[df[disease] == 1]
+        assert overall.loc[disease, 'count'] == len(subset)
+        assert np.isclose(overall.loc[disease, 'avg_los'], subset['lengthofstay'].mean())
+        for dept, group in subset.groupby('facid', observed=True):
+            assert by_dept['count'].loc[disease, dept] == len(group)
+            assert np.isclose(by_dept['avg_los'].loc[disease, dept], group['lengthofstay'].mean())
+
+
+if __name__ == "__main__":
+    test_filter_state_key_is_canonical()
+    test_aggregate_cache_lru()
+    test_condition_los_stats_matches_per_condition_scan()
+    print("✅ All tests passed!")
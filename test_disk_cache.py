@@ -0,0 +1,194 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Tests for the two-tier (memory + SQLite) LRU cache and the query-embedding cache built on it
+"""
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+from types import SimpleNamespace
+
+import numpy as np
+
+from disk_cache import SCHEMA_SQL, TwoTierCache, cache_key, normalize_text
+from rag_system import EMBEDDING_CACHE_FILE, EMBEDDING_MODEL, RAGSystem
+from test_hybrid_search import _embedding_towards, _make_hybrid_db
+
+
+class FakeEmbeddingsClient:
+    """Stands in for openai.OpenAI; counts embedding requests"""
+
+    def __init__(self, vector, fail=False):
+        self.vector = vector
+        self.fail = fail
+        self.calls = []
+        self.embeddings = self
+
+    def create(self, model, input):
+        self.calls.append((model, input))
+        if self.fail:
+            raise RuntimeError("rate_limit")
+        return SimpleNamespace(data=[SimpleNamespace(embedding=list(self.vector))])
+
+
+def test_keys():
+    """Keys depend on the model and on the text up to whitespace, not on how the parts split"""
+    assert normalize_text("  Anemia\n\tlength  of stay ") == "Anemia length of stay"
+    assert cache_key("m", normalize_text("a  b")) == cache_key("m", normalize_text("a b\n"))
+    assert cache_key("ab", "c") != cache_key("a", "bc")
+    assert cache_key("model-1", "text") != cache_key("model-2", "text")
+
+
+def test_memory_tier_is_lru_with_counters():
+    """Without a file the cache is a bounded LRU; counters track hits and misses"""
+    cache = TwoTierCache(memory_items=2)
+    cache.put('a', b'1')
+    cache.put('b', b'2')
+    assert cache.get('a') == b'1'       # 'a' is now most recent
+    cache.put('c', b'3')                # evicts 'b'
+    assert cache.get('b') is None
+    assert cache.get('c') == b'3'
+    assert len(cache) == 2
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses'], stats['disk_hits']) == (2, 1, 0)
+    assert stats['hit_rate'] == 2 / 3
+
+
+def test_disk_tier_persists_and_is_size_bounded():
+    """Entries survive a new cache instance; the file drops least recently used values over budget"""
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        path = os.path.join(tmp_dir, 'cache', 'entries.db')
+        cache = TwoTierCache(path, memory_items=1, disk_bytes=300)
+        for key in 'abc':
+            cache.put(key, bytes(100))
+        assert cache.get('a') == bytes(100)     # from disk: marks 'a' recently used
+        assert cache.stats()['disk_hits'] == 1
+        cache.put('d', bytes(100))              # 400 bytes > 300: evicts 'b', the least recently used
+        assert cache.stats()['evictions'] == 1 and cache.stats()['disk_bytes'] == 300
+        cache.close()
+
+        reopened = TwoTierCache(path, memory_items=1, disk_bytes=300)
+        assert reopened.get('b') is None
+        assert all(reopened.get(key) == bytes(100) for key in 'acd')
+        assert reopened.stats()['disk_hits'] == 3 and reopened.stats()['disk_bytes'] == 300
+        reopened.clear()
+        assert reopened.get('a') is None and reopened.stats()['disk_bytes'] == 0
+        reopened.close()
+    finally:
+        shutil.rmtree(tmp_dir)
+
+
+def test_processes_sharing_a_file_stay_within_budget():
+    """Caches writing to one file (one per Streamlit worker) trim against the file's real total"""
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        path = os.path.join(tmp_dir, 'entries.db')
+        workers = [TwoTierCache(path, memory_items=1, disk_bytes=300) for _ in range(2)]
+        for i in range(6):
+            workers[i % 2].put(f'k{i}', bytes(100))
+        assert all(worker.stats()['disk_bytes'] == 300 for worker in workers)
+        assert sum(worker.stats()['evictions'] for worker in workers) == 3
+        assert [workers[0].get(f'k{i}') is not None for i in range(6)] == [False] * 3 + [True] * 3
+        for worker in workers:
+            worker.close()
+    finally:
+        shutil.rmtree(tmp_dir)
+
+
+def test_unwritable_disk_tier_falls_back_to_memory():
+    """A cache file that cannot be created leaves a working memory tier"""
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        blocker = os.path.join(tmp_dir, 'not_a_dir')
+        open(blocker, 'w').close()
+        cache = TwoTierCache(os.path.join(blocker, 'entries.db'))
+        cache.put('a', b'1')
+        assert cache.get('a') == b'1'
+    finally:
+        shutil.rmtree(tmp_dir)
+
+
+def test_entries_expire_after_ttl():
+    """With a ttl, old entries are misses in both tiers and are dropped, also ones that expired while the file was closed"""
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        path = os.path.join(tmp_dir, 'entries.db')
+        conn = sqlite3.connect(path)
+        conn.execute(SCHEMA_SQL)
+        conn.execute("INSERT INTO cache_entries VALUES ('old', x'01', 1, 0, 0)")
+        conn.commit()
+        conn.close()
+
+        cache = TwoTierCache(path, memory_items=1, ttl=0.2)
+        assert cache.get('old') is None and cache.stats()['disk_bytes'] == 0
+        cache.put('a', b'1')
+        cache.put('b', b'2')                # 'a' now on disk only
+        assert cache.get('a') == b'1' and cache.get('b') == b'2'
+        time.sleep(0.3)
+        assert cache.get('a') is None and cache.get('b') is None
+        assert cache.stats()['expirations'] == 2 and cache.stats()['disk_bytes'] == 0
+        cache.put('c', b'3')
+        cache.close()
+
+        reopened = TwoTierCache(path, ttl=60)
+        assert reopened.get('c') == b'3'
+        reopened.close()
+    finally:
+        shutil.rmtree(tmp_dir)
+
+
+def test_repeated_patient_views_make_no_embedding_calls():
+    """The second search for a query, even from a restarted process, reuses the cached embedding"""
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        db_path = _make_hybrid_db(tmp_dir)
+        client = FakeEmbeddingsClient(_embedding_towards(2, 3))
+        rag = RAGSystem(db_path=db_path)
+        rag.client = client
+        first = rag.search_relevant_papers("pneumonia hospital readmission", top_k=3)
+        assert client.calls == [(EMBEDDING_MODEL, "pneumonia hospital readmission")]
+        assert first[0]['retrieved_by'] == ['keyword', 'vector']
+
+        assert rag.search_relevant_papers("pneumonia  hospital readmission ", top_k=3) == first
+        assert len(client.calls) == 1
+        assert rag.embedding_cache.stats()['hits'] == 1
+        rag.close()
+        assert os.path.exists(os.path.join(tmp_dir, EMBEDDING_CACHE_FILE))
+
+        restarted = RAGSystem(db_path=db_path)
+        restarted.client = client
+        assert restarted.search_relevant_papers("pneumonia hospital readmission", top_k=3) == first
+        assert len(client.calls) == 1 and restarted.embedding_cache.stats()['disk_hits'] == 1
+        np.testing.assert_array_equal(restarted.get_embedding("pneumonia hospital readmission"),
+                                      client.vector.astype(np.float32))
+        restarted.close()
+    finally:
+        shutil.rmtree(tmp_dir)
+
+
+def test_failed_embedding_requests_are_not_cached():
+    """An API failure returns None and the next call asks again"""
+    rag = RAGSystem(db_path=os.path.join(tempfile.gettempdir(), 'missing_papers.db'))
+    client = FakeEmbeddingsClient(_embedding_towards(1), fail=True)
+    rag.client = client
+    assert rag.get_embedding("anemia") is None
+    client.fail = False
+    assert rag.get_embedding("anemia") is not None
+    assert rag.get_embedding("anemia") is not None
+    assert len(client.calls) == 2
+    rag.close()
+
+
+if __name__ == "__main__":
+    test_keys()
+    test_memory_tier_is_lru_with_counters()
+    test_disk_tier_persists_and_is_size_bounded()
+    test_processes_sharing_a_file_stay_within_budget()
+    test_unwritable_disk_tier_falls_back_to_memory()
+    test_entries_expire_after_ttl()
+    test_repeated_patient_views_make_no_embedding_calls()
+    test_failed_embedding_requests_are_not_cached()
+    print("✅ All tests passed!")
@@ -0,0 +1,152 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Tests for the precomputed condition -> evidence table
+"""
+import os
+import shutil
+import sqlite3
+import tempfile
+
+from evidence_table import EVIDENCE_TOP_K, condition_key, evidence_path
+from rag_system import RAGSystem
+from test_disk_cache import FakeEmbeddingsClient
+from test_hybrid_search import _embedding_towards, _make_hybrid_db
+
+SYMPTOM_SETS = [('pneumonia',), ('anemia', 'asthma'), ('asthma', 'anemia'), ('dialysis',)]
+
+
+def _rag_with_key(db_path):
+    rag = RAGSystem(db_path=db_path, api_key='sk-test')
+    rag.client = FakeEmbeddingsClient(_embedding_towards(2, 3))
+    return rag
+
+
+def test_symptom_sets_are_order_independent():
+    """Detected symptoms come back sorted, so one condition set is one key and one query"""
+    rag = RAGSystem(db_path=os.path.join(tempfile.gettempdir(), 'missing_papers.db'))
+    symptoms, _ = rag.extract_symptoms_from_patient({'pneum': 1, 'irondef': 1, 'asthma': 1, 'hematocrit': 12})
+    assert symptoms == ['anemia', 'asthma', 'pneumonia']
+    assert condition_key(['pneumonia', 'anemia', 'anemia']) == 'anemia|pneumonia'
+    rag.close()
+
+
+def test_lookup_serves_precomputed_evidence():
+    """After the build, symptom-set lookups match live search without running one"""
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        db_path = _make_hybrid_db(tmp_dir)
+        rag = _rag_with_key(db_path)
+        assert rag.build_evidence_table(SYMPTOM_SETS) == 3
+        live = {key: rag.search_relevant_papers(' '.join(sorted(key)), top_k=3) for key in SYMPTOM_SETS}
+        rag.close()
+        assert os.path.exists(evidence_path(db_path, 'paper_chunks'))
+
+        restarted = _rag_with_key(db_path)
+        searches = []
+        restarted._search = lambda query, top_k, api_key=None: searches.append(query) or ([], [])
+        for key in SYMPTOM_SETS:
+            assert restarted.evidence_for_symptoms(list(key), top_k=3) == live[key]
+        assert restarted.evidence_for_symptoms(['pneumonia'], top_k=1) == live[('pneumonia',)][:1]
+        assert searches == [] and restarted.client.calls == []
+
+        # Sets missing from the table, or deeper than it, fall back to a live search
+        restarted.evidence_for_symptoms(['depression'], top_k=3)
+        restarted.evidence_for_symptoms(['pneumonia'], top_k=EVIDENCE_TOP_K + 1)
+        assert searches == ['depression', 'pneumonia']
+        restarted.close()
+    finally:
+        shutil.rmtree(tmp_dir)
+
+
+def test_corpus_change_invalidates_table():
+    """A changed chunk table makes the stored evidence stale; lookups search live again"""
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        db_path = _make_hybrid_db(tmp_dir)
+        rag = _rag_with_key(db_path)
+        rag.build_evidence_table(SYMPTOM_SETS)
+        rag.close()
+
+        conn = sqlite3.connect(db_path)
+        conn.execute("DELETE FROM paper_chunks WHERE filename = 'pneumonia.pdf'")
+        conn.commit()
+        conn.close()
+
+        rag = _rag_with_key(db_path)
+        assert rag._get_evidence_table() is None
+        assert all(p['filename'] != "pneumonia.pdf" for p in rag.evidence_for_symptoms(['pneumonia']))
+        rag.close()
+    finally:
+        shutil.rmtree(tmp_dir)
+
+
+def test_running_process_sees_corpus_and_table_changes():
+    """An instance that already loaded the table drops it when the corpus changes and picks up a rebuild"""
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        db_path = _make_hybrid_db(tmp_dir)
+        builder = _rag_with_key(db_path)
+        builder.build_evidence_table(SYMPTOM_SETS)
+
+        rag = _rag_with_key(db_path)
+        assert rag._get_evidence_table() is not None
+
+        conn = sqlite3.connect(db_path)
+        conn.execute("DELETE FROM paper_chunks WHERE filename = 'pneumonia.pdf'")
+        conn.commit()
+        conn.close()
+        assert rag._get_evidence_table() is None
+        assert all(p['filename'] != "pneumonia.pdf" for p in rag.evidence_for_symptoms(['pneumonia']))
+
+        # Rebuilt by another process (the embedding store is stale now: keyword evidence only)
+        builder.close()
+        rebuilder = _rag_with_key(db_path)
+        rebuilder.build_evidence_table(SYMPTOM_SETS)
+        rebuilder.close()
+        assert rag._get_evidence_table()['engines'] == ['keyword']
+        searches = []
+        rag._search = lambda query, top_k, api_key=None: searches.append(query) or ([], [])
+        rag.evidence_for_symptoms(['anemia', 'asthma'])
+        assert searches == []
+        rag.close()
+    finally:
+        shutil.rmtree(tmp_dir)
+
+
+def test_table_matches_engines_of_live_search():
+    """Keyword-only results are never stored for a hybrid corpus, and a hybrid table needs an API key to be served"""
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        db_path = _make_hybrid_db(tmp_dir)
+        rag = RAGSystem(db_path=db_path)
+        try:
+            rag.build_evidence_table(SYMPTOM_SETS)
+        except RuntimeError:
+            pass
+        else:
+            raise AssertionError("keyword-only results must not be stored")
+        assert not os.path.exists(evidence_path(db_path, 'paper_chunks'))
+        rag.close()
+
+        rag = _rag_with_key(db_path)
+        rag.build_evidence_table(SYMPTOM_SETS)
+        rag.close()
+
+        no_key = RAGSystem(db_path=db_path)
+        searches = []
+        no_key._search = lambda query, top_k, api_key=None: searches.append(query) or ([], [])
+        no_key.evidence_for_symptoms(['pneumonia'])
+        assert searches == ['pneumonia']
+        no_key.close()
+    finally:
+        shutil.rmtree(tmp_dir)
+
+
+if __name__ == "__main__":
+    test_symptom_sets_are_order_independent()
+    test_lookup_serves_precomputed_evidence()
+    test_corpus_change_invalidates_table()
+    test_running_process_sees_corpus_and_table_changes()
+    test_table_matches_engines_of_live_search()
+    print("✅ All tests passed!")
@@ -0,0 +1,190 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Tests for hybrid keyword + vector retrieval with reciprocal-rank fusion
+"""
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+
+import numpy as np
+
+from lexical_index import build_fts_index
+from rag_system import RELEVANT_RANK, RAGSystem, reciprocal_rank_fusion
+from test_sqlite_pool import CHUNKS, _make_paper_db
+from vector_index import EmbeddingStoreWriter, sidecar_path, table_fingerprint
+
+DIM = 8
+
+
+def _make_hybrid_db(tmp_dir):
+    """paper_chunks with an FTS index and an embedding store; chunk i's embedding is unit vector i"""
+    db_path = os.path.join(tmp_dir, "papers.db")
+    _make_paper_db(db_path)
+    conn = sqlite3.connect(db_path)
+    build_fts_index(conn)
+    writer = EmbeddingStoreWriter(sidecar_path(db_path, 'paper_chunks'))
+    writer.add_many(list(range(1, len(CHUNKS) + 1)), np.eye(len(CHUNKS), DIM))
+    writer.close(table_fingerprint(conn, 'paper_chunks'))
+    conn.close()
+    return db_path
+
+
+def _embedding_towards(*chunk_ids):
+    vector = np.zeros(DIM)
+    for weight, chunk_id in enumerate(chunk_ids):
+        vector[chunk_id - 1] = 1.0 - 0.1 * weight
+    return vector
+
+
+def test_reciprocal_rank_fusion():
+    """Ids ranked high by several lists win; ties break on the lower id"""
+    fused = reciprocal_rank_fusion([[1, 2, 3], [2, 3, 4]], k=60)
+    assert [chunk_id for chunk_id, _ in fused] == [2, 3, 1, 4]
+    assert np.isclose(fused[0][1], 1 / 62 + 1 / 61)
+    assert [chunk_id for chunk_id, _ in reciprocal_rank_fusion([[5], [4]])] == [4, 5]
+    assert reciprocal_rank_fusion([]) == []
+
+
+def test_hybrid_fuses_both_engines():
+    """Chunks both engines rank first score 1.0; single-engine hits score at most half"""
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        rag = RAGSystem(db_path=_make_hybrid_db(tmp_dir))
+        # Keyword search finds pneumonia (2) then anemia (1); the vector points at pneumonia, then asthma (3)
+        rag.get_embedding = lambda text, api_key=None: _embedding_towards(2, 3)
+        results = rag.search_relevant_papers("pneumonia hospital readmission", top_k=3)
+
+        assert results[0]['filename'] == "pneumonia.pdf"
+        assert results[0]['relevance'] == 1.0
+        assert results[0]['retrieved_by'] == ['keyword', 'vector']
+        assert {r['filename']: r['retrieved_by'] for r in results[1:]} == {
+            "anemia.pdf": ['keyword'], "asthma.pdf": ['vector']}
+        assert all(r['relevance'] <= 0.5 for r in results[1:])
+        assert all(rag.is_relevant(r) for r in results)
+        assert results[0]['authors'] == "Rodriguez et al." and results[0]['year'] == 2018
+
+        # Without an embedding (no API key) the keyword engine alone decides, on the same scale
+        rag.get_embedding = lambda text, api_key=None: None
+        keyword_only = rag.search_relevant_papers("pneumonia hospital readmission", top_k=3)
+        assert [r['retrieved_by'] for r in keyword_only] == [['keyword'], ['keyword']]
+        assert keyword_only[0]['relevance'] == 1.0
+        rag.close()
+    finally:
+        shutil.rmtree(tmp_dir)
+
+
+def test_engines_run_concurrently_within_one_budget():
+    """The keyword search overlaps the embedding request, and the engines split the candidate budget"""
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        rag = RAGSystem(db_path=_make_hybrid_db(tmp_dir))
+        depths = {}
+
+        def slow_embedding(text, api_key=None):
+            time.sleep(0.3)
+            return _embedding_towards(1)
+
+        keyword_ranking = rag._keyword_ranking
+
+        def slow_keyword_ranking(query, depth):
+            depths['keyword'] = depth
+            time.sleep(0.3)
+            return keyword_ranking(query, depth)
+
+        vector_ranking = rag._vector_ranking
+
+        def recording_vector_ranking(query, depth, api_key=None):
+            depths['vector'] = depth
+            return vector_ranking(query, depth, api_key)
+
+        rag.get_embedding = slow_embedding
+        rag._keyword_ranking = slow_keyword_ranking
+        rag._vector_ranking = recording_vector_ranking
+
+        start = time.perf_counter()
+        results = rag.search_relevant_papers("anemia length of stay", top_k=5)
+        elapsed = time.perf_counter() - start
+        assert results[0]['filename'] == "anemia.pdf"
+        assert elapsed < 0.5, elapsed
+        assert depths == {'keyword': 10, 'vector': 10}
+        rag.close()
+    finally:
+        shutil.rmtree(tmp_dir)
+
+
+def test_similarity_floor_applies_before_fusion():
+    """Vector hits below the similarity floor never enter the fused list"""
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        rag = RAGSystem(db_path=_make_hybrid_db(tmp_dir))
+        # Orthogonal to every chunk: the vector engine runs but contributes nothing
+        query = np.zeros(DIM)
+        query[DIM - 1] = 1.0
+        rag.get_embedding = lambda text, api_key=None: query
+        results = rag.search_relevant_papers("asthma", top_k=3)
+        assert [r['filename'] for r in results] == ["asthma.pdf"]
+        assert results[0]['retrieved_by'] == ['keyword']
+        assert results[0]['relevance'] == 0.5
+        rag.close()
+    finally:
+        shutil.rmtree(tmp_dir)
+
+
+def test_relevance_floor_keeps_agreement_and_top_ranks():
+    """Evidence is a chunk both engines found, or one engine's top RELEVANT_RANK; a weaker single-engine hit is dropped"""
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        rag = RAGSystem(db_path=_make_hybrid_db(tmp_dir))
+        # Ids 80+ are not in the table: they only push the real chunks down the rankings
+        rag._keyword_ranking = lambda query, depth: [90, 91, 2, 1, 92, 93, 94, 95, 96, 3]
+        rag._vector_ranking = lambda query, depth, api_key=None: [80, 81, 82, 83, 84, 85, 86, 87, 88, 3]
+        results = rag.search_relevant_papers("length of stay", top_k=10)
+        assert [(r['chunk_id'], r['retrieved_by']) for r in results] == [
+            (3, ['keyword', 'vector']), (2, ['keyword']), (1, ['keyword'])]
+        assert RELEVANT_RANK == 3
+        assert [rag.is_relevant(r) for r in results] == [True, True, False]
+
+        # With one engine there is no second opinion: its hits are all kept
+        rag._vector_ranking = lambda query, depth, api_key=None: None
+        assert all(rag.is_relevant(r) for r in rag.search_relevant_papers("length of stay", top_k=10))
+        rag.close()
+    finally:
+        shutil.rmtree(tmp_dir)
+
+def test_single_engine_modes():
+    """retrieval='keyword' / 'vector' run one engine, normalized to that engine alone"""
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        db_path = _make_hybrid_db(tmp_dir)
+        vector = RAGSystem(db_path=db_path, retrieval='vector')
+        vector.get_embedding = lambda text, api_key=None: _embedding_towards(3)
+        results = vector.search_relevant_papers("pneumonia", top_k=3)
+        assert [(r['filename'], r['retrieved_by'], r['relevance']) for r in results] == [("asthma.pdf", ['vector'], 1.0)]
+        vector.close()
+
+        keyword = RAGSystem(db_path=db_path, retrieval='keyword')
+        keyword.get_embedding = lambda text, api_key=None: (_ for _ in ()).throw(AssertionError("no embedding request"))
+        assert keyword.search_relevant_papers("pneumonia", top_k=3)[0]['filename'] == "pneumonia.pdf"
+        keyword.close()
+
+        try:
+            RAGSystem(db_path=db_path, retrieval='semantic')
+        except ValueError:
+            pass
+        else:
+            raise AssertionError("unknown retrieval modes must be rejected")
+    finally:
+        shutil.rmtree(tmp_dir)
+
+
+if __name__ == "__main__":
+    test_reciprocal_rank_fusion()
+    test_hybrid_fuses_both_engines()
+    test_engines_run_concurrently_within_one_budget()
+    test_similarity_floor_applies_before_fusion()
+    test_relevance_floor_keeps_agreement_and_top_ranks()
+    test_single_engine_modes()
+    print("✅ All tests passed!")
@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Tests for the FTS5/BM25 keyword index behind lightweight RAG search
+"""
+import os
+import shutil
+import sqlite3
+import tempfile
+
+from lexical_index import build_fts_index, match_expression, query_terms
+from rag_system import RAGSystem
+from test_sqlite_pool import CHUNKS, _make_paper_db
+
+
+def test_query_terms():
+    """Queries become quoted, stopword-free terms that cannot inject FTS syntax"""
+    assert query_terms("What is the length of stay for Pneumonia? pneumonia") == ['length', 'stay', 'pneumonia']
+    assert match_expression('anemia AND "x" NEAR(y)') == '"anemia" OR "x" OR "near" OR "y"'
+    assert match_expression("what is the") is None
+    assert match_expression(None) is None
+
+
+def test_fts_search_ranks_with_bm25():
+    """With the index built, search goes through FTS5 and ranks by BM25 with title weight"""
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        db_path = os.path.join(tmp_dir, "papers.db")
+        _make_paper_db(db_path)
+        conn = sqlite3.connect(db_path)
+        build_fts_index(conn)
+        conn.close()
+
+        rag = RAGSystem(db_path=db_path)
+        assert rag.has_fts
+        results = rag.search_relevant_papers("pneumonia length of stay", top_k=3)
+        assert results[0]['filename'] == "pneumonia.pdf"
+        assert results[0]['title'] == "Length of stay in pneumonia"
+        assert all(a['relevance'] >= b['relevance'] for a, b in zip(results, results[1:]))
+        assert results[0]['relevance'] == 1.0 and rag.is_relevant(results[0])
+
+        # Stemming: "hospitalizations" matches "hospitalization" in a title
+        assert rag.search_relevant_papers("asthma hospitalizations", top_k=1)[0]['filename'] == "asthma.pdf"
+        # Only chunks containing a query term come back; pure stopwords match nothing
+        assert rag.search_relevant_papers("dialysis", top_k=3) == []
+        assert rag.search_relevant_papers("what is the", top_k=3) == []
+        rag.close()
+    finally:
+        shutil.rmtree(tmp_dir)
+
+
+def test_fts_index_follows_table_changes():
+    """Triggers keep the external-content index in sync with inserts, updates and deletes"""
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        db_path = os.path.join(tmp_dir, "papers.db")
+        _make_paper_db(db_path)
+        conn = sqlite3.connect(db_path)
+        build_fts_index(conn)
+        conn.execute('INSERT INTO paper_chunks (filename, title, content, chunk_text, chunk_index) '
+                     'VALUES (?, ?, ?, ?, ?)', ("ckd.pdf", "Kidney disease outcomes", "", "Dialysis prolongs stays.", 0))
+        conn.execute("UPDATE paper_chunks SET chunk_text = 'Iron therapy shortens stays.' WHERE filename = 'anemia.pdf'")
+        conn.execute("DELETE FROM paper_chunks WHERE filename = 'asthma.pdf'")
+        conn.commit()
+        conn.close()
+
+        rag = RAGSystem(db_path=db_path)
+        assert [p['filename'] for p in rag.search_relevant_papers("dialysis", top_k=3)] == ["ckd.pdf"]
+        assert [p['filename'] for p in rag.search_relevant_papers("iron therapy", top_k=3)] == ["anemia.pdf"]
+        assert rag.search_relevant_papers("readmission", top_k=3) == []
+        assert rag.search_relevant_papers("asthma", top_k=3) == []
+        rag.close()
+    finally:
+        shutil.rmtree(tmp_dir)
+
+
+def test_scan_fallback_without_index():
+    """Databases built before the index keep the row-scan search"""
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        db_path = os.path.join(tmp_dir, "papers.db")
+        _make_paper_db(db_path)
+        rag = RAGSystem(db_path=db_path)
+        assert not rag.has_fts
+        results = rag.search_relevant_papers("pneumonia length of stay", top_k=len(CHUNKS))
+        assert results[0]['filename'] == "pneumonia.pdf"
+        assert results[0]['retrieved_by'] == ['keyword'] and rag.is_relevant(results[0])
+        rag.close()
+    finally:
+        shutil.rmtree(tmp_dir)
+
+
+if __name__ == "__main__":
+    test_query_terms()
+    test_fts_search_ranks_with_bm25()
+    test_fts_index_follows_table_changes()
+    test_scan_fallback_without_index()
+    print("✅ All tests passed!")
@@ -0,0 +1,121 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Tests for incremental admission appends on the shared dataset
+"""
+import os
+import shutil
+import tempfile
+from datetime import date
+
+import numpy as np
+
+from live_dataset import LiveDataset
+from patient_data import DATA_FILE, ingest_csv_chunked, read_raw_csv, read_store, read_store_manifest
+from patient_index import FilterIndex
+
+
+def _new_admissions(n, eid_offset, facid='Z'):
+    batch = read_raw_csv(DATA_FILE).sample(n, random_state=eid_offset).copy()
+    batch['eid'] += eid_offset
+    batch['facid'] = facid
+    batch['vdate'] = '01/15/2025'
+    return batch
+
+
+def test_append_matches_full_reload():
+    """An appended frame equals a fresh read of the store, and is persisted as one part"""
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        store_dir = os.path.join(tmp_dir, "store")
+        ingest_csv_chunked(DATA_FILE, store_dir, chunksize=1000)
+        live = LiveDataset.load(DATA_FILE, store_dir, os.path.join(tmp_dir, "cache"))
+        changes = []
+        live.on_change(changes.append)
+
+        old_version = live.version
+        version = live.append_admissions(_new_admissions(100, 1_000_000))
+        assert version != old_version and changes == [version]
+        assert len(read_store_manifest(store_dir)['parts']) == 3
+
+        frame = live.frame
+        expected = read_store(store_dir)
+        assert len(frame) == len(expected)
+        for col in expected.columns:
+            assert frame[col].astype(str).tolist() == expected[col].astype(str).tolist(), col
+        assert frame['facid'].dtype.name == 'category' and 'Z' in frame['facid'].cat.categories
+
+        # The segmented filter index agrees with one built over the whole frame
+        start, end = live.filter_index.date_range
+        assert end == date(2025, 1, 15)
+        for selections in ({}, {'facid': ['Z', 'A']}, {'risk_level': ['High Risk'], 'gender': ['F']}):
+            assert np.array_equal(live.filter_index.select(start, end, **selections),
+                                  FilterIndex(frame).select(start, end, **selections))
+        assert live.sketch_index.sketch('lengthofstay').n == len(frame)
+    finally:
+        shutil.rmtree(tmp_dir)
+
+
+def test_refresh_picks_up_parts_from_another_writer():
+    """A second process appending to the store is ingested incrementally on refresh"""
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        store_dir = os.path.join(tmp_dir, "store")
+        cache_dir = os.path.join(tmp_dir, "cache")
+        # The first append on a CSV-backed dataset creates the store
+        reader = LiveDataset.load(DATA_FILE, store_dir, cache_dir)
+        assert reader.parts is None
+        reader.append_admissions(_new_admissions(10, 1_000_000))
+        assert len(reader.parts) == 2
+
+        writer = LiveDataset.load(DATA_FILE, store_dir, cache_dir)
+        writer.append_admissions(_new_admissions(50, 2_000_000, facid='Y'))
+
+        assert reader.refresh()
+        assert reader.version == writer.version
+        assert len(reader.frame) == len(writer.frame)
+        assert reader.filter_index.count('facid', 'Y') == 50
+        assert not reader.refresh()
+    finally:
+        shutil.rmtree(tmp_dir)
+
+
+def test_csv_edits_after_the_store_exists_are_reported():
+    """Once an append has created the store, an edited CSV is flagged rather than silently ignored"""
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        csv_path = os.path.join(tmp_dir, "LengthOfStay.csv")
+        shutil.copy(DATA_FILE, csv_path)
+        live = LiveDataset.load(csv_path, os.path.join(tmp_dir, "store"), os.path.join(tmp_dir, "cache"))
+        live.append_admissions(_new_admissions(5, 1_000_000))
+        assert not live.refresh() and not live.source_changed
+
+        with open(csv_path, 'a', encoding='utf-8') as f:
+            f.write(open(csv_path, encoding='utf-8').readlines()[-1])
+        version = live.version
+        assert not live.refresh()
+        assert live.source_changed and live.version == version
+    finally:
+        shutil.rmtree(tmp_dir)
+
+
+def test_missing_columns_are_rejected():
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        live = LiveDataset.load(DATA_FILE, os.path.join(tmp_dir, "store"), os.path.join(tmp_dir, "cache"))
+        try:
+            live.append_admissions([{'eid': 1, 'lengthofstay': 3}])
+        except ValueError as e:
+            assert 'missing columns' in str(e)
+        else:
+            raise AssertionError("expected ValueError")
+    finally:
+        shutil.rmtree(tmp_dir)
+
+
+if __name__ == "__main__":
+    test_append_matches_full_reload()
+    test_refresh_picks_up_parts_from_another_writer()
+    test_csv_edits_after_the_store_exists_are_reported()
+    test_missing_columns_are_rejected()
+    print("✅ All tests passed!")
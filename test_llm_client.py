@@ -0,0 +1,319 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Tests for streamed chat completions, error classification and sentence chunking for TTS
+"""
+import os
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+from disk_cache import TwoTierCache
+from llm_client import (ClientRegistry, SentenceSplitter, classify_openai_error, iter_sentences, open_chat_stream,
+                        response_key, tee_sentences)
+import rag_system
+from rag_system import RAGSystem
+from test_sqlite_pool import _make_paper_db
+
+
+def _chunk(text):
+    return SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=text))])
+
+
+class FakeChatClient:
+    """Stands in for openai.OpenAI; streams the given deltas, optionally failing after them"""
+
+    def __init__(self, deltas, error=None, fail_on_create=None):
+        self.deltas = deltas
+        self.error = error
+        self.fail_on_create = fail_on_create
+        self.calls = []
+        self.chat = SimpleNamespace(completions=self)
+
+        self.embeddings = SimpleNamespace(create=lambda **kwargs: None)
+        self.audio = SimpleNamespace(speech=SimpleNamespace(create=lambda **kwargs: None))
+
+    def create(self, stream=False, **kwargs):
+        self.calls.append((kwargs['model'], stream))
+        if self.fail_on_create:
+            raise self.fail_on_create
+        if not stream:
+            return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content="".join(self.deltas)))])
+
+        def chunks():
+            yield SimpleNamespace(choices=[])     # usage-only chunk
+            for text in self.deltas:
+                yield _chunk(text)
+            if self.error:
+                raise self.error
+        return chunks()
+
+
+def test_classify_openai_error():
+    """Key, quota and rate-limit errors map to user-facing messages; others are left to the caller"""
+    assert "API密钥无效" in classify_openai_error(Exception("Error code: 401 - Incorrect API key"))
+    assert "API配额不足" in classify_openai_error(Exception("insufficient_quota"))
+    assert "请求过于频繁" in classify_openai_error(Exception("Error code: 429 rate_limit_exceeded"))
+    assert classify_openai_error(Exception("connection reset")) is None
+
+
+def test_stream_yields_text_deltas():
+    """The request is sent with stream=True; chunks without text are skipped"""
+    client = FakeChatClient(["Hello", None, " world", ""])
+    deltas = open_chat_stream(client, model="gpt-4o", messages=[])
+    assert client.calls == [("gpt-4o", True)]
+    assert list(deltas) == ["Hello", " world"]
+
+
+def test_stream_errors():
+    """Errors before the first token raise; mid-stream ones end the text with their message or re-raise"""
+    client = FakeChatClient([], fail_on_create=Exception("Error code: 401"))
+    try:
+        open_chat_stream(client, model="gpt-4o", messages=[])
+    except Exception as e:
+        assert "401" in str(e)
+    else:
+        raise AssertionError("create() errors must raise before streaming starts")
+
+    client = FakeChatClient(["Partial"], error=Exception("429 rate_limit"))
+    text = list(open_chat_stream(client, model="gpt-4o", messages=[]))
+    assert text[0] == "Partial" and "请求过于频繁" in text[1]
+
+    client = FakeChatClient(["Partial"], error=ConnectionError("reset"))
+    deltas = open_chat_stream(client, model="gpt-4o", messages=[])
+    assert next(deltas) == "Partial"
+    try:
+        next(deltas)
+    except ConnectionError:
+        pass
+    else:
+        raise AssertionError("unclassified errors must propagate")
+
+
+def test_completed_responses_are_replayed_from_cache():
+    """An identical request replays the stored text without an API call, also from a restarted process"""
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        path = os.path.join(tmp_dir, 'responses.db')
+        request = dict(model="gpt-4o", max_tokens=300, temperature=0.7,
+                       messages=[{"role": "system", "content": "Summarize"}, {"role": "user", "content": "Patient A"}])
+        client = FakeChatClient(["Stable. ", "Monitor glucose."])
+        cache = TwoTierCache(path, ttl=60)
+        assert "".join(open_chat_stream(client, cache=cache, **request)) == "Stable. Monitor glucose."
+        assert list(open_chat_stream(client, cache=cache, **request)) == ["Stable. Monitor glucose."]
+        assert len(client.calls) == 1
+        cache.close()
+
+        restarted = TwoTierCache(path, ttl=60)
+        assert list(open_chat_stream(client, cache=restarted, **request)) == ["Stable. Monitor glucose."]
+        assert len(client.calls) == 1
+
+        # New notes change the prompt, and so the key; other parameters are part of it too
+        with_notes = dict(request, messages=[request['messages'][0], {"role": "user", "content": "Patient A\nNotes"}])
+        assert response_key(**with_notes) != response_key(**request)
+        assert response_key(**dict(request, temperature=0.2)) != response_key(**request)
+        "".join(open_chat_stream(client, cache=restarted, **with_notes))
+        assert len(client.calls) == 2
+        restarted.close()
+    finally:
+        shutil.rmtree(tmp_dir)
+
+
+def test_incomplete_responses_are_not_cached():
+    """Streams that failed or were abandoned part-way are generated again next time"""
+    cache = TwoTierCache()
+    request = dict(model="gpt-4o", messages=[{"role": "user", "content": "Patient B"}])
+    failing = FakeChatClient(["Partial"], error=Exception("429 rate_limit"))
+    list(open_chat_stream(failing, cache=cache, **request))
+    abandoned = open_chat_stream(FakeChatClient(["First. ", "Second."]), cache=cache, **request)
+    next(abandoned)
+    abandoned.close()
+    assert cache.get(response_key(**request)) is None
+
+
+def test_sentence_splitting():
+    """Sentences complete across deltas; short pieces join the next one; CJK stops need no space"""
+    splitter = SentenceSplitter()
+    assert splitter.feed("The patient is stable") == []
+    assert splitter.feed(". Continue fluids") == ["The patient is stable."]
+    assert splitter.feed(" today.\n1. Rest") == ["Continue fluids today."]
+    assert splitter.feed(" and hydrate. ") == ["1. Rest and hydrate."]
+    assert splitter.flush() == []
+
+    assert list(iter_sentences(["患者病情稳定。", "建议继续补液治疗并观察。", "Follow up"])) == [
+        "患者病情稳定。 建议继续补液治疗并观察。", "Follow up"]
+
+
+def test_tee_sentences_speaks_while_streaming():
+    """Each sentence is handed over as soon as it completes, before the stream ends"""
+    spoken = []
+    deltas = tee_sentences(iter(["Anemia raises risk. ", "Monitor", " hemoglobin daily."]), spoken.append)
+    assert next(deltas) == "Anemia raises risk. "
+    assert next(deltas) == "Monitor" and spoken == ["Anemia raises risk."]
+    assert list(deltas) == [" hemoglobin daily."]
+    assert spoken == ["Anemia raises risk.", "Monitor hemoglobin daily."]
+
+
+def test_rag_response_streams():
+    """get_rag_response_for_patient(stream=True) returns the deltas with the retrieved papers"""
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        db_path = os.path.join(tmp_dir, 'papers.db')
+        _make_paper_db(db_path)
+        rag = RAGSystem(db_path=db_path)
+        rag.client = FakeChatClient(["Pneumonia ", "prolongs stays."])
+        deltas, papers, diagnostic_info = rag.get_rag_response_for_patient({'pneum': 1}, stream=True)
+        assert rag.client.calls == [("gpt-3.5-turbo", True)]
+        assert "".join(deltas) == "Pneumonia prolongs stays."
+        assert papers and diagnostic_info
+
+        rag.client = FakeChatClient([], fail_on_create=Exception("Error code: 401"))
+        message, papers, _ = rag.get_rag_response_for_patient({'pneum': 1}, stream=True)
+        assert "API密钥无效" in message and papers == []
+        rag.close()
+    finally:
+        shutil.rmtree(tmp_dir)
+
+
+def test_rag_response_reuses_page_work():
+    """Detected conditions and retrieved papers from the caller are used as given; a cache answers repeats"""
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        db_path = os.path.join(tmp_dir, 'papers.db')
+        _make_paper_db(db_path)
+        rag = RAGSystem(db_path=db_path)
+        papers = rag.evidence_for_symptoms(['pneumonia'], top_k=10)
+        searches = []
+        rag._search = lambda query, top_k, api_key=None: searches.append(query) or ([], [])
+        rag.extract_symptoms_from_patient = lambda patient: searches.append('extract')
+        rag.client = FakeChatClient(["Pneumonia prolongs stays."])
+        cache = TwoTierCache()
+        detected = (['pneumonia'], ["Pneumonia (Pneumonia diagnostic marker positive)"])
+        for _ in range(2):
+            answer, used, diagnostic_info = rag.get_rag_response_for_patient(
+                {'pneum': 1}, detected=detected, papers=papers, cache=cache)
+            assert answer == "Pneumonia prolongs stays." and used is papers and diagnostic_info == detected[1]
+        assert searches == [] and rag.client.calls == [("gpt-3.5-turbo", False)]
+        rag.close()
+    finally:
+        shutil.rmtree(tmp_dir)
+
+
+def test_rag_response_uses_the_callers_key():
+    """A per-call API key answers that call only; the shared instance keeps its own key and client"""
+    tmp_dir = tempfile.mkdtemp()
+    original = rag_system.get_openai_client
+    try:
+        db_path = os.path.join(tmp_dir, 'papers.db')
+        _make_paper_db(db_path)
+        rag = RAGSystem(db_path=db_path, api_key='sk-server')
+        server = rag.client = FakeChatClient(["From the server key."])
+        visitor = FakeChatClient(["From the visitor key."])
+        rag_system.get_openai_client = {'sk-visitor': visitor}.get
+        answer, papers, _ = rag.get_rag_response_for_patient({'pneum': 1}, api_key='sk-visitor')
+        assert answer == "From the visitor key." and papers
+        answer, _, _ = rag.get_rag_response_for_patient({'pneum': 1})
+        assert answer == "From the server key."
+        answer, _, _ = rag.get_rag_response_for_patient({'pneum': 1}, api_key='sk-server')
+        assert answer == "From the server key."
+        assert rag.api_key == 'sk-server' and rag.client is server
+        assert len(visitor.calls) == 1 and len(server.calls) == 2
+        rag.close()
+    finally:
+        rag_system.get_openai_client = original
+        shutil.rmtree(tmp_dir)
+
+
+def test_registry_shares_one_client_per_key():
+    """Clients are created once per API key and reused; no key means no client"""
+    created = []
+    registry = ClientRegistry(max_clients=2, factory=lambda key: created.append(key) or FakeChatClient([]))
+    first = registry.get('sk-a')
+    assert registry.get('sk-a') is first and registry.get('sk-b') is not first
+    assert registry.get('') is None and registry.get(None) is None
+    registry.get('sk-c')                    # drops 'sk-a', the least recently used key
+    registry.get('sk-a')
+    assert created == ['sk-a', 'sk-b', 'sk-c', 'sk-a']
+    assert registry.stats()['clients'] == 2 and registry.stats()['clients_created'] == 4
+
+    # The default factory builds a real SDK client on the configured pool, without any request
+    pooled = ClientRegistry(timeout=30, connect_timeout=3, max_retries=1).get('sk-test')
+    assert pooled.raw.max_retries == 1
+    assert (pooled.raw.timeout.connect, pooled.raw.timeout.read) == (3, 30)
+
+
+def test_registry_bounds_concurrency_and_times_calls():
+    """At most max_connections requests run at once; calls, errors and latency are counted per operation"""
+    running = []
+    peak = []
+    lock = threading.Lock()
+
+    def slow_create(**kwargs):
+        with lock:
+            running.append(1)
+            peak.append(len(running))
+        time.sleep(0.02)
+        with lock:
+            running.pop()
+        if kwargs.get('fail'):
+            raise RuntimeError("boom")
+        return kwargs['model']
+
+    client = FakeChatClient([])
+    client.create = slow_create
+    registry = ClientRegistry(max_connections=2, factory=lambda key: client)
+    pooled = registry.get('sk-test')
+    with ThreadPoolExecutor(6) as executor:
+        assert list(executor.map(lambda i: pooled.chat.completions.create(model=f"m{i}"), range(6))) == [
+            f"m{i}" for i in range(6)]
+    try:
+        pooled.chat.completions.create(model="m", fail=True)
+    except RuntimeError:
+        pass
+    assert max(peak) == 2
+    stats = registry.stats()
+    assert stats['waits'] > 0 and stats['in_flight'] == 0
+    chat = stats['operations']['chat']
+    assert (chat['calls'], chat['errors']) == (7, 1)
+    assert chat['mean_ms'] >= 20 and chat['mean_first_token_ms'] is None
+
+
+def test_streams_hold_a_slot_until_consumed():
+    """A streamed response keeps its connection slot until it is read to the end or closed"""
+    registry = ClientRegistry(max_connections=1, timeout=0.05, factory=lambda key: FakeChatClient(["a", "b"]))
+    pooled = registry.get('sk-test')
+    deltas = open_chat_stream(pooled, model="gpt-4o", messages=[])
+    assert registry.stats()['in_flight'] == 1
+    try:
+        pooled.chat.completions.create(model="gpt-4o", messages=[])
+    except TimeoutError:
+        pass
+    else:
+        raise AssertionError("the only slot is held by the open stream")
+    assert list(deltas) == ["a", "b"]
+    assert registry.stats()['in_flight'] == 0
+    assert registry.stats()['operations']['chat']['mean_first_token_ms'] is not None
+
+    stream = pooled.chat.completions.create(model="gpt-4o", messages=[], stream=True)
+    stream.close()
+    assert registry.stats()['in_flight'] == 0
+
+
+if __name__ == "__main__":
+    test_classify_openai_error()
+    test_stream_yields_text_deltas()
+    test_stream_errors()
+    test_completed_responses_are_replayed_from_cache()
+    test_incomplete_responses_are_not_cached()
+    test_sentence_splitting()
+    test_tee_sentences_speaks_while_streaming()
+    test_rag_response_streams()
+    test_rag_response_reuses_page_work()
+    test_rag_response_uses_the_callers_key()
+    test_registry_shares_one_client_per_key()
+    test_registry_bounds_concurrency_and_times_calls()
+    test_streams_hold_a_slot_until_consumed()
+    print("✅ All tests passed!")
@@ -0,0 +1,78 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Tests for cohort-wide condition detection and its agreement with the per-patient path
+"""
+import numpy as np
+import pandas as pd
+
+from patient_conditions import (BASIS_BITS, GENERIC_SYMPTOMS, condition_columns, condition_mask, detect_conditions,
+                                diagnostic_basis, row_symptoms)
+from rag_system import RAGSystem
+
+
+def _cohort(rows=400, seed=0):
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({
+        'hematocrit': rng.uniform(5, 16, rows).astype(np.float32),
+        'respiration': rng.uniform(10, 30, rows).astype(np.float32),
+        'neutrophils': rng.uniform(30, 90, rows).astype(np.float32),
+        'sodium': rng.uniform(125, 145, rows).astype(np.float32),
+        'creatinine': rng.uniform(0.5, 2.0, rows).astype(np.float32),
+        'bloodureanitro': rng.uniform(5, 40, rows).astype(np.float32),
+        'diagnosis': rng.choice(['Chronic renal failure', 'ANXIETY, stress', '', 'Heart failure; diabetic'], rows),
+    })
+    for flag in ('irondef', 'hemo', 'asthma', 'pneum', 'depress', 'psychologicaldisordermajor',
+                 'substancedependence', 'dialysisrenalendstage'):
+        df[flag] = (rng.random(rows) < 0.15).astype(np.int8)
+    df.loc[0, 'hematocrit'] = np.nan
+    return df
+
+
+def test_batch_matches_per_patient_extraction():
+    """Flags, codes and the lazily rendered text agree with extract_symptoms_from_patient row by row"""
+    rag = RAGSystem(db_path='missing_papers.db')
+    df = _cohort()
+    conditions = rag.extract_symptoms_batch(df)
+    assert list(conditions.index) == list(df.index)
+    assert condition_columns(conditions) == list(rag.symptom_keywords)
+    for position, (_, patient) in enumerate(df.iterrows()):
+        symptoms, diagnostic_info = rag.extract_symptoms_from_patient(patient)
+        row = conditions.iloc[position]
+        assert row_symptoms(row) == symptoms
+        assert diagnostic_basis(patient, int(row['basis']), int(row['diagnosis_basis'])) == diagnostic_info
+    rag.close()
+
+
+def test_codes_and_text():
+    """Basis bits record the rules that fired; text is rendered from them"""
+    patient = {'hematocrit': 12, 'asthma': 1, 'respiration': 24, 'neutrophils': 60.0, 'sodium': 140,
+               'substancedependence': 1, 'diagnosis': 'Dialysis since 2019'}
+    conditions = detect_conditions(pd.DataFrame([patient]))
+    row = conditions.iloc[0]
+    assert row_symptoms(row) == ['asthma', 'kidney disease', 'substance abuse']
+    assert int(row['basis']) == ((1 << BASIS_BITS['asthma']) | (1 << BASIS_BITS['substance_dependence'])
+                                 | (1 << BASIS_BITS['high_respiration']))
+    assert diagnostic_basis(patient, int(row['basis']), int(row['diagnosis_basis'])) == [
+        "Asthma (Diagnostic marker positive, Elevated respiratory rate: 24/min (Normal: 12-20))",
+        "Substance Dependence (Diagnostic marker positive)",
+        "Kidney Disease (Diagnosis code contains: dialysis)",
+    ]
+
+
+def test_cohort_filter_and_generic_terms():
+    """condition_mask selects patients with any selected condition; no condition means the generic terms"""
+    df = pd.DataFrame({'hematocrit': [12.0, 6.0, 12.0], 'pneum': [0, 0, 1]})
+    conditions = detect_conditions(df)
+    assert condition_mask(conditions, ['anemia']).tolist() == [False, True, False]
+    assert condition_mask(conditions, ['anemia', 'pneumonia']).tolist() == [False, True, True]
+    assert condition_mask(conditions, []).all()
+    assert row_symptoms(conditions.iloc[0]) == sorted(GENERIC_SYMPTOMS)
+    assert len(detect_conditions(df.iloc[:0])) == 0
+
+
+if __name__ == "__main__":
+    test_batch_matches_per_patient_extraction()
+    test_codes_and_text()
+    test_cohort_filter_and_generic_terms()
+    print("✅ All tests passed!")
@@ -0,0 +1,106 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Tests for patient data loading and the Parquet cache
+"""
+import os
+import shutil
+import tempfile
+
+import pandas as pd
+
+import patient_data
+from patient_data import (DATA_FILE, PATIENT_SCHEMA, apply_schema, derive_columns,
+                          ingest_csv_chunked, load_patient_frame, read_raw_csv, read_store)
+
+
+def _copy_sample(tmp_dir):
+    csv_path = os.path.join(tmp_dir, "LengthOfStay.csv")
+    shutil.copy(DATA_FILE, csv_path)
+    return csv_path
+
+
+def test_cache_matches_fresh_derivation():
+    """Warm cache load returns the same frame as deriving from the CSV"""
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        csv_path = _copy_sample(tmp_dir)
+        cache_dir = os.path.join(tmp_dir, "cache")
+
+        fresh = apply_schema(derive_columns(read_raw_csv(csv_path)))
+        cold = load_patient_frame(csv_path, cache_dir=cache_dir)
+        warm = load_patient_frame(csv_path, cache_dir=cache_dir)
+
+        pd.testing.assert_frame_equal(fresh, cold)
+        pd.testing.assert_frame_equal(cold, warm)
+        assert warm.attrs['dataset_version'] == cold.attrs['dataset_version']
+        if patient_data.PARQUET_AVAILABLE:
+            assert any(name.endswith('.parquet') for name in os.listdir(cache_dir))
+    finally:
+        shutil.rmtree(tmp_dir)
+
+
+def test_cache_invalidates_when_csv_changes():
+    """Editing the CSV produces a new version and drops the stale cache file"""
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        csv_path = _copy_sample(tmp_dir)
+        cache_dir = os.path.join(tmp_dir, "cache")
+        before = load_patient_frame(csv_path, cache_dir=cache_dir)
+
+        raw = read_raw_csv(csv_path).iloc[:100]
+        raw.to_csv(csv_path, index=False)
+        after = load_patient_frame(csv_path, cache_dir=cache_dir)
+
+        assert len(after) == 100
+        assert after.attrs['dataset_version'] != before.attrs['dataset_version']
+        parquet_files = [n for n in os.listdir(cache_dir) if n.endswith('.parquet')]
+        assert len(parquet_files) <= 1
+    finally:
+        shutil.rmtree(tmp_dir)
+
+
+def test_schema_dtypes_and_memory():
+    """Schema columns get compact dtypes and the frame shrinks"""
+    raw = derive_columns(read_raw_csv(DATA_FILE))
+    typed = apply_schema(raw.copy())
+
+    assert typed['facid'].dtype == 'category'
+    assert typed['risk_level'].cat.categories.tolist() == ['Standard Risk', 'High Risk']
+    assert typed['pneum'].dtype == 'int8'
+    assert typed['glucose'].dtype == 'float32'
+    assert set(PATIENT_SCHEMA) <= set(typed.columns)
+    # Values are unchanged, only their representation
+    assert (typed['full_name'].astype(str) == raw['full_name']).all()
+    assert (typed['risk_level'].astype(str) == raw['risk_level']).all()
+    assert typed.memory_usage(deep=True).sum() * 3 < raw.memory_usage(deep=True).sum()
+
+
+def test_chunked_store_matches_full_load():
+    """Chunked ingestion reproduces the in-memory frame, thresholds included"""
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        store_dir = os.path.join(tmp_dir, "store")
+        manifest = ingest_csv_chunked(DATA_FILE, store_dir, chunksize=400)
+        assert len(manifest['parts']) == 5
+
+        expected = load_patient_frame(DATA_FILE, cache_dir=os.path.join(tmp_dir, "cache"))
+        stored = read_store(store_dir)
+        assert list(stored.columns) == list(expected.columns)
+        for col in expected.columns:
+            assert stored[col].dtype == expected[col].dtype, col
+            assert stored[col].astype(str).tolist() == expected[col].astype(str).tolist(), col
+
+        subset = read_store(store_dir, columns=['eid', 'risk_level'], filters=[('facid', 'in', ['A'])])
+        assert list(subset.columns) == ['eid', 'risk_level']
+        assert len(subset) == (expected['facid'] == 'A').sum()
+    finally:
+        shutil.rmtree(tmp_dir)
+
+
+if __name__ == "__main__":
+    test_cache_matches_fresh_derivation()
+    test_cache_invalidates_when_csv_changes()
+    test_schema_dtypes_and_memory()
+    test_chunked_store_matches_full_load()
+    print("✅ All tests passed!")
@@ -0,0 +1,197 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Tests for the precomputed patient indexes
+"""
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+from patient_data import DATA_FILE, apply_schema, derive_columns, read_raw_csv
+from patient_index import FilterIndex, PersonIndex, SearchIndex, date_rank, normalize_text, trigrams
+
+df = apply_schema(derive_columns(read_raw_csv(DATA_FILE)))
+
+
+def _scan_filter(start_date, end_date, genders, depts, ages, risks):
+    """Reference implementation: the original full-column mask"""
+    mask = (df['vdate'].dt.date >= start_date) & (df['vdate'].dt.date <= end_date)
+    if genders:
+        mask &= df['gender'].isin(genders)
+    if depts:
+        mask &= df['facid'].isin(depts)
+    if ages:
+        mask &= df['age_group'].isin(ages)
+    if risks:
+        mask &= df['risk_level'].isin(risks)
+    return np.flatnonzero(mask.to_numpy())
+
+
+def test_filter_index_matches_scan():
+    """Bitmap selection returns exactly the rows of the full-column mask"""
+    index = FilterIndex(df)
+    first, last = index.date_range
+    assert (first, last) == (df['vdate'].min().date(), df['vdate'].max().date())
+
+    cases = [
+        (first, last, ['M', 'F'], index.values('facid'), index.values('age_group'), ['Standard Risk', 'High Risk']),
+        (date(2024, 3, 1), date(2024, 3, 31), ['F'], ['A', 'C'], [], ['High Risk']),
+        (date(2024, 6, 15), date(2024, 6, 15), [], [], ['51-65', '66-80'], []),
+        (date(2030, 1, 1), date(2030, 12, 31), ['M'], [], [], []),
+        (first, last, [], ['Z'], [], []),
+    ]
+    for start, end, genders, depts, ages, risks in cases:
+        expected = _scan_filter(start, end, genders, depts, ages, risks)
+        got = index.select(start, end, gender=genders, facid=depts, age_group=ages, risk_level=risks)
+        assert np.array_equal(got, expected), (start, end, genders, depts, ages, risks)
+
+
+def _scan_history(eid):
+    """Reference: admissions with the same name and date of birth, by admission date"""
+    patient = df[df['eid'] == eid].iloc[0]
+    same_person = (df['full_name'] == patient['full_name']) & (df['Date_of_Birth'] == patient['Date_of_Birth'])
+    return df[same_person].sort_values('vdate', kind='stable').index.to_numpy()
+
+
+def test_person_index_matches_scan():
+    """History lookups return the person's admissions sorted by date, namesakes excluded"""
+    index = PersonIndex(df)
+    for eid in df['eid'].sample(200, random_state=0):
+        assert index.position(eid) == int(np.flatnonzero(df['eid'].to_numpy() == eid)[0])
+        assert np.array_equal(index.history(eid), _scan_history(eid))
+    assert index.position(-1) is None and len(index.history(-1)) == 0
+
+    # Several people share a name; each keeps only their own admissions
+    namesakes = df[df['full_name'] == 'Sharon Brown']
+    assert namesakes['Date_of_Birth'].nunique() > 1
+    for eid in namesakes['eid']:
+        assert df.iloc[index.history(eid)]['Date_of_Birth'].nunique() == 1
+
+
+def test_person_index_extended():
+    """Appended admissions join the existing person's history in date order"""
+    index = PersonIndex(df)
+    eid = int(df['eid'].iloc[0])
+    batch = df.iloc[[0]].copy()
+    batch['eid'] = eid + 10_000_000
+    batch['vdate'] = pd.Timestamp('2025-02-01')
+    extended = index.extended(batch)
+
+    expected = np.append(_scan_history(eid), len(df))
+    assert np.array_equal(extended.history(eid), expected)
+    assert np.array_equal(extended.history(eid + 10_000_000), expected)
+    assert extended.position(eid + 10_000_000) == len(df)
+    # The original index is unchanged
+    assert np.array_equal(index.history(eid), _scan_history(eid))
+
+
+def test_date_rank_sorts_subsets():
+    """Sorting any subset by its precomputed rank matches a sort on the typed vdate"""
+    rank = date_rank(df)
+    assert sorted(rank.tolist()) == list(range(len(df)))
+    subset = df[df['facid'] == 'A']
+    by_rank = subset.iloc[np.argsort(-rank[subset.index.to_numpy()], kind='stable')]
+    assert by_rank['vdate'].is_monotonic_decreasing
+    assert len(by_rank) == len(subset)
+
+
+def _scan_search(frame, term):
+    """Reference: the case-insensitive substring scan the quick search used to run"""
+    mask = np.zeros(len(frame), dtype=bool)
+    for col in ['full_name', 'facid', 'admission_reason']:
+        mask |= frame[col].astype(str).str.contains(term, case=False, regex=False).to_numpy()
+    return np.flatnonzero(mask)
+
+
+def _scan_word_prefix(frame, term):
+    """Reference for queries under 3 characters: rows with a word starting with the term"""
+    term = normalize_text(term)
+    mask = np.zeros(len(frame), dtype=bool)
+    for col in ['full_name', 'facid', 'admission_reason']:
+        values = frame[col].map(normalize_text)
+        mask |= (values.str.startswith(term) | values.str.contains(f" {term}", regex=False)).to_numpy()
+    return np.flatnonzero(mask)
+
+
+def test_search_index_matches_substring_scan():
+    """Exact substring and prefix queries return the same rows as the scan"""
+    index = SearchIndex(df)
+    for term in ['sharon', 'Sharon Brown', 'BRO', 'surgery - hip', 'neumonia', 'xyz']:
+        positions, _ = index.search(term, fuzzy=False)
+        assert np.array_equal(positions, _scan_search(df, term)), term
+
+    # Whole-value and word-prefix matches rank above mid-word ones
+    _, matches = index.search('pneum')
+    assert matches[0][:2] == ('admission_reason', 'pneumonia') and matches[0][2] == 0.9
+    _, matches = index.search('Sharon Brown')
+    assert matches[0] == ('full_name', 'sharon brown', 1.0)
+
+
+def test_short_queries_are_word_prefix_lookups():
+    """1- and 2-letter queries match word prefixes from the indexed grams, without scanning every term"""
+    index = SearchIndex(df)
+    for term in ['an', 'a', 'E', 'sh', 'b']:
+        positions, matches = index.search(term, fuzzy=False)
+        assert np.array_equal(positions, _scan_word_prefix(df, term)), term
+        assert len(matches) == len(index._grams[f" {normalize_text(term)}"]) < len(index._terms)
+        assert all(score >= 0.9 for _, _, score in matches)
+
+
+def test_scored_search_ranks_rows():
+    """Each row carries its best match: exact values above word prefixes above mid-word substrings"""
+    index = SearchIndex(df)
+    positions, scores, matches = index.scored_search('sharon')
+    positions_only, _ = index.search('sharon')
+    assert np.array_equal(positions, positions_only) and len(scores) == len(positions)
+    names = df['full_name'].iloc[positions].map(normalize_text)
+    expected = np.where(names.str.startswith('sharon') | names.str.contains(' sharon', regex=False), 0.9, 0.8)
+    assert np.array_equal(scores, expected) and scores.max() == 0.9
+
+
+def test_search_index_tolerates_typos():
+    """Misspelled names fall back to close trigram matches"""
+    index = SearchIndex(df)
+    positions, matches = index.search('sharn browm')
+    assert matches[0][:2] == ('full_name', 'sharon brown')
+    assert np.array_equal(positions, np.flatnonzero((df['full_name'] == 'Sharon Brown').to_numpy()))
+    assert len(index.search('sharn browm', fuzzy=False)[0]) == 0
+
+    # Walking only the rarest grams' postings finds the same terms as counting every posting
+    for query in ['sharn browm', 'pneumonai', 'jonh smth', 'kidny']:
+        query_grams = trigrams(normalize_text(query))
+        shared = {}
+        for gram in query_grams:
+            for term in index._grams.get(gram, ()):
+                shared[term] = shared.get(term, 0) + 1
+        expected = {term for term, count in shared.items() if count / len(query_grams) >= 0.5}
+        found = index.match_terms(query, max_terms=len(index._terms))
+        assert {term for *_, term in found} == expected, query
+
+
+def test_search_index_extended():
+    """Appended rows are searchable, new values included, without touching the original"""
+    index = SearchIndex(df)
+    batch = df.iloc[:2].copy()
+    batch['full_name'] = ['Zoë Quixote', batch['full_name'].iloc[1]]
+    extended = index.extended(batch)
+
+    positions, _ = extended.search('zoe quix')
+    assert positions.tolist() == [len(df)]
+    name = batch['full_name'].iloc[1]
+    assert np.array_equal(extended.search(name, fuzzy=False)[0],
+                          np.append(index.search(name, fuzzy=False)[0], len(df) + 1))
+    assert len(index.search('zoe quix', fuzzy=False)[0]) == 0
+
+
+if __name__ == "__main__":
+    test_filter_index_matches_scan()
+    test_person_index_matches_scan()
+    test_person_index_extended()
+    test_date_rank_sorts_subsets()
+    test_search_index_matches_substring_scan()
+    test_short_queries_are_word_prefix_lookups()
+    test_scored_search_ranks_rows()
+    test_search_index_tolerates_typos()
+    test_search_index_extended()
+    print("✅ All tests passed!")
@@ -0,0 +1,124 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Accuracy and speed of the KLL quantile sketches against exact pandas quantile()
+"""
+import time
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+from dashboard_stats import SKETCH_COLUMNS
+from patient_data import DATA_FILE, apply_schema, derive_columns, read_raw_csv
+from quantile_sketch import KLLSketch, SketchIndex
+
+QS = [0.05, 0.25, 0.5, 0.75, 0.9, 0.95]
+
+
+def _rank_error(values, estimates, qs=QS):
+    """Largest gap between the requested rank and the rank of each estimate"""
+    values = np.sort(np.asarray(values, dtype=np.float64))
+    ranks = np.searchsorted(values, estimates, side='right') / len(values)
+    return float(np.max(np.abs(ranks - np.asarray(qs))))
+
+
+def test_small_sketch_is_exact():
+    """Below k values the sketch matches pandas' linear interpolation"""
+    values = np.random.default_rng(0).normal(size=150)
+    sketch = KLLSketch(k=200).update(values)
+    assert np.allclose(sketch.quantile(QS), pd.Series(values).quantile(QS).to_numpy())
+
+
+def test_sketch_rank_error_and_merge():
+    """Streamed and merged sketches stay within 1% rank error"""
+    rng = np.random.default_rng(1)
+    values = rng.lognormal(1.5, 0.6, size=400_000)
+
+    whole = KLLSketch(seed=0)
+    for chunk in np.array_split(values, 40):
+        whole.update(chunk)
+    assert _rank_error(values, whole.quantile(QS)) < 0.01
+
+    merged = KLLSketch(seed=0)
+    for chunk in np.array_split(values, 16):
+        merged.merge(KLLSketch(seed=0).update(chunk))
+    assert len(merged) == len(values)
+    assert _rank_error(values, merged.quantile(QS)) < 0.01
+
+    restored = KLLSketch.from_dict(merged.to_dict())
+    assert np.allclose(restored.quantile(QS), merged.quantile(QS))
+
+
+def _synthetic_frame(n, seed=2):
+    rng = np.random.default_rng(seed)
+    vdate = pd.Timestamp('2024-01-01') + pd.to_timedelta(rng.integers(0, 366, size=n), unit='D')
+    df = pd.DataFrame({
+        'vdate': vdate,
+        'facid': pd.Categorical(rng.choice(list('ABCDE'), size=n)),
+        'lengthofstay': rng.integers(1, 18, size=n),
+        **{col: rng.lognormal(0, 0.5, size=n) for col in SKETCH_COLUMNS[1:]},
+    })
+    df['month'] = df['vdate'].dt.to_period('M').astype(str).astype('category')
+    return df
+
+
+def test_sketch_index_accuracy_vs_speed():
+    """Department/month selections match exact quantiles within 1% rank error, faster"""
+    df = _synthetic_frame(300_000)
+    index = SketchIndex(df, SKETCH_COLUMNS)
+
+    start, end = date(2024, 3, 1), date(2024, 8, 31)
+    months = index.months_within(start, end)
+    assert months == ['2024-03', '2024-04', '2024-05', '2024-06', '2024-07', '2024-08']
+    # A range that cuts through a month cannot be answered from whole cells
+    assert index.months_within(date(2024, 3, 15), end) is None
+
+    t0 = time.perf_counter()
+    mask = (df['facid'].isin(['A', 'C'])) & (df['vdate'] >= pd.Timestamp(start)) & (df['vdate'] <= pd.Timestamp(end))
+    subset = df.loc[mask, 'glucose']
+    exact = subset.quantile([0.05, 0.95]).to_numpy()
+    exact_time = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    approx = index.quantile('glucose', [0.05, 0.95], facids=['A', 'C'], months=months)
+    sketch_time = time.perf_counter() - t0
+
+    assert _rank_error(subset, approx, [0.05, 0.95]) < 0.01
+    assert np.allclose(approx, exact, rtol=0.05)
+    assert sketch_time < exact_time
+
+    # Repeated selections reuse the merged sketch
+    t0 = time.perf_counter()
+    index.quantile('glucose', [0.05, 0.95], facids=['C', 'A'], months=months)
+    assert time.perf_counter() - t0 < sketch_time
+
+
+def test_sketch_index_extended():
+    """Folding in new admissions matches an index built over everything and leaves the old index as it was"""
+    df = _synthetic_frame(60_000)
+    old = SketchIndex(df.iloc[:50_000], SKETCH_COLUMNS)
+    before = old.quantile('lengthofstay', 0.75)  # populate the merged cache
+    index = old.extended(df.iloc[50_000:])
+    assert len(index.sketch('lengthofstay')) == len(df)
+    assert len(old.sketch('lengthofstay')) == 50_000 and old.quantile('lengthofstay', 0.75) == before
+    assert sum(len(cell) for cell in old._cells['glucose'].values()) == 50_000
+    assert _rank_error(df['lengthofstay'], [index.quantile('lengthofstay', 0.75)], [0.75]) < 0.02
+
+
+def test_sketch_index_on_patient_data():
+    """LOS percentiles over the real extract agree with the exact thresholds"""
+    df = apply_schema(derive_columns(read_raw_csv(DATA_FILE)))
+    index = SketchIndex(df, SKETCH_COLUMNS)
+    for q in (0.75, 0.9):
+        approx = index.quantile('lengthofstay', q)
+        assert abs(approx - df['lengthofstay'].quantile(q)) <= 1
+
+
+if __name__ == "__main__":
+    test_small_sketch_is_exact()
+    test_sketch_rank_error_and_merge()
+    test_sketch_index_accuracy_vs_speed()
+    test_sketch_index_extended()
+    test_sketch_index_on_patient_data()
+    print("✅ All tests passed!")
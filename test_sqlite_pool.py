@@ -0,0 +1,141 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Tests for the read-only SQLite connection pool behind RAG retrieval
+"""
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from rag_system import RAGSystem
+from sqlite_pool import ReadOnlyConnectionPool
+
+CHUNKS = [
+    ("anemia.pdf", "Anemia prolongs length of stay", "Kim et al.", 2019,
+     "Anemic patients had longer hospital stays and higher readmission rates."),
+    ("pneumonia.pdf", "Length of stay in pneumonia", "Rodriguez et al.", 2018,
+     "Pneumonia patients with comorbidities stay longer in hospital."),
+    ("asthma.pdf", "Adult asthma hospitalization", "Chen et al.", 2017,
+     "Asthma exacerbations average a short length of stay."),
+]
+
+
+def _make_paper_db(path):
+    conn = sqlite3.connect(path)
+    conn.execute('''
+        CREATE TABLE paper_chunks (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            filename TEXT NOT NULL, title TEXT, authors TEXT, year INTEGER,
+            content TEXT NOT NULL, chunk_text TEXT NOT NULL, chunk_index INTEGER, embedding TEXT
+        )
+    ''')
+    for i, (filename, title, authors, year, text) in enumerate(CHUNKS):
+        conn.execute('INSERT INTO paper_chunks (filename, title, authors, year, content, chunk_text, chunk_index) '
+                     'VALUES (?, ?, ?, ?, ?, ?, ?)', (filename, title, authors, year, text, text, i))
+    conn.commit()
+    conn.close()
+
+
+def _open_fds():
+    return len(os.listdir('/proc/self/fd')) if os.path.isdir('/proc/self/fd') else 0
+
+
+def test_pool_is_bounded_and_read_only():
+    """Connections are reused, never exceed max_size and refuse writes"""
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        db_path = os.path.join(tmp_dir, "papers.db")
+        _make_paper_db(db_path)
+        pool = ReadOnlyConnectionPool(db_path, max_size=3)
+
+        def count(_):
+            return pool.execute("SELECT COUNT(*) FROM paper_chunks")[0][0]
+
+        with ThreadPoolExecutor(max_workers=12) as executor:
+            assert set(executor.map(count, range(200))) == {len(CHUNKS)}
+        assert 1 <= pool.open_connections <= 3
+
+        try:
+            pool.execute("DELETE FROM paper_chunks")
+        except sqlite3.OperationalError:
+            pass
+        else:
+            raise AssertionError("pooled connections must be read-only")
+        assert pool.execute("SELECT COUNT(*) FROM paper_chunks")[0][0] == len(CHUNKS)
+
+        pool.close()
+        assert pool.open_connections == 0
+    finally:
+        shutil.rmtree(tmp_dir)
+
+
+def test_discarded_connection_frees_its_slot():
+    """A connection dropped after a database error lets a waiting thread open a replacement"""
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        db_path = os.path.join(tmp_dir, "papers.db")
+        _make_paper_db(db_path)
+        pool = ReadOnlyConnectionPool(db_path, max_size=1, timeout=5.0)
+        borrowed = threading.Event()
+        waited = []
+
+        def waiter():
+            borrowed.wait()
+            started = time.monotonic()
+            waited.append((pool.execute("SELECT COUNT(*) FROM paper_chunks")[0][0], time.monotonic() - started))
+
+        thread = threading.Thread(target=waiter)
+        thread.start()
+        try:
+            with pool.connection() as conn:
+                borrowed.set()
+                time.sleep(0.2)
+                conn.execute("SELECT * FROM no_such_table")
+        except sqlite3.OperationalError:
+            pass
+        thread.join(5)
+        assert waited and waited[0][0] == len(CHUNKS) and waited[0][1] < 2.0
+        assert pool.open_connections == 1
+
+        pool.close()
+        assert pool.open_connections == 0
+    finally:
+        shutil.rmtree(tmp_dir)
+
+
+def test_rag_search_reuses_connections():
+    """Concurrent searches return the same results without leaking file descriptors"""
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        db_path = os.path.join(tmp_dir, "papers.db")
+        _make_paper_db(db_path)
+        rag = RAGSystem(db_path=db_path)
+        assert rag.schema == 'paper_chunks'
+
+        expected = [paper['filename'] for paper in rag.search_relevant_papers("pneumonia length of stay", top_k=2)]
+        assert expected[0] == "pneumonia.pdf"
+
+        fds_before = _open_fds()
+        with ThreadPoolExecutor(max_workers=16) as executor:
+            results = list(executor.map(
+                lambda _: [p['filename'] for p in rag.search_relevant_papers("pneumonia length of stay", top_k=2)],
+                range(300)))
+        assert all(result == expected for result in results)
+        assert rag._pool.open_connections <= rag._pool.max_size
+        assert _open_fds() - fds_before <= rag._pool.max_size
+
+        rag.close()
+        assert rag._pool.open_connections == 0
+    finally:
+        shutil.rmtree(tmp_dir)
+
+
+if __name__ == "__main__":
+    test_pool_is_bounded_and_read_only()
+    test_discarded_connection_frees_its_slot()
+    test_rag_search_reuses_connections()
+    print("✅ All tests passed!")
@@ -0,0 +1,151 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Tests for the background summary warm-up of high-risk patients
+"""
+import threading
+from types import SimpleNamespace
+
+import pandas as pd
+
+from disk_cache import TwoTierCache
+from llm_client import open_chat_stream
+from summary_prewarm import SummaryPrewarmer, prewarm_order
+
+
+class FakeCompletionClient:
+    """Stands in for openai.OpenAI; non-streamed completions, failing with the queued errors first"""
+
+    def __init__(self, errors=()):
+        self.errors = list(errors)
+        self.calls = []
+        self.lock = threading.Lock()
+        self.chat = SimpleNamespace(completions=self)
+
+    def create(self, stream=False, **kwargs):
+        with self.lock:
+            self.calls.append(kwargs['messages'][0]['content'])
+            if self.errors:
+                raise self.errors.pop(0)
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(
+            content=f"Summary of {kwargs['messages'][0]['content']}"))])
+
+
+def _patients():
+    return pd.DataFrame({
+        'eid': [1, 2, 3, 4, 5],
+        'risk_level': ['High Risk', 'Standard Risk', 'High Risk', 'High Risk', 'Standard Risk'],
+        'vdate': pd.to_datetime(['2024-01-05', '2024-03-01', '2024-02-10', '2024-01-20', '2024-02-01']),
+    })
+
+
+def _request(eid):
+    return dict(model="gpt-4o", messages=[{"role": "user", "content": f"patient {eid}"}], max_tokens=300)
+
+
+def _prewarmer(client, cache=None, **kwargs):
+    prewarmer = SummaryPrewarmer(_request, TwoTierCache() if cache is None else cache, backoff_base=0.01, **kwargs)
+    prewarmer.set_client(client)
+    return prewarmer
+
+
+def test_high_risk_patients_newest_first():
+    """Only high-risk admissions are warmed, newly admitted ones first, then by admission date"""
+    assert [eid for eid, _ in prewarm_order(_patients())] == [3, 4, 1]
+
+    client = FakeCompletionClient()
+    prewarmer = _prewarmer(client, workers=1)
+    assert prewarmer.schedule(_patients()) == 3
+    admitted = pd.DataFrame({'eid': [6], 'risk_level': ['High Risk'], 'vdate': pd.to_datetime(['2023-12-01'])})
+    assert prewarmer.schedule(pd.concat([_patients(), admitted]), newly_admitted=True) == 1
+    prewarmer.start()
+    assert prewarmer.join(timeout=5)
+    prewarmer.stop()
+    assert client.calls == ["patient 6", "patient 3", "patient 4", "patient 1"]
+    status = prewarmer.status()
+    assert (status['warmed'], status['queued'], status['scheduled'], status['state']) == (4, 0, 4, 'stopped')
+
+
+def test_page_replays_warm_entries():
+    """A prewarmed summary is served to the page's streamed request without an API call"""
+    cache = TwoTierCache()
+    client = FakeCompletionClient()
+    prewarmer = _prewarmer(client, cache)
+    prewarmer.schedule(_patients())
+    prewarmer.start()
+    assert prewarmer.join(timeout=5)
+    prewarmer.stop()
+    calls = len(client.calls)
+    assert list(open_chat_stream(client, cache=cache, **_request(4))) == ["Summary of patient 4"]
+    assert len(client.calls) == calls
+
+    # Restarted worker: everything is already warm
+    again = _prewarmer(client, cache)
+    again.schedule(_patients())
+    again.start()
+    assert again.join(timeout=5)
+    again.stop()
+    assert again.status()['already_warm'] == 3 and len(client.calls) == calls
+
+
+def test_rate_limits_back_off_and_retry():
+    """Rate-limited patients are requeued after a backoff; other errors are retried a bounded number of times"""
+    client = FakeCompletionClient([Exception("Error code: 429 rate_limit_exceeded")] * 2 + [RuntimeError("boom")] * 3)
+    prewarmer = _prewarmer(client, workers=1, max_attempts=2)
+    prewarmer.schedule(_patients())
+    prewarmer.start()
+    assert prewarmer.join(timeout=5)
+    prewarmer.stop()
+    status = prewarmer.status()
+    # patient 3: two rate limits, then two errors (gives up); patient 4: one error, then warmed
+    assert client.calls == ["patient 3"] * 4 + ["patient 4"] * 2 + ["patient 1"]
+    assert (status['rate_limited'], status['failed'], status['warmed']) == (2, 1, 2)
+
+
+def test_key_errors_pause_until_new_client():
+    """An invalid key pauses the workers with the patient still queued; a new client resumes them"""
+    bad = FakeCompletionClient([Exception("Error code: 401 - Incorrect API key")])
+    prewarmer = _prewarmer(bad, workers=1)
+    prewarmer.schedule(_patients())
+    prewarmer.start()
+    assert not prewarmer.join(timeout=0.3)
+    status = prewarmer.status()
+    assert status['state'] == 'paused' and "API密钥无效" in status['last_error'] and status['queued'] == 3
+
+    good = FakeCompletionClient()
+    prewarmer.set_client(good)
+    assert prewarmer.join(timeout=5)
+    prewarmer.stop()
+    assert good.calls == ["patient 3", "patient 4", "patient 1"]
+
+
+
+def test_rotated_key_resumes_without_new_client_call():
+    """With a client_factory the paused workers pick up a rotated key themselves; the same key stays paused"""
+    bad = FakeCompletionClient([Exception("Error code: 401 - Incorrect API key")])
+    good = FakeCompletionClient()
+    current = {'client': bad}
+    factory_calls = []
+
+    def client_factory():
+        factory_calls.append(1)
+        return current['client']
+
+    prewarmer = SummaryPrewarmer(_request, TwoTierCache(), workers=1, client_factory=client_factory, key_recheck=0.05)
+    prewarmer.schedule(_patients())
+    prewarmer.start()
+    assert not prewarmer.join(timeout=1.2)
+    assert prewarmer.status()['state'] == 'paused' and len(factory_calls) > 1 and len(bad.calls) == 1
+
+    current['client'] = good
+    assert prewarmer.join(timeout=5)
+    prewarmer.stop()
+    assert good.calls == ["patient 3", "patient 4", "patient 1"]
+
+if __name__ == "__main__":
+    test_high_risk_patients_newest_first()
+    test_page_replays_warm_entries()
+    test_rate_limits_back_off_and_retry()
+    test_key_errors_pause_until_new_client()
+    test_rotated_key_resumes_without_new_client_call()
+    print("✅ All tests passed!")
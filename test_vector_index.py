@@ -0,0 +1,273 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Tests for the in-memory vector index used by RAG vector search
+"""
+import json
+import os
+import shutil
+import sqlite3
+import tempfile
+
+import numpy as np
+
+from rag_system import RAGSystem
+from vector_index import EmbeddingStoreWriter, IVFIndex, VectorIndex, build_ann_index, sidecar_path, table_fingerprint
+
+
+def _brute_force(matrix, query, k):
+    """Reference cosine top-k in float64"""
+    matrix = np.asarray(matrix, dtype=np.float64)
+    scores = matrix @ query / (np.linalg.norm(matrix, axis=1) * np.linalg.norm(query))
+    order = np.argsort(-scores)[:k]
+    return order, scores[order]
+
+
+def test_search_matches_brute_force_cosine():
+    """Blocked argpartition top-k equals a full cosine ranking"""
+    rng = np.random.default_rng(0)
+    matrix = rng.standard_normal((5000, 64))
+    index = VectorIndex(np.arange(5000) + 100, matrix, block_rows=700)
+    for _ in range(5):
+        query = rng.standard_normal(64)
+        ids, scores = index.search(query, k=10)
+        expected, expected_scores = _brute_force(matrix, query, 10)
+        assert np.array_equal(ids, expected + 100)
+        assert np.allclose(scores, expected_scores, atol=1e-5)
+    assert len(index.search(np.zeros(64), k=5)[0]) == 0
+    assert len(index.search(rng.standard_normal(64), k=50_000)[0]) == 5000
+
+
+def test_store_round_trip():
+    """Stores load back memory-mapped or in RAM, in float32 or float16, and stale meta is rejected"""
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        rng = np.random.default_rng(1)
+        index = VectorIndex(np.arange(300) * 2, rng.standard_normal((300, 16)))
+        query = rng.standard_normal(16)
+        for dtype, itemsize in (('float32', 4), ('float16', 2)):
+            path = os.path.join(tmp_dir, f"papers.{dtype}.vectors")
+            index.save(path, {'max_id': 598}, dtype=dtype)
+            assert os.path.getsize(path) == 300 * 16 * itemsize
+
+            for mmap in (False, True):
+                loaded = VectorIndex.load(path, mmap=mmap, expected_meta={'max_id': 598})
+                assert isinstance(loaded.matrix, np.memmap) == mmap
+                assert loaded.matrix.dtype == np.dtype(dtype)
+                assert np.array_equal(loaded.search(query, 5)[0], index.search(query, 5)[0])
+                assert np.allclose(loaded.search(query, 5)[1], index.search(query, 5)[1], atol=2e-3)
+            assert VectorIndex.load(path, expected_meta={'max_id': 600}) is None
+
+        # The offset table maps chunk ids back to rows; unknown ids are dropped
+        ids, vectors = loaded.vectors([10, 7, 0])
+        assert ids.tolist() == [10, 0]
+        assert np.allclose(vectors, index.matrix[[5, 0]], atol=2e-3)
+
+        # A truncated row file is not trusted
+        with open(path, 'r+b') as f:
+            f.truncate(100)
+        assert VectorIndex.load(path) is None
+        assert VectorIndex.load(os.path.join(tmp_dir, "missing.vectors")) is None
+    finally:
+        shutil.rmtree(tmp_dir)
+
+
+def test_writer_streams_and_publishes_atomically():
+    """Rows appended one at a time match a bulk save; an aborted write keeps the old store"""
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        rng = np.random.default_rng(3)
+        matrix = rng.standard_normal((50, 8))
+        path = os.path.join(tmp_dir, "db.chunks.vectors")
+        with EmbeddingStoreWriter(path) as writer:
+            for chunk_id, vector in enumerate(matrix, start=1):
+                writer.add(chunk_id, vector.tolist())
+        streamed = VectorIndex.load(path)
+        expected = VectorIndex(np.arange(1, 51), matrix)
+        assert np.allclose(np.asarray(streamed.matrix), expected.matrix)
+
+        try:
+            with EmbeddingStoreWriter(path) as writer:
+                writer.add(1, matrix[0])
+                writer.add(2, matrix[0][:4])
+        except ValueError:
+            pass
+        else:
+            raise AssertionError("mismatched dimensions must be rejected")
+        assert len(VectorIndex.load(path)) == 50
+        assert sorted(os.listdir(tmp_dir)) == ["db.chunks.vectors", "db.chunks.vectors.ids.npy",
+                                              "db.chunks.vectors.json"]
+    finally:
+        shutil.rmtree(tmp_dir)
+
+
+def _clustered(rng, rows, dim, topics=40):
+    centres = rng.standard_normal((topics, dim))
+    return centres[rng.integers(0, topics, rows)] + 0.4 * rng.standard_normal((rows, dim))
+
+
+def test_ivf_recall_and_exact_rerank():
+    """IVF search finds nearly all exact neighbours, with exact scores, and all of them when every list is probed"""
+    rng = np.random.default_rng(5)
+    matrix = _clustered(rng, 6000, 32)
+    index = VectorIndex(np.arange(6000), matrix)
+    index.ann = IVFIndex.build(index, nlist=40)
+    queries = matrix[rng.integers(0, 6000, 30)] + 0.4 * rng.standard_normal((30, 32))
+
+    recalls = []
+    for query in queries:
+        exact_ids, exact_scores = index.search(query, 10)
+        ann_ids, ann_scores = index.search(query, 10, nprobe=4, rerank=50)
+        recalls.append(len(set(ann_ids) & set(exact_ids)) / 10)
+        # Reranked scores are the exact cosine similarities
+        assert np.allclose(ann_scores, index.matrix[np.searchsorted(index.ids, ann_ids)] @ (query / np.linalg.norm(query)),
+                           atol=1e-5)
+        full_ids, _ = index.search(query, 10, nprobe=40, rerank=6000)
+        assert np.array_equal(full_ids, exact_ids)
+    assert np.mean(recalls) >= 0.9
+
+    # nprobe=None keeps exact search even with an index attached
+    assert np.array_equal(index.search(queries[0], 5, nprobe=None)[0], index.search(queries[0], 5)[0])
+
+
+def test_build_ann_index_only_for_large_stores():
+    """Ingestion builds the IVF files above min_rows, drops them below, and stale ones are ignored"""
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        rng = np.random.default_rng(7)
+        path = os.path.join(tmp_dir, "db.chunks.vectors")
+        VectorIndex(np.arange(3000), _clustered(rng, 3000, 16)).save(path, {'max_id': 2999})
+
+        assert build_ann_index(path, {'max_id': 2999}, min_rows=1000, nlist=20) is not None
+        loaded = IVFIndex.load(path, expected_meta={'max_id': 2999})
+        assert loaded.nlist == 20 and isinstance(loaded.codes, np.memmap)
+        assert IVFIndex.load(path, expected_meta={'max_id': 3000}) is None
+
+        assert build_ann_index(path, {'max_id': 2999}, min_rows=5000) is None
+        assert IVFIndex.load(path) is None
+        assert not any(name.endswith(('.ivf.npy', '.ivf.npz')) for name in os.listdir(tmp_dir))
+    finally:
+        shutil.rmtree(tmp_dir)
+
+
+def _make_chunk_db(db_path, embeddings, with_json):
+    conn = sqlite3.connect(db_path)
+    conn.execute('CREATE TABLE papers (id INTEGER PRIMARY KEY, filename TEXT, title TEXT)')
+    conn.execute('CREATE TABLE chunks (id INTEGER PRIMARY KEY, paper_id INTEGER, chunk_text TEXT, embedding TEXT)')
+    conn.executemany('INSERT INTO papers VALUES (?, ?, ?)', [(1, 'a.pdf', 'A'), (2, 'b.pdf', 'B')])
+    conn.executemany('INSERT INTO chunks VALUES (?, ?, ?, ?)',
+                     [(i + 1, 1 + i % 2, f'chunk {i}', json.dumps(vec.tolist()) if with_json else None)
+                      for i, vec in enumerate(embeddings)])
+    conn.commit()
+    return conn
+
+
+def test_rag_vector_search_uses_index():
+    """RAGSystem ranks chunks like the JSON/cosine scan and migrates JSON embeddings to a store once"""
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        rng = np.random.default_rng(2)
+        db_path = os.path.join(tmp_dir, "papers_rag.db")
+        embeddings = rng.standard_normal((40, 32))
+        _make_chunk_db(db_path, embeddings, with_json=True).close()
+
+        query = rng.standard_normal(32)
+        # Random vectors are far apart, so the similarity floor is lifted to compare pure rankings
+        rag = RAGSystem(db_path=db_path, min_similarity=-1.0)
+        rag.get_embedding = lambda text, api_key=None: query
+        assert rag.schema == 'chunks' and not rag.has_fts
+
+        results = rag.search_relevant_papers("anything", top_k=5)
+        expected, _ = _brute_force(embeddings, query, 5)
+        assert [r['chunk_id'] for r in results] == (expected + 1).tolist()
+        assert results[0]['relevance'] == 1.0 and results[0]['retrieved_by'] == ['vector']
+        assert all(a['relevance'] > b['relevance'] for a, b in zip(results, results[1:]))
+        assert results[0]['filename'] == ('a.pdf' if expected[0] % 2 == 0 else 'b.pdf')
+        assert os.path.exists(sidecar_path(db_path))
+
+        # A fresh process maps the store instead of decoding JSON again
+        reloaded = RAGSystem(db_path=db_path, min_similarity=-1.0)
+        reloaded.get_embedding = lambda text, api_key=None: query
+        assert [r['chunk_id'] for r in reloaded.search_relevant_papers("anything", top_k=5)] == (expected + 1).tolist()
+        assert isinstance(reloaded._get_vector_index().matrix, np.memmap)
+        rag.close()
+        reloaded.close()
+    finally:
+        shutil.rmtree(tmp_dir)
+
+
+def test_rag_reads_store_written_at_ingestion():
+    """A database without JSON embeddings is searched through the store the ingestion wrote"""
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        rng = np.random.default_rng(4)
+        db_path = os.path.join(tmp_dir, "papers_rag.db")
+        embeddings = rng.standard_normal((30, 16))
+        conn = _make_chunk_db(db_path, embeddings, with_json=False)
+        writer = EmbeddingStoreWriter(sidecar_path(db_path, 'chunks'), dtype='float16')
+        writer.add_many(list(range(1, 31)), embeddings)
+        writer.close(table_fingerprint(conn, 'chunks'))
+        conn.close()
+
+        query = rng.standard_normal(16)
+        rag = RAGSystem(db_path=db_path, min_similarity=-1.0)
+        rag.get_embedding = lambda text, api_key=None: query
+        expected, _ = _brute_force(embeddings, query, 3)
+        assert [r['chunk_id'] for r in rag.search_relevant_papers("anything", top_k=3)] == (expected + 1).tolist()
+        rag.close()
+
+        # Rows added after ingestion make the store stale; without JSON there is nothing to rebuild from
+        conn = sqlite3.connect(db_path)
+        conn.execute("INSERT INTO chunks VALUES (31, 1, 'late chunk', NULL)")
+        conn.commit()
+        conn.close()
+        stale = RAGSystem(db_path=db_path, min_similarity=-1.0)
+        stale.get_embedding = lambda text, api_key=None: query
+        assert stale.search_relevant_papers("anything", top_k=3) == []
+        stale.close()
+        assert os.path.getsize(sidecar_path(db_path, 'chunks')) == 30 * 16 * 2
+        assert stale._get_vector_index().ann is None
+    finally:
+        shutil.rmtree(tmp_dir)
+
+
+def test_rag_uses_ann_index():
+    """RAGSystem attaches the IVF index built at ingestion and honours its nprobe knob"""
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        rng = np.random.default_rng(8)
+        db_path = os.path.join(tmp_dir, "papers_rag.db")
+        embeddings = _clustered(rng, 400, 16, topics=10)
+        conn = _make_chunk_db(db_path, embeddings, with_json=False)
+        writer = EmbeddingStoreWriter(sidecar_path(db_path, 'chunks'))
+        writer.add_many(list(range(1, 401)), embeddings)
+        fingerprint = table_fingerprint(conn, 'chunks')
+        writer.close(fingerprint)
+        conn.close()
+        assert build_ann_index(sidecar_path(db_path, 'chunks'), fingerprint, min_rows=100, nlist=10) is not None
+
+        query = embeddings[17]
+        exact = RAGSystem(db_path=db_path, ann_nprobe=None)
+        exact.get_embedding = lambda text, api_key=None: query
+        approximate = RAGSystem(db_path=db_path, ann_nprobe=10, ann_rerank=400)
+        approximate.get_embedding = lambda text, api_key=None: query
+        assert approximate._get_vector_index().ann.nlist == 10
+        expected = [r['chunk_id'] for r in exact.search_relevant_papers("anything", top_k=5)]
+        assert expected[0] == 18
+        assert [r['chunk_id'] for r in approximate.search_relevant_papers("anything", top_k=5)] == expected
+        exact.close()
+        approximate.close()
+    finally:
+        shutil.rmtree(tmp_dir)
+
+
+if __name__ == "__main__":
+    test_search_matches_brute_force_cosine()
+    test_store_round_trip()
+    test_writer_streams_and_publishes_atomically()
+    test_rag_vector_search_uses_index()
+    test_ivf_recall_and_exact_rerank()
+    test_build_ann_index_only_for_large_stores()
+    test_rag_reads_store_written_at_ingestion()
+    test_rag_uses_ann_index()
+    print("✅ All tests passed!")
@@ -0,0 +1,407 @@
+#!/usr/bin/env python3
+"""
+Exact cosine-similarity vector index over chunk embeddings
+
+Embeddings live in a compact on-disk store next to the RAG database:
+  <db>.<table>.vectors           fixed-width rows, float32 or float16, L2-normalized
+  <db>.<table>.vectors.ids.npy   chunk id of each row (the offset table)
+  <db>.<table>.vectors.json      dim, dtype, rows and the table fingerprint
+The row file is memory-mapped, so opening it costs the same at any corpus
+size and every process shares the same page-cache pages.
+
+Large stores can also carry an IVF index (<store>.ivf.npy, <store>.ivf.npz): a
+k-means coarse quantizer whose inverted lists hold int8 codes of the rows.
+A query scans only the nprobe closest lists and reranks the best candidates
+exactly against the store.
+"""
+
+import json
+import os
+
+import numpy as np
+
+STORE_DTYPES = ('float32', 'float16')
+
+# Stores below this size are scanned exactly; the IVF index only pays off above it
+ANN_MIN_ROWS = 200_000
+
+
+def sidecar_path(db_path, table='chunks'):
+    """Where the embedding store for a RAG table is kept, next to the database"""
+    return f"{os.path.splitext(db_path)[0]}.{table}.vectors"
+
+
+def _meta_path(path):
+    return f"{path}.json"
+
+
+def _ids_path(path):
+    return f"{path}.ids.npy"
+
+
+def _ivf_path(path):
+    return f"{path}.ivf.npz"
+
+
+def _ivf_codes_path(path):
+    return f"{path}.ivf.npy"
+
+
+def table_fingerprint(conn, table):
+    """Row count and max id of a chunk table; a store is only used while these match"""
+    count, max_id = conn.execute(f'SELECT COUNT(*), COALESCE(MAX(id), 0) FROM {table}').fetchone()
+    return {'rows_in_db': count, 'max_id': max_id}
+
+
+def normalize_rows(matrix):
+    """L2-normalize rows in place (zero rows stay zero)"""
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    np.divide(matrix, norms, out=matrix, where=norms > 0)
+    return matrix
+
+
+class EmbeddingStoreWriter:
+    """Stream embeddings into a store as they are generated during ingestion
+
+    Rows go to a temporary file; close() moves the row file, offset table and
+    meta into place, so readers never see a half-written store.
+    """
+
+    def __init__(self, path, dtype='float32'):
+        if dtype not in STORE_DTYPES:
+            raise ValueError(f"Unsupported embedding dtype: {dtype}")
+        self.path = path
+        self.dtype = np.dtype(dtype)
+        self.dim = None
+        self.ids = []
+        self._tmp_path = f"{path}.{os.getpid()}.tmp"
+        self._file = open(self._tmp_path, 'wb')
+
+    def add(self, chunk_id, embedding):
+        """Append one embedding (normalized here) for chunk_id"""
+        vector = normalize_rows(np.asarray(embedding, dtype=np.float32).reshape(1, -1).copy())
+        if self.dim is None:
+            self.dim = vector.shape[1]
+        elif vector.shape[1] != self.dim:
+            raise ValueError(f"Embedding has {vector.shape[1]} dimensions, store has {self.dim}")
+        self._file.write(vector.astype(self.dtype).tobytes())
+        self.ids.append(chunk_id)
+
+    def add_many(self, chunk_ids, matrix):
+        """Append a block of embeddings"""
+        for start in range(0, len(chunk_ids), 65536):
+            block = normalize_rows(np.array(matrix[start:start + 65536], dtype=np.float32))
+            if self.dim is None:
+                self.dim = block.shape[1]
+            elif block.shape[1] != self.dim:
+                raise ValueError(f"Embeddings have {block.shape[1]} dimensions, store has {self.dim}")
+            self._file.write(block.astype(self.dtype).tobytes())
+        self.ids.extend(chunk_ids)
+
+    def close(self, meta=None):
+        """Publish the store with meta (typically table_fingerprint of the source table)"""
+        self._file.close()
+        meta_path = _meta_path(self.path)
+        # Invalidate the old store first; the meta file is written last
+        if os.path.exists(meta_path):
+            os.remove(meta_path)
+        os.replace(self._tmp_path, self.path)
+        np.save(_ids_path(self.path), np.asarray(self.ids, dtype=np.int64))
+        with open(meta_path, 'w', encoding='utf-8') as f:
+            json.dump({'rows': len(self.ids), 'dim': self.dim or 0, 'dtype': self.dtype.name, **(meta or {})}, f)
+
+    def abort(self):
+        """Drop the partial store and leave any published one untouched"""
+        self._file.close()
+        if os.path.exists(self._tmp_path):
+            os.remove(self._tmp_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+class VectorIndex:
+    """Contiguous L2-normalized matrix of embeddings plus their chunk ids
+
+    A query is one matrix-vector product and an argpartition for the top k,
+    done in row blocks so a memory-mapped matrix never has to fit in RAM
+    (float16 stores are widened to float32 one block at a time).
+    """
+
+    def __init__(self, ids, matrix, normalized=False, block_rows=65536):
+        self.ids = np.asarray(ids, dtype=np.int64)
+        self.ann = None
+        self._order = None
+        if normalized:
+            self.matrix = matrix
+        else:
+            self.matrix = normalize_rows(np.ascontiguousarray(matrix, dtype=np.float32).copy())
+        self.block_rows = block_rows
+
+    @classmethod
+    def from_json_rows(cls, rows):
+        """Build from (chunk id, JSON embedding) rows, decoding each embedding once"""
+        ids, vectors = [], []
+        for chunk_id, embedding_json in rows:
+            try:
+                vectors.append(np.asarray(json.loads(embedding_json), dtype=np.float32))
+                ids.append(chunk_id)
+            except (TypeError, ValueError):
+                continue
+        if not vectors:
+            return cls(np.empty(0, dtype=np.int64), np.empty((0, 0), dtype=np.float32))
+        return cls(ids, np.vstack(vectors))
+
+    def __len__(self):
+        return len(self.ids)
+
+    @property
+    def dim(self):
+        return self.matrix.shape[1] if self.matrix.ndim == 2 else 0
+
+    def save(self, path, meta=None, dtype='float32'):
+        """Write the matrix as an embedding store at path"""
+        writer = EmbeddingStoreWriter(path, dtype=dtype)
+        try:
+            writer.add_many(self.ids.tolist(), self.matrix)
+        except BaseException:
+            writer.abort()
+            raise
+        writer.close(meta)
+
+    @classmethod
+    def load(cls, path, mmap=True, expected_meta=None):
+        """Open a store; None when missing, inconsistent or when its meta does not match expected_meta"""
+        try:
+            with open(_meta_path(path), 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            if expected_meta and any(meta.get(key) != value for key, value in expected_meta.items()):
+                return None
+            rows, dim, dtype = meta['rows'], meta['dim'], np.dtype(meta.get('dtype', 'float32'))
+            if os.path.getsize(path) != rows * dim * dtype.itemsize:
+                return None
+            ids = np.load(_ids_path(path), mmap_mode='r' if mmap else None)
+            if len(ids) != rows:
+                return None
+            if rows == 0:
+                matrix = np.empty((0, dim), dtype=dtype)
+            elif mmap:
+                matrix = np.memmap(path, dtype=dtype, mode='r', shape=(rows, dim))
+            else:
+                matrix = np.fromfile(path, dtype=dtype).reshape(rows, dim)
+        except (OSError, ValueError, KeyError):
+            return None
+        return cls(ids, matrix, normalized=True)
+
+    def vectors(self, chunk_ids):
+        """Stored (normalized) float32 embeddings for chunk_ids via the offset table; unknown ids are dropped"""
+        chunk_ids = np.asarray(chunk_ids, dtype=np.int64)
+        if len(self) == 0:
+            return chunk_ids[:0], np.empty((0, self.dim), dtype=np.float32)
+        if self._order is None:
+            self._order = np.argsort(self.ids, kind='stable')
+        sorted_ids = self.ids[self._order]
+        pos = np.minimum(np.searchsorted(sorted_ids, chunk_ids), len(sorted_ids) - 1)
+        found = sorted_ids[pos] == chunk_ids
+        rows = self._order[pos[found]]
+        return chunk_ids[found], np.asarray(self.matrix[rows], dtype=np.float32)
+
+    def search(self, query, k=10, nprobe=None, rerank=200):
+        """Top-k (chunk ids, cosine similarities), best first
+
+        With an IVF index attached (self.ann) and nprobe set, only the nprobe
+        closest inverted lists are scanned and the best max(rerank, k) of
+        them are rescored exactly; otherwise every row is scored.
+        """
+        if len(self) == 0 or k <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        query = np.asarray(query, dtype=np.float32).ravel()
+        norm = np.linalg.norm(query)
+        if norm == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        query = query / norm
+        if self.ann is not None and nprobe:
+            return self._rerank(query, self.ann.candidates(query, nprobe, max(rerank, k)), k)
+
+        best_rows, best_scores = [], []
+        for start in range(0, len(self), self.block_rows):
+            block = self.matrix[start:start + self.block_rows]
+            if block.dtype != np.float32:
+                block = block.astype(np.float32)
+            scores = block @ query
+            if len(scores) > k:
+                top = np.argpartition(scores, -k)[-k:]
+            else:
+                top = np.arange(len(scores))
+            best_rows.append(top + start)
+            best_scores.append(scores[top])
+        rows = np.concatenate(best_rows)
+        scores = np.concatenate(best_scores)
+        if len(scores) > k:
+            keep = np.argpartition(scores, -k)[-k:]
+            rows, scores = rows[keep], scores[keep]
+        order = np.argsort(-scores, kind='stable')
+        return self.ids[rows[order]], scores[order]
+
+    def _rerank(self, query, rows, k):
+        """Exact scores for candidate rows, top k"""
+        rows = np.sort(rows)  # sequential reads from the memory-mapped store
+        scores = np.asarray(self.matrix[rows], dtype=np.float32) @ query
+        top = np.argsort(-scores, kind='stable')[:k]
+        return self.ids[rows[top]], scores[top]
+
+
+def _nearest_centroid(matrix, centroids, block_rows=16384):
+    """Index of the most similar centroid for every row"""
+    assign = np.empty(len(matrix), dtype=np.int32)
+    for start in range(0, len(matrix), block_rows):
+        block = np.asarray(matrix[start:start + block_rows], dtype=np.float32)
+        assign[start:start + len(block)] = np.argmax(block @ centroids.T, axis=1)
+    return assign
+
+
+def _spherical_kmeans(sample, nlist, iterations, rng):
+    """Unit-norm centroids for a sample of normalized rows"""
+    centroids = sample[rng.choice(len(sample), nlist, replace=False)].copy()
+    for _ in range(iterations):
+        assign = _nearest_centroid(sample, centroids)
+        order = np.argsort(assign, kind='stable')
+        counts = np.bincount(assign, minlength=nlist)
+        starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+        filled = counts > 0
+        sums = np.add.reduceat(sample[order], starts[filled], axis=0)
+        centroids[filled] = sums
+        # Re-seed empty lists with random sample rows
+        if not filled.all():
+            centroids[~filled] = sample[rng.choice(len(sample), int((~filled).sum()), replace=False)]
+        normalize_rows(centroids)
+    return centroids
+
+
+class IVFIndex:
+    """Inverted-file ANN index over a VectorIndex
+
+    Rows are grouped by their nearest of nlist k-means centroids, and each
+    list stores per-dimension int8 codes of its rows contiguously (a quarter
+    of the float32 store). A query scores the centroids, scans the codes of
+    the nprobe closest lists and returns the best candidates' store rows for
+    exact reranking. nprobe trades recall for latency.
+    """
+
+    def __init__(self, centroids, offsets, rows, codes, low, step):
+        self.centroids = centroids
+        self.offsets = offsets
+        self.rows = rows
+        self.codes = codes
+        self.low = low
+        self.step = step
+
+    @property
+    def nlist(self):
+        return len(self.centroids)
+
+    @classmethod
+    def build(cls, index, nlist=None, sample_size=None, iterations=10, codes_path=None, seed=0):
+        """Cluster the index's rows and encode them; codes go to codes_path (memory-mapped) when given"""
+        n, dim = len(index), index.dim
+        nlist = min(nlist or max(1, int(np.sqrt(n))), n)
+        rng = np.random.default_rng(seed)
+        sample_rows = np.sort(rng.choice(n, min(n, sample_size or 64 * nlist), replace=False))
+        sample = np.asarray(index.matrix[sample_rows], dtype=np.float32)
+        centroids = _spherical_kmeans(sample, nlist, iterations, rng)
+
+        # int8 scalar quantization with per-dimension ranges taken from the sample
+        low = sample.min(axis=0)
+        step = np.maximum(sample.max(axis=0) - low, 1e-12) / 255
+        del sample
+
+        assign = _nearest_centroid(index.matrix, centroids)
+        rows = np.argsort(assign, kind='stable')
+        offsets = np.concatenate([[0], np.cumsum(np.bincount(assign, minlength=nlist))]).astype(np.int64)
+        position = np.empty(n, dtype=np.int64)
+        position[rows] = np.arange(n)
+
+        if codes_path:
+            codes = np.lib.format.open_memmap(codes_path, mode='w+', dtype=np.int8, shape=(n, dim))
+        else:
+            codes = np.empty((n, dim), dtype=np.int8)
+        for start in range(0, n, 16384):
+            block = np.asarray(index.matrix[start:start + 16384], dtype=np.float32)
+            quantized = np.clip(np.rint((block - low) / step), 0, 255) - 128
+            codes[position[start:start + len(block)]] = quantized.astype(np.int8)
+        if codes_path:
+            codes.flush()
+        return cls(centroids, offsets, rows, codes, low, step)
+
+    def candidates(self, query, nprobe, count):
+        """Store rows of the count best approximate matches within the nprobe closest lists"""
+        lists = np.argsort(-(self.centroids @ query))[:nprobe]
+        weights = (query * self.step).astype(np.float32)
+        found_rows, found_scores = [], []
+        for lst in lists:
+            start, end = self.offsets[lst], self.offsets[lst + 1]
+            if start == end:
+                continue
+            # Dot product with the dequantized rows, up to a constant shared by every row
+            found_scores.append(self.codes[start:end].astype(np.float32) @ weights)
+            found_rows.append(self.rows[start:end])
+        if not found_rows:
+            return np.empty(0, dtype=np.int64)
+        rows = np.concatenate(found_rows)
+        scores = np.concatenate(found_scores)
+        if len(scores) > count:
+            rows = rows[np.argpartition(scores, -count)[-count:]]
+        return rows
+
+    def save(self, path, meta=None):
+        """Write next to the store at path (codes built straight into that file are not copied)"""
+        codes_path = _ivf_codes_path(path)
+        codes_file = getattr(self.codes, 'filename', None)
+        if codes_file is None or os.path.abspath(codes_file) != os.path.abspath(codes_path):
+            np.save(codes_path, self.codes)
+        tmp_path = f"{path}.ivf.{os.getpid()}.tmp.npz"
+        np.savez(tmp_path, centroids=self.centroids, offsets=self.offsets, rows=self.rows,
+                 low=self.low, step=self.step, meta=json.dumps({'rows': len(self.rows), **(meta or {})}))
+        os.replace(tmp_path, _ivf_path(path))
+
+    @classmethod
+    def load(cls, path, expected_meta=None):
+        """IVF index for the store at path; None when missing or stale"""
+        try:
+            with np.load(_ivf_path(path)) as data:
+                meta = json.loads(str(data['meta']))
+                if expected_meta and any(meta.get(key) != value for key, value in expected_meta.items()):
+                    return None
+                arrays = {key: data[key] for key in ('centroids', 'offsets', 'rows', 'low', 'step')}
+            codes = np.load(_ivf_codes_path(path), mmap_mode='r')
+        except (OSError, ValueError, KeyError):
+            return None
+        if len(codes) != meta['rows'] or len(arrays['rows']) != meta['rows']:
+            return None
+        return cls(arrays['centroids'], arrays['offsets'], arrays['rows'], codes, arrays['low'], arrays['step'])
+
+
+def build_ann_index(path, meta=None, min_rows=ANN_MIN_ROWS, **kwargs):
+    """Build and save the IVF index for the store at path when it has at least min_rows rows
+
+    Smaller stores lose any old IVF files, since exact search is fast enough
+    there. Returns the index or None.
+    """
+    index = VectorIndex.load(path, expected_meta=meta)
+    if index is None or len(index) < min_rows:
+        for stale in (_ivf_path(path), _ivf_codes_path(path)):
+            if os.path.exists(stale):
+                os.remove(stale)
+        return None
+    # Drop the old index first so a half-written one is never paired with new codes
+    if os.path.exists(_ivf_path(path)):
+        os.remove(_ivf_path(path))
+    ivf = IVFIndex.build(index, codes_path=_ivf_codes_path(path), **kwargs)
+    ivf.save(path, meta)
+    return ivf